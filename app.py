@@ -1,100 +1,174 @@
 # Flask 入口與 Webhook 設定
-from flask import Flask, request, abort
+from flask import Flask, Response, request, abort, send_from_directory
 from linebot.v3 import WebhookHandler
 from linebot.v3.exceptions import InvalidSignatureError
 from linebot.v3.messaging import (
-    Configuration, ApiClient, MessagingApi, ReplyMessageRequest,
+    Configuration, ApiClient, ReplyMessageRequest,
     TextMessage, ImageMessage, MessagingApiBlob,
     QuickReply, QuickReplyItem, MessageAction,
     FlexMessage, FlexContainer, ConfirmTemplate,
     TemplateMessage, PostbackAction
 )
-from linebot.v3.webhooks import MessageEvent, TextMessageContent, FollowEvent, PostbackEvent
+from linebot.v3.webhooks import MessageEvent, TextMessageContent, FileMessageContent, FollowEvent, PostbackEvent
 import handlers
 import requests
 import json
+import os
+import atexit
+import signal
+import sys
+from webhook_queue import EventDispatcher
+from services.event_dedup import skip_duplicate_events
+from services.chart import CHART_CACHE_DIR, check_public_base_url
+from services.exporter import EXPORT_FORMATS, export_filename, export_stream, verify_export_query
+from services import metrics
+from services.profiling import profile_request
+from services.budget_alerts import BUDGET_ALERTS, BudgetAlertScheduler
+from bot_common import (
+    CHANNEL_ACCESS_TOKEN, CHANNEL_SECRET, LINE_API_HOST, WELCOME_TEXT,
+    WEBHOOK_SECONDS, INVALID_SIGNATURES, TimedSignatureValidator, InstrumentedMessagingApi
+)
 
-app = Flask(__name__)
+# 本機圖表 / 匯出連結需要公開網址，設定不完整時直接啟動失敗，而不是送出 LINE 打不開的相對網址
+check_public_base_url()
 
-# --- 配置資訊 ---
-CHANNEL_ACCESS_TOKEN = 'LAU/pl0+Tk9yP0KOr4u4AVE6bAf/xJRGsx8zTCzYj6JwsOjgzdvx964IvNZS6cpCEsxJeR/kaGJDVJsEEd9m6TVZZvotBYbB+8V75nw1alI1CMqYiZgkLRG6lLDk3Wa/IIIQTxPtoQRnhutopzppcQdB04t89/1O/w1cDnyilFU='
-CHANNEL_SECRET = '7d9c922a4e31502546357a3109a4d6e4'
+app = Flask(__name__)
 
-config = Configuration(access_token=CHANNEL_ACCESS_TOKEN)
+config = Configuration(access_token=CHANNEL_ACCESS_TOKEN, host=LINE_API_HOST)
 handler = WebhookHandler(CHANNEL_SECRET)
+handler.parser.signature_validator = TimedSignatureValidator(CHANNEL_SECRET)
 
-# 定義重複使用的教學訊息
-WELCOME_TEXT = (
-    "🌟 您好！歡迎使用「記帳助手」🌟\n\n"
-    "🚀 快速上手指南：\n"
-    "1.【直接記帳】：輸入「金額 備註」，例如「100 宵夜」\n"
-    "2.【選擇類別】：輸入金額後點選彈出的按鈕\n"
-    "3.【設定預算】：輸入「設定 類別 金額」，例如「設定 飲食 5000」\n"
-    "4.【查看報告】：點擊下方選單按鈕\n\n"
-    "💡 現在就輸入一個數字試試看吧！"
-)
+# 共用的 LINE API 連線：整個行程只建立一次，urllib3 連線池保持 keep-alive 並可跨執行緒使用
+LINE_POOL_SIZE = int(os.environ.get("LINE_POOL_SIZE", "10"))
+config.connection_pool_maxsize = LINE_POOL_SIZE
+api_client = ApiClient(config)
+line_bot_api = InstrumentedMessagingApi(api_client)
+line_bot_blob_api = MessagingApiBlob(api_client)
+
+def close_line_client():
+    api_client.close()
+    api_client.rest_client.pool_manager.clear()
+
+# atexit 以註冊的相反順序執行：連線要在事件佇列清空之後才關閉，所以先註冊
+atexit.register(close_line_client)
+
+# 非同步模式：驗證簽章後立即回 200，事件交給背景 worker 處理（同一使用者依序處理）
+ASYNC_WEBHOOK = os.environ.get("ASYNC_WEBHOOK", "0") == "1"
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_SIZE = int(os.environ.get("WEBHOOK_QUEUE_SIZE", "1000"))
+
+dispatcher = None
+if ASYNC_WEBHOOK:
+    dispatcher = EventDispatcher(handler, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE)
+    # 關閉前把已收到的事件處理完
+    atexit.register(dispatcher.shutdown)
+
+# 背景預算提醒（BUDGET_ALERTS=1 時啟用）：達到 80% / 100% 時推播提醒，每月初推播上月月結
+alert_scheduler = None
+if BUDGET_ALERTS:
+    alert_scheduler = BudgetAlertScheduler(line_bot_api)
+    alert_scheduler.start()
+    atexit.register(alert_scheduler.stop)
 
 @app.route("/callback", methods=['POST'])
 def callback():
     signature = request.headers['X-Line-Signature']
     body = request.get_data(as_text=True)
     try:
-        handler.handle(body, signature)
+        with metrics.timer(WEBHOOK_SECONDS), profile_request("callback"):
+            if dispatcher is not None:
+                payload = handler.parser.parse(body, signature, as_payload=True)
+                for event in payload.events:
+                    dispatcher.submit(event)
+            else:
+                handler.handle(body, signature)
     except InvalidSignatureError:
+        INVALID_SIGNATURES.inc()
         abort(400)
     return 'OK'
 
+# Prometheus 抓取的指標
+@app.route("/metrics")
+def metrics_page():
+    return Response(metrics.render_prometheus(), content_type=metrics.CONTENT_TYPE)
+
+# 本機產生的圖表（CHART_RENDERER=local），檔名為資料內容的雜湊，可長期快取
+@app.route("/charts/<digest>.png")
+def chart_image(digest):
+    if not all(c in "0123456789abcdef" for c in digest):
+        abort(404)
+    return send_from_directory(os.path.abspath(CHART_CACHE_DIR), f"{digest}.png",
+                               mimetype="image/png", max_age=31536000)
+
+# 匯出紀錄：「匯出」指令產生的簽章連結，內容邊讀邊送出，不會一次載入全部紀錄
+@app.route("/export")
+def export_ledger():
+    query = verify_export_query(request.args)
+    if query is None:
+        abort(403)
+    user_id, fmt, start, end, compress = query
+    return Response(
+        export_stream(user_id, fmt, start, end, compress),
+        content_type="application/gzip" if compress else EXPORT_FORMATS[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{export_filename(fmt, start, end, compress)}"',
+            "Cache-Control": "private, no-store"
+        }
+    )
+
 # 加入好友事件：發送教學訊息
 @handler.add(FollowEvent)
+@skip_duplicate_events
 def handle_follow(event):
-    with ApiClient(config) as api_client:
-        line_bot_api = MessagingApi(api_client)
-        line_bot_api.reply_message(
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=WELCOME_TEXT)]
-            )
+    line_bot_api.reply_message(
+        ReplyMessageRequest(
+            reply_token=event.reply_token,
+            messages=[TextMessage(text=WELCOME_TEXT)]
         )
+    )
 
 @handler.add(MessageEvent, message=TextMessageContent)
+@skip_duplicate_events
 def handle_msg(event):
-    with ApiClient(config) as api_client:
-        line_bot_api = MessagingApi(api_client)
-        handlers.handle_text_logic(line_bot_api, event)
+    handlers.handle_text_logic(line_bot_api, event)
+
+# 上傳檔案：匯入歷史紀錄
+@handler.add(MessageEvent, message=FileMessageContent)
+@skip_duplicate_events
+def handle_file(event):
+    handlers.handle_file_logic(line_bot_api, event, lambda: line_bot_blob_api.get_message_content(event.message.id))
 
 @handler.add(PostbackEvent)
+@skip_duplicate_events
 def handle_post(event):
-    with ApiClient(config) as api_client:
-        line_bot_api = MessagingApi(api_client)
-        handlers.handle_postback_logic(line_bot_api, event)
+    handlers.handle_postback_logic(line_bot_api, event)
 
 # --- 圖文選單建立 ---
 def create_rich_menu():
-    with ApiClient(config) as api_client:
-        line_bot_api = MessagingApi(api_client)
-        line_bot_blob_api = MessagingApiBlob(api_client)
-        headers = {'Authorization': 'Bearer ' + CHANNEL_ACCESS_TOKEN, 'Content-Type': 'application/json'}
-        body = {
-            "size": {"width": 2500, "height": 1686},
-            "selected": True,
-            "name": "記帳選單",
-            "chatBarText": "點我開始記帳",
-            "areas": [
-                {"bounds": {"x": 0, "y": 0, "width": 2500, "height": 845}, "action": {"type": "message", "text": "使用教學"}},
-                {"bounds": {"x": 0, "y": 845, "width": 849, "height": 841}, "action": {"type": "message", "text": "設定額度"}},
-                {"bounds": {"x": 840, "y": 845, "width": 824, "height": 836}, "action": {"type": "message", "text": "本月花費"}},
-                {"bounds": {"x": 1663, "y": 845, "width": 837, "height": 841}, "action": {"type": "message", "text": "圖表"}}
-            ]
-        }
-        try:
-            res = requests.post('https://api.line.me/v2/bot/richmenu', headers=headers, data=json.dumps(body).encode('utf-8'))
-            rid = res.json()['richMenuId']
-            with open('static/richmenu-1.png', 'rb') as img:
-                line_bot_blob_api.set_rich_menu_image(rich_menu_id=rid, body=bytearray(img.read()), _headers={'Content-Type': 'image/png'})
-            line_bot_api.set_default_rich_menu(rid)
-        except:
-            print("Rich Menu 處理跳過")
+    headers = {'Authorization': 'Bearer ' + CHANNEL_ACCESS_TOKEN, 'Content-Type': 'application/json'}
+    body = {
+        "size": {"width": 2500, "height": 1686},
+        "selected": True,
+        "name": "記帳選單",
+        "chatBarText": "點我開始記帳",
+        "areas": [
+            {"bounds": {"x": 0, "y": 0, "width": 2500, "height": 845}, "action": {"type": "message", "text": "使用教學"}},
+            {"bounds": {"x": 0, "y": 845, "width": 849, "height": 841}, "action": {"type": "message", "text": "設定額度"}},
+            {"bounds": {"x": 840, "y": 845, "width": 824, "height": 836}, "action": {"type": "message", "text": "本月花費"}},
+            {"bounds": {"x": 1663, "y": 845, "width": 837, "height": 841}, "action": {"type": "message", "text": "圖表"}}
+        ]
+    }
+    try:
+        res = requests.post('https://api.line.me/v2/bot/richmenu', headers=headers, data=json.dumps(body).encode('utf-8'))
+        rid = res.json()['richMenuId']
+        with open('static/richmenu-1.png', 'rb') as img:
+            line_bot_blob_api.set_rich_menu_image(rich_menu_id=rid, body=bytearray(img.read()), _headers={'Content-Type': 'image/png'})
+        line_bot_api.set_default_rich_menu(rid)
+    except:
+        print("Rich Menu 處理跳過")
 
 if __name__ == "__main__":
     # create_rich_menu() # 需要更新選單時再拿掉註解
+    # 收到 SIGTERM 時正常結束，讓 atexit 有機會等待佇列中的事件處理完
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     app.run(port=5000)
\ No newline at end of file
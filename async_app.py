@@ -0,0 +1,164 @@
+# asyncio 版 Webhook 入口（aiohttp）：單一事件迴圈處理大量同時進行中的回覆
+# 執行：python async_app.py（預設 port 5000，可用 LINE_API_HOST 指向 fake_line_server.py 做離線壓測）
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from linebot.v3 import WebhookParser
+from linebot.v3.exceptions import InvalidSignatureError
+from linebot.v3.messaging import (
+    Configuration, AsyncApiClient, AsyncMessagingApi, AsyncMessagingApiBlob, ReplyMessageRequest, TextMessage
+)
+from linebot.v3.webhooks import MessageEvent, TextMessageContent, FileMessageContent, FollowEvent, PostbackEvent
+
+import handlers
+from services.event_dedup import forget_event, is_duplicate
+from services.importer import IMPORT_MAX_BYTES
+from services.exporter import EXPORT_FORMATS, export_filename, export_stream, verify_export_query
+from services.chart import CHART_CACHE_DIR, check_public_base_url
+from services import metrics
+from services.profiling import profile_request
+from bot_common import (
+    CHANNEL_ACCESS_TOKEN, CHANNEL_SECRET, LINE_API_HOST, WELCOME_TEXT,
+    WEBHOOK_SECONDS, INVALID_SIGNATURES, TimedSignatureValidator, line_api_histogram, line_api_errors
+)
+
+LINE_POOL_SIZE = int(os.environ.get("LINE_POOL_SIZE", "100"))
+EXECUTOR_WORKERS = int(os.environ.get("ASYNC_EXECUTOR_WORKERS", "8"))
+
+parser = WebhookParser(CHANNEL_SECRET)
+parser.signature_validator = TimedSignatureValidator(CHANNEL_SECRET)
+REPLY_SECONDS = line_api_histogram("reply_message")
+REPLY_ERRORS = line_api_errors("reply_message")
+
+class ReplyCollector:
+    """
+    交給 handlers 使用的同步 api 替身：只記下要送出的回覆，
+    等 executor 中的邏輯（檔案/資料庫存取）跑完後，再由事件迴圈以非同步 client 送出。
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def reply_message(self, reply_message_request):
+        self.requests.append(reply_message_request)
+
+def _run_handler(event, content=None):
+    """在 executor 執行緒中執行原本的同步處理邏輯，回傳待送出的回覆；content 為事先下載好的檔案內容"""
+    # 事件迴圈上的 coroutine 無法以 cProfile 分開量測，取樣只涵蓋 executor 中的同步處理
+    with profile_request("event"):
+        return _dispatch_event(event, content)
+
+def _dispatch_event(event, content):
+    api = ReplyCollector()
+    if is_duplicate(event):
+        # LINE 因逾時而重送的事件，已經處理過就不再記帳
+        return api.requests
+    try:
+        _handle_event(api, event, content)
+    except Exception:
+        # 處理失敗時取消登記，LINE 重送時再處理一次
+        forget_event(event)
+        raise
+    return api.requests
+
+def _handle_event(api, event, content):
+    if isinstance(event, FollowEvent):
+        api.reply_message(ReplyMessageRequest(reply_token=event.reply_token, messages=[TextMessage(text=WELCOME_TEXT)]))
+    elif isinstance(event, MessageEvent) and isinstance(event.message, TextMessageContent):
+        handlers.handle_text_logic(api, event)
+    elif isinstance(event, MessageEvent) and isinstance(event.message, FileMessageContent):
+        handlers.handle_file_logic(api, event, lambda: content)
+    elif isinstance(event, PostbackEvent):
+        handlers.handle_postback_logic(api, event)
+
+async def callback(request):
+    with metrics.timer(WEBHOOK_SECONDS):
+        return await _handle_callback(request)
+
+async def _handle_callback(request):
+    signature = request.headers.get('X-Line-Signature', '')
+    body = await request.text()
+    try:
+        events = parser.parse(body, signature)
+    except InvalidSignatureError:
+        INVALID_SIGNATURES.inc()
+        raise web.HTTPBadRequest()
+
+    loop = asyncio.get_running_loop()
+    line_bot_api = request.app["line_bot_api"]
+    for event in events:
+        content = None
+        if isinstance(event, MessageEvent) and isinstance(event.message, FileMessageContent) \
+                and (event.message.file_size or 0) <= IMPORT_MAX_BYTES:
+            # 檔案內容在事件迴圈上以非同步 client 下載，解析與寫入再交給 executor
+            content = await request.app["line_bot_blob_api"].get_message_content(event.message.id)
+        replies = await loop.run_in_executor(request.app["executor"], _run_handler, event, content)
+        for reply in replies:
+            try:
+                with metrics.timer(REPLY_SECONDS):
+                    await line_bot_api.reply_message(reply)
+            except Exception:
+                REPLY_ERRORS.inc()
+                raise
+    return web.Response(text='OK')
+
+async def metrics_page(request):
+    return web.Response(text=metrics.render_prometheus(), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+async def chart_image(request):
+    digest = request.match_info["digest"]
+    path = os.path.join(CHART_CACHE_DIR, f"{digest}.png")
+    if not all(c in "0123456789abcdef" for c in digest) or not os.path.exists(path):
+        raise web.HTTPNotFound()
+    return web.FileResponse(path, headers={"Cache-Control": "public, max-age=31536000"})
+
+async def export_ledger(request):
+    query = verify_export_query(request.query)
+    if query is None:
+        raise web.HTTPForbidden()
+    user_id, fmt, start, end, compress = query
+    response = web.StreamResponse(headers={
+        "Content-Type": "application/gzip" if compress else EXPORT_FORMATS[fmt],
+        "Content-Disposition": f'attachment; filename="{export_filename(fmt, start, end, compress)}"',
+        "Cache-Control": "private, no-store"
+    })
+    await response.prepare(request)
+    # 讀取與編碼在 executor 中逐段進行，事件迴圈只負責把每段送出
+    chunks = export_stream(user_id, fmt, start, end, compress)
+    loop = asyncio.get_running_loop()
+    while True:
+        chunk = await loop.run_in_executor(request.app["executor"], next, chunks, None)
+        if chunk is None:
+            break
+        await response.write(chunk)
+    await response.write_eof()
+    return response
+
+async def _on_startup(app):
+    # aiohttp 的連線池必須在事件迴圈啟動後才建立
+    config = Configuration(access_token=CHANNEL_ACCESS_TOKEN, host=LINE_API_HOST)
+    config.connection_pool_maxsize = LINE_POOL_SIZE
+    app["api_client"] = AsyncApiClient(config)
+    app["line_bot_api"] = AsyncMessagingApi(app["api_client"])
+    app["line_bot_blob_api"] = AsyncMessagingApiBlob(app["api_client"])
+    app["executor"] = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="ledger-io")
+
+async def _on_cleanup(app):
+    await app["api_client"].close()
+    app["executor"].shutdown(wait=True)
+
+def create_app():
+    check_public_base_url()
+    app = web.Application()
+    app.router.add_post("/callback", callback)
+    app.router.add_get("/charts/{digest}.png", chart_image)
+    app.router.add_get("/export", export_ledger)
+    app.router.add_get("/metrics", metrics_page)
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+if __name__ == "__main__":
+    web.run_app(create_app(), port=int(os.environ.get("PORT", "5000")))
@@ -0,0 +1,157 @@
+#datagen.py
+# 產生擬真的多使用者記帳資料（1 萬 ~ 1000 萬筆），直接寫成各儲存後端的檔案格式
+# 用法：python -m benchmarks.datagen <輸出資料夾> [--records 100000] [--users 1000] [--months 12]
+#                                    [--backend json|sqlite] [--layout single|sharded] [--shards 16] [--seed 42]
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+from services.sharding import shard_of, shard_dir
+from services.sqlite_store import SCHEMA, COLUMNS
+
+CATEGORIES = ["飲食", "娛樂", "運動", "交通", "健康", "其他"]
+# 每個類別的出現比例與金額分布（對數常態的中位數、離散程度）
+CATEGORY_WEIGHTS = [45, 12, 5, 25, 5, 8]
+AMOUNT_PROFILE = {"飲食": (120, 0.7), "娛樂": (400, 0.9), "運動": (300, 0.8), "交通": (60, 0.9), "健康": (350, 1.0), "其他": (250, 1.1)}
+MEMOS = {
+    "飲食": ["早餐", "午餐", "晚餐", "宵夜", "咖啡", "飲料", ""],
+    "娛樂": ["電影", "遊戲", "KTV", ""],
+    "運動": ["健身房", "球場", "泳池", ""],
+    "交通": ["捷運", "公車", "計程車", "加油", ""],
+    "健康": ["掛號", "藥局", "保健食品", ""],
+    "其他": ["日用品", "禮物", "文具", ""],
+}
+INCOME_RATIO = 0.03  # 約 3% 為收入紀錄
+BATCH = 10000
+
+def user_ids(users):
+    return [f"Ubench{i:08d}" for i in range(users)]
+
+def generate_records(users, total, months=12, seed=42, now=None):
+    """
+    依時間先後逐筆產生 total 筆紀錄（generator，不佔用與筆數成正比的記憶體）。
+    使用者的活躍程度呈長尾分布（少數重度使用者佔大部分紀錄），時間平均分散在最近 months 個月內。
+    """
+    rng = random.Random(seed)
+    ids = user_ids(users)
+    # Zipf 分布的使用者權重
+    user_cum = list(itertools.accumulate(1 / (i + 1) ** 0.8 for i in range(users)))
+    cat_cum = list(itertools.accumulate(CATEGORY_WEIGHTS))
+
+    now = now or datetime.now()
+    start = (now.replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=31 * (months - 1))).replace(day=1)
+    span = (now - start).total_seconds()
+    step = span / max(1, total)
+    for n in range(total):
+        when = start + timedelta(seconds=int(n * step))
+        user_id = rng.choices(ids, cum_weights=user_cum)[0]
+        if rng.random() < INCOME_RATIO:
+            category, record_type, amount, memo = "薪水", "income", rng.choice([30000, 42000, 55000]), ""
+        else:
+            category = rng.choices(CATEGORIES, cum_weights=cat_cum)[0]
+            median, sigma = AMOUNT_PROFILE[category]
+            amount = max(1, int(math.exp(rng.gauss(math.log(median), sigma))))
+            record_type, memo = "expense", rng.choice(MEMOS[category])
+        yield {
+            "id": f"GEN{n:012d}",
+            "user_id": user_id,
+            "category": category,
+            "amount": amount,
+            "type": record_type,
+            "memo": memo,
+            "time": when.strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+def generate_budgets(users, seed=42):
+    """每位使用者為部分類別設定額度"""
+    rng = random.Random(seed + 1)
+    return {
+        user_id: {cat: rng.choice([3000, 5000, 8000, 10000]) for cat in CATEGORIES if rng.random() < 0.7}
+        for user_id in user_ids(users)
+    }
+
+def write_json(data_dir, records, budgets, layout="single", shard_count=16):
+    """以串流方式寫出 transactions.json（分片配置時每個分片各一組檔案）與 budgets.json"""
+    def directory(user_id):
+        return data_dir if layout == "single" else shard_dir(data_dir, shard_of(user_id, shard_count))
+
+    files = {}
+    try:
+        for record in records:
+            d = directory(record["user_id"])
+            f = files.get(d)
+            if f is None:
+                os.makedirs(d, exist_ok=True)
+                f = files[d] = open(os.path.join(d, "transactions.json"), "w", encoding="utf-8")
+                f.write("[\n")
+            else:
+                f.write(",\n")
+            f.write(json.dumps(record, ensure_ascii=False))
+    finally:
+        for f in files.values():
+            f.write("\n]")
+            f.close()
+
+    grouped = {}
+    for user_id, cats in budgets.items():
+        grouped.setdefault(directory(user_id), {})[user_id] = cats
+    for d, part in grouped.items():
+        os.makedirs(d, exist_ok=True)
+        with open(os.path.join(d, "budgets.json"), "w", encoding="utf-8") as f:
+            json.dump(part, f, ensure_ascii=False)
+
+def write_sqlite(db_path, records, budgets):
+    """分批寫入 SQLite，並標記為已搬移，避免啟動時再從 JSON 檔案匯入"""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        records = iter(records)
+        while True:
+            batch = [tuple(r[c] for c in COLUMNS) for r in itertools.islice(records, BATCH)]
+            if not batch:
+                break
+            with conn:
+                conn.executemany(
+                    "INSERT INTO transactions (id, user_id, category, amount, type, memo, time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    batch
+                )
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO budgets (user_id, category, amount) VALUES (?, ?, ?)",
+                [(uid, cat, amt) for uid, cats in budgets.items() for cat, amt in cats.items()]
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', '1')")
+    finally:
+        conn.close()
+
+def generate(data_dir, records=100000, users=1000, months=12, backend="json", layout="single", shards=16, seed=42):
+    budgets = generate_budgets(users, seed)
+    stream = generate_records(users, records, months, seed)
+    if backend == "sqlite":
+        write_sqlite(os.path.join(data_dir, "ledger.db"), stream, budgets)
+    else:
+        write_json(data_dir, stream, budgets, layout, shards)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="產生記帳基準測試資料")
+    parser.add_argument("data_dir")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--layout", choices=["single", "sharded"], default="single")
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    generate(args.data_dir, args.records, args.users, args.months, args.backend, args.layout, args.shards, args.seed)
+    print(f"已產生 {args.records} 筆紀錄（{args.users} 位使用者，{args.backend}/{args.layout}）於 {args.data_dir}")
+
+if __name__ == "__main__":
+    main()
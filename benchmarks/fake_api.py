@@ -0,0 +1,34 @@
+#fake_api.py
+# 基準測試用的 MessagingApi 替身：不連網，但和真的 client 一樣把請求序列化成 JSON
+import json
+
+class FakeMessagingApi:
+    """
+    記錄 handlers 送出的 reply / push / multicast；serialize=True 時會執行與 SDK 相同的 to_dict + json.dumps，
+    讓量到的延遲包含組訊息與序列化的成本。
+    """
+
+    def __init__(self, serialize=True):
+        self.serialize = serialize
+        self.sent = []
+
+    def _send(self, kind, request):
+        if self.serialize:
+            json.dumps(request.to_dict(), ensure_ascii=False)
+        self.sent.append((kind, request))
+
+    def reply_message(self, reply_message_request):
+        self._send("reply", reply_message_request)
+
+    def push_message(self, push_message_request, x_line_retry_key=None):
+        self._send("push", push_message_request)
+
+    def multicast(self, multicast_request, x_line_retry_key=None):
+        self._send("multicast", multicast_request)
+
+    def last_messages(self):
+        """最後一次送出的訊息（dict 形式）"""
+        return [m.to_dict() for m in self.sent[-1][1].messages] if self.sent else []
+
+    def clear(self):
+        self.sent = []
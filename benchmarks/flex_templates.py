@@ -0,0 +1,39 @@
+# Flex 模板微基準：比較「每次建立 dict + FlexContainer.from_dict 驗證」與預先編譯模板的耗時
+# 用法：python -m benchmarks.flex_templates [每項重複次數]
+import sys
+import timeit
+
+from linebot.v3.messaging import FlexContainer, FlexMessage, ReplyMessageRequest
+
+import flex_templates as flex
+
+CATEGORIES = ["飲食", "娛樂", "運動", "交通", "健康", "其他"]
+BUDGETS = {"飲食": 5000, "交通": 3000}
+RECORDS = [
+    {"id": f"01TEST{i:020d}", "time": f"2026-10-{i % 28 + 1:02d} 12:00:00", "category": CATEGORIES[i % 6], "amount": i * 10, "type": "expense"}
+    for i in range(30)
+]
+PAGES = [(RECORDS[i:i + 10], f"📅 本月消費明細（{i // 10 + 1}）", "action=month_page" if i == 20 else None) for i in range(0, 30, 10)]
+
+CASES = {
+    "預算設定導引": lambda: flex.budget_setup_guide(CATEGORIES, BUDGETS),
+    "記帳成功卡片": lambda: flex.record_success_card("飲食", 120, "午餐", 45, "#1DB446"),
+    "本月明細 carousel（30 筆）": lambda: flex.monthly_detail(PAGES),
+}
+
+def serialize(container):
+    """與實際送出時相同：建立 ReplyMessageRequest 後轉成 dict"""
+    request = ReplyMessageRequest(reply_token="token", messages=[FlexMessage(alt_text="bench", contents=container)])
+    return request.to_dict()
+
+def run(number):
+    for name, build in CASES.items():
+        payload = build().to_dict()
+        # 原本的做法：每次都由 dict 逐欄位建立並驗證 SDK 模型
+        validated = timeit.timeit(lambda: serialize(FlexContainer.from_dict(payload)), number=number) / number
+        compiled = timeit.timeit(lambda: serialize(build()), number=number) / number
+        assert serialize(FlexContainer.from_dict(payload)) == serialize(build())
+        print(f"{name}：from_dict {validated * 1e6:.1f}µs，預先編譯 {compiled * 1e6:.1f}µs（{validated / compiled:.1f} 倍）")
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,214 @@
+#harness.py
+# 儲存層與 handlers 的基準測試：每個儲存後端各自在子行程中執行（後端設定在 import 時由環境變數決定），
+# 回報各操作的 p50 / p99 延遲與吞吐量，並可與先前存下的結果比較、標示退步的項目。
+# 用法：python -m benchmarks.harness [--backends json,json-file,json-sharded,sqlite] [--records 10000] [--users 200]
+#                                    [--iterations 200] [--save result.json] [--baseline result.json] [--threshold 0.2]
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qsl
+
+from benchmarks import datagen
+
+BACKENDS = {
+    "json": {"STORAGE_BACKEND": "json", "JSON_STORE_MODE": "journal"},
+    "json-file": {"STORAGE_BACKEND": "json", "JSON_STORE_MODE": "file"},
+    "json-sharded": {"STORAGE_BACKEND": "json", "JSON_STORE_LAYOUT": "sharded"},
+    "sqlite": {"STORAGE_BACKEND": "sqlite"},
+}
+# 延遲差距低於此值（秒）視為量測雜訊，不標示為退步
+NOISE_FLOOR = 0.00005
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+def summarize(latencies):
+    values = sorted(latencies)
+    total = sum(values)
+    return {
+        "n": len(values),
+        "p50": percentile(values, 0.50),
+        "p99": percentile(values, 0.99),
+        "ops": len(values) / total if total else 0.0
+    }
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+
+    def time(self, name, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+        return result
+
+    def results(self):
+        return {name: summarize(values) for name, values in self.latencies.items()}
+
+# --- 子行程：實際執行量測 ---
+
+def _events(user_id, seq):
+    """以 SDK 的 webhook 模型建立事件（與正式環境解析出的物件相同）"""
+    from linebot.v3.webhooks import MessageEvent, PostbackEvent
+
+    base = {"mode": "active", "timestamp": 0, "source": {"type": "user", "userId": user_id},
+            "webhookEventId": f"BENCH{seq:016d}", "deliveryContext": {"isRedelivery": False}, "replyToken": f"token{seq}"}
+
+    def text(value):
+        return MessageEvent.from_dict({**base, "type": "message",
+                                       "message": {"id": str(seq), "type": "text", "quoteToken": "q", "text": value}})
+
+    def postback(data):
+        return PostbackEvent.from_dict({**base, "type": "postback", "postback": {"data": data}})
+    return text, postback
+
+def _next_page_data(messages):
+    """從本月明細的回覆中找出「下一頁」的 postback data"""
+    for message in messages:
+        contents = message.get("contents") or {}
+        bubbles = contents.get("contents", [contents]) if contents.get("type") == "carousel" else [contents]
+        for bubble in bubbles:
+            for item in (bubble.get("footer") or {}).get("contents", []):
+                data = item.get("action", {}).get("data", "")
+                if data.startswith("action=month_page"):
+                    return data
+    return None
+
+def run_worker(users, iterations, seed):
+    import handlers
+    from services import json_store as store
+    from benchmarks.fake_api import FakeMessagingApi
+
+    rng = random.Random(seed)
+    ids = datagen.user_ids(users)
+    # 和資料一樣以長尾分布挑選使用者：重度使用者被操作的機率較高
+    weights = [1 / (i + 1) ** 0.8 for i in range(users)]
+    picks = rng.choices(ids, weights=weights, k=iterations)
+    recorder = Recorder()
+    api = FakeMessagingApi()
+    # 記帳指令需要該類別已設定預算才會真的存檔
+    for user_id in set(picks):
+        store.set_budget(user_id, "飲食", 100000)
+
+    # 第一次存取需要載入 / 建立索引
+    recorder.time("store.cold_load", store.get_user_transactions, ids[0])
+
+    added = []
+    for user_id in picks:
+        recorder.time("store.add_transaction", store.add_transaction, user_id,
+                      {"category": "飲食", "amount": 100, "type": "expense", "memo": "bench"})
+        records = recorder.time("store.get_user_transactions", store.get_user_transactions, user_id)
+        added.append((user_id, records[-1]["id"]))
+        recorder.time("store.get_monthly_summary", store.get_monthly_summary, user_id)
+    for user_id, record_id in added:
+        recorder.time("store.delete_transaction", store.delete_transaction, user_id, record_id)
+
+    texts = [("handler.record", "100 飲食 午餐"), ("handler.month_detail", "本月花費"), ("handler.pie_chart", "圖表"),
+             ("handler.budget_guide", "設定額度"), ("handler.trend", "趨勢")]
+    for seq, user_id in enumerate(picks):
+        text, postback = _events(user_id, seq)
+        for name, value in texts:
+            event = text(value)
+            recorder.time(name, handlers.handle_text_logic, api, event)
+            if name == "handler.month_detail":
+                data = _next_page_data(api.last_messages())
+                if data:
+                    recorder.time("handler.month_next_page", handlers.handle_postback_logic, api, postback(data))
+        # 刪除剛剛記的那一筆：先詢問、再確認
+        record_id = store.get_user_transactions(user_id)[-1]["id"]
+        recorder.time("handler.ask_delete", handlers.handle_postback_logic, api,
+                      postback(f"action=ask_delete&id={record_id}&desc=飲食$100"))
+        confirm = dict(parse_qsl(api.last_messages()[0]["template"]["actions"][0]["data"]))
+        recorder.time("handler.confirm_delete", handlers.handle_postback_logic, api,
+                      postback(f"action=confirm_delete&id={confirm['id']}"))
+        api.clear()
+    return recorder.results()
+
+# --- 主行程：準備資料、啟動各後端的子行程、比較結果 ---
+
+def run_backend(backend, records, users, iterations, seed):
+    workdir = tempfile.mkdtemp(prefix=f"ledger-bench-{backend}-")
+    try:
+        env_overrides = BACKENDS[backend]
+        datagen.generate(
+            os.path.join(workdir, "data"), records, users,
+            backend="sqlite" if env_overrides["STORAGE_BACKEND"] == "sqlite" else "json",
+            layout=env_overrides.get("JSON_STORE_LAYOUT", "single"), seed=seed
+        )
+        env = dict(os.environ, **env_overrides)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.harness", "--worker",
+             "--users", str(users), "--iterations", str(iterations), "--seed", str(seed)],
+            cwd=workdir, env=env, check=True, stdout=subprocess.PIPE, text=True
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def compare(results, baseline, threshold):
+    """回傳退步的項目：[(後端, 操作, 指標, 基準值, 目前值), ...]"""
+    regressions = []
+    for backend, ops in results.items():
+        for op, current in ops.items():
+            before = baseline.get(backend, {}).get(op)
+            if not before:
+                continue
+            for metric in ("p50", "p99"):
+                if current[metric] > before[metric] * (1 + threshold) and current[metric] - before[metric] > NOISE_FLOOR:
+                    regressions.append((backend, op, metric, before[metric], current[metric]))
+    return regressions
+
+def print_report(results, regressions):
+    flagged = {(b, op) for b, op, *_ in regressions}
+    for backend, ops in results.items():
+        print(f"\n== {backend} ==")
+        print(f"{'操作':<28}{'次數':>6}{'p50 (ms)':>12}{'p99 (ms)':>12}{'ops/s':>12}")
+        for op, r in ops.items():
+            mark = "  ⚠️ 退步" if (backend, op) in flagged else ""
+            print(f"{op:<28}{r['n']:>6}{r['p50'] * 1000:>12.3f}{r['p99'] * 1000:>12.3f}{r['ops']:>12.1f}{mark}")
+    for backend, op, metric, before, current in regressions:
+        print(f"⚠️ {backend} {op} {metric}：{before * 1000:.3f}ms -> {current * 1000:.3f}ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="記帳機器人基準測試")
+    parser.add_argument("--backends", default="json,sqlite")
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="相對基準變慢超過此比例即標示為退步")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(args.users, args.iterations, args.seed)))
+        return 0
+
+    results = {}
+    for backend in args.backends.split(","):
+        print(f"執行 {backend}（{args.records} 筆 / {args.users} 位使用者 / {args.iterations} 次）……", file=sys.stderr)
+        results[backend] = run_backend(backend, args.records, args.users, args.iterations, args.seed)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    print_report(results, regressions)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#ledger_layout.py
+# 記憶體中紀錄的兩種配置比較：每筆一個 dict（時間為字串）的列表 vs. 欄位式帳本（services/ledger.py）
+# 比較常駐記憶體、以及月統計 / 任意期間統計 / 歷來類別統計 / 取出一頁明細的速度。
+# 用法：python -m benchmarks.ledger_layout [--records 200000] [--users 1000] [--repeat 5]
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from bisect import bisect_left
+
+from benchmarks import datagen
+from services.ledger import UserLedger
+from services.records import next_month
+
+def build_dict_lists(records):
+    """改版前的配置：user_id -> 依時間排序的 dict 列表，另有平行的時間字串列表供二分搜尋"""
+    by_user = {}
+    times = {}
+    for r in records:
+        by_user.setdefault(r["user_id"], []).append(r)
+        times.setdefault(r["user_id"], []).append(r["time"])
+    return by_user, times
+
+def build_ledgers(records):
+    by_user = {}
+    for r in records:
+        by_user.setdefault(r["user_id"], []).append(r)
+    ledgers = {}
+    for user_id, user_records in by_user.items():
+        ledgers[user_id] = ledger = UserLedger()
+        ledger.extend(user_records)
+    return ledgers
+
+def measure_memory(build, text):
+    """
+    和正式環境一樣從 JSON 載入後建立資料結構，回傳 (結果, 建立完成後仍佔用的記憶體 bytes)；
+    解析出的 dict 若被保留（dict 列表）會算在內，轉成欄位後即釋放（帳本）則不算。
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build(json.loads(text))
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, current
+
+# --- dict 列表上的查詢（逐筆走訪 dict）---
+
+def dict_expense_totals(records, times, start, end):
+    summary = {}
+    for r in records[bisect_left(times, start):bisect_left(times, end)]:
+        if r["type"] == "expense":
+            summary[r["category"]] = summary.get(r["category"], 0) + r["amount"]
+    return summary
+
+def dict_category_totals(records):
+    summary = {}
+    for r in records:
+        summary[r["category"]] = summary.get(r["category"], 0) + r["amount"]
+    return summary
+
+def dict_page(records, size=10):
+    return records[-size:]
+
+# --- 欄位式帳本上的查詢（不經過月統計快取）---
+
+def ledger_expense_totals(ledger, start, end):
+    return ledger.expense_totals(*ledger.span(start, end))
+
+def ledger_category_totals(ledger):
+    return ledger._sum_by_category(ledger.categories, ledger.amounts)
+
+def ledger_page(ledger, user_id, size=10):
+    return ledger.rows(user_id, max(0, len(ledger) - size), len(ledger))
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="dict 列表與欄位式帳本的記憶體 / 速度比較")
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    text = json.dumps(list(datagen.generate_records(args.users, args.records, args.months, args.seed)), ensure_ascii=False)
+    (dict_users, dict_times), dict_bytes = measure_memory(build_dict_lists, text)
+    ledgers, ledger_bytes = measure_memory(build_ledgers, text)
+    del text
+    print(f"{args.records} 筆 / {args.users} 位使用者")
+    print(f"{'配置':<12}{'記憶體 (MB)':>14}{'每筆 (bytes)':>14}")
+    for name, size in (("dict 列表", dict_bytes), ("欄位式帳本", ledger_bytes)):
+        print(f"{name:<12}{size / 1e6:>14.1f}{size / args.records:>14.1f}")
+
+    # 以紀錄最多的使用者量測（查詢成本隨筆數增加的情況最明顯），並確認兩種配置的結果相同
+    heavy = max(dict_users, key=lambda u: len(dict_users[u]))
+    records, times, ledger = dict_users[heavy], dict_times[heavy], ledgers[heavy]
+    month = records[-1]["time"][:7]
+    last_30 = records[-1]["time"][:10]
+    first = records[max(0, len(records) - len(records) // 12)]["time"][:10]
+    cases = [
+        ("月統計", lambda: dict_expense_totals(records, times, month, next_month(month)),
+         lambda: ledger_expense_totals(ledger, month, next_month(month))),
+        ("近一個月期間統計", lambda: dict_expense_totals(records, times, first, last_30),
+         lambda: ledger_expense_totals(ledger, first, last_30)),
+        ("歷來類別統計", lambda: dict_category_totals(records), lambda: ledger_category_totals(ledger)),
+        ("最新一頁明細", lambda: dict_page(records), lambda: ledger_page(ledger, heavy)),
+    ]
+    print(f"\n重度使用者 {heavy}：{len(records)} 筆")
+    print(f"{'查詢':<16}{'dict (µs)':>12}{'帳本 (µs)':>12}{'倍數':>8}")
+    for name, on_dicts, on_ledger in cases:
+        assert on_dicts() == on_ledger(), name
+        a = best_of(args.repeat, on_dicts)
+        b = best_of(args.repeat, on_ledger)
+        print(f"{name:<16}{a * 1e6:>12.1f}{b * 1e6:>12.1f}{a / b:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# 文字訊息解析微基準：指令路由 + 記帳訊息解析，與原本逐一比對（if/elif + 逐一檢查類別）的寫法比較
+# 分別以目前的指令/類別數與擴充後（更多指令、更多類別）量測，觀察每則訊息的成本是否隨之增加
+# 用法：python -m benchmarks.text_parser [每則訊息重複次數]
+import re
+import sys
+import timeit
+
+from handlers import CATEGORIES, router
+from services.text_commands import CommandRouter, EntryParser
+
+MESSAGES = [
+    "100 飲食 午餐", "午餐120", "交通 45 捷運", "3000 房租", "本月花費", "圖表 上月",
+    "設定 飲食 5000", "刪除 01JABCDEF", "今天天氣很好", "使用教學",
+]
+
+# 目前 handle_text_logic 的指令（依原本 if/elif 的判斷順序）
+COMMANDS = [
+    ("exact", "圖表"), ("prefix", "圖表 "), ("exact", "趨勢"), ("exact", "使用教學"),
+    ("exact", "本月花費"), ("exact", "設定額度"), ("prefix", "設定"), ("prefix", "刪除"),
+]
+
+def legacy_parse(text, categories):
+    """原本 handle_text_logic 最後的解析方式（每次重新比對數字，再逐一檢查類別）"""
+    match = re.search(r"(\d+)", text)
+    if not match:
+        return None
+    amount = match.group(1)
+    remaining_text = text.replace(amount, "").strip()
+    found_category = None
+    for cat in categories:
+        if cat in remaining_text:
+            found_category = cat
+            break
+    memo = remaining_text.replace(found_category, "").strip() if found_category else remaining_text
+    return amount, found_category, memo
+
+def legacy_route(text, commands, categories):
+    """原本的 if/elif 鏈：依序比對每個指令，都不符合才解析記帳訊息"""
+    for kind, word in commands:
+        if text == word if kind == "exact" else text.startswith(word):
+            return word
+    return legacy_parse(text, categories)
+
+def build_router(commands):
+    r = CommandRouter()
+    for kind, word in commands:
+        getattr(r, kind)(word)(lambda api, event, user_id, arg, word=word: word)
+    return r
+
+def compiled_route(r, parser, text):
+    handler, arg = r.resolve(text)
+    if handler is None:
+        return parser.parse(arg)
+    return handler
+
+def measure(label, commands, categories, number):
+    r = build_router(commands)
+    parser = EntryParser(categories)
+    for text in MESSAGES:
+        if r.resolve(text)[0] is None and parser.parse(text) is not None:
+            assert tuple(parser.parse(text)) == legacy_parse(text, categories), text
+    total = number * len(MESSAGES)
+    legacy = timeit.timeit(lambda: [legacy_route(t, commands, categories) for t in MESSAGES], number=number) / total
+    compiled = timeit.timeit(lambda: [compiled_route(r, parser, t) for t in MESSAGES], number=number) / total
+    print(f"{label}：原本 {legacy * 1e6:.2f}µs，路由表 + 預編譯解析 {compiled * 1e6:.2f}µs（{legacy / compiled:.1f} 倍）")
+
+def run(number):
+    assert router.resolve("本月花費")[0] is not router.resolve("100 飲食")[0]
+    measure(f"目前（{len(COMMANDS)} 個指令、{len(CATEGORIES)} 個類別）", COMMANDS, CATEGORIES, number)
+    more_commands = COMMANDS + [("exact", f"報表{i}") for i in range(30)] + [("prefix", f"匯{i}") for i in range(10)]
+    more_categories = CATEGORIES + [f"自訂{i}" for i in range(60)]
+    measure(f"擴充（{len(more_commands)} 個指令、{len(more_categories)} 個類別）", more_commands, more_categories, number)
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,63 @@
+# Flask 與 aiohttp 兩個入口共用的設定、指標與 LINE API 包裝
+# 這裡只定義常數與類別，匯入時不建立連線、不註冊 atexit、也不啟動背景執行緒
+import os
+
+from linebot.v3.webhook import SignatureValidator
+from linebot.v3.messaging import MessagingApi
+
+from services import metrics
+
+# --- 配置資訊 ---
+CHANNEL_ACCESS_TOKEN = 'LAU/pl0+Tk9yP0KOr4u4AVE6bAf/xJRGsx8zTCzYj6JwsOjgzdvx964IvNZS6cpCEsxJeR/kaGJDVJsEEd9m6TVZZvotBYbB+8V75nw1alI1CMqYiZgkLRG6lLDk3Wa/IIIQTxPtoQRnhutopzppcQdB04t89/1O/w1cDnyilFU='
+CHANNEL_SECRET = '7d9c922a4e31502546357a3109a4d6e4'
+
+LINE_API_HOST = os.environ.get("LINE_API_HOST")  # 例如 http://127.0.0.1:8080（fake_line_server.py）
+
+# --- 指標：簽章驗證、整個 webhook 請求、對 LINE 的呼叫 ---
+SIGNATURE_SECONDS = metrics.histogram("webhook_signature_seconds", "Webhook 簽章驗證耗時")
+WEBHOOK_SECONDS = metrics.histogram("webhook_request_seconds", "Webhook 請求的處理耗時（非同步模式只含驗證與排入佇列）")
+INVALID_SIGNATURES = metrics.counter("webhook_invalid_signature_total", "簽章驗證失敗的請求數")
+
+def line_api_histogram(call):
+    return metrics.histogram("line_api_seconds", "呼叫 LINE Messaging API 的耗時", labels={"call": call})
+
+def line_api_errors(call):
+    return metrics.counter("line_api_errors_total", "呼叫 LINE Messaging API 失敗的次數", labels={"call": call})
+
+class TimedSignatureValidator(SignatureValidator):
+    """簽章驗證計時；WebhookHandler / WebhookParser 解析 body 前都會經過這裡"""
+
+    def validate(self, body, signature):
+        with metrics.timer(SIGNATURE_SECONDS):
+            return super().validate(body, signature)
+
+class InstrumentedMessagingApi(MessagingApi):
+    """對外送出訊息的呼叫加上耗時與失敗次數"""
+
+    def _timed(self, call, send, *args, **kwargs):
+        try:
+            with metrics.timer(line_api_histogram(call)):
+                return send(*args, **kwargs)
+        except Exception:
+            line_api_errors(call).inc()
+            raise
+
+    def reply_message(self, *args, **kwargs):
+        return self._timed("reply_message", super().reply_message, *args, **kwargs)
+
+    def push_message(self, *args, **kwargs):
+        return self._timed("push_message", super().push_message, *args, **kwargs)
+
+    def multicast(self, *args, **kwargs):
+        return self._timed("multicast", super().multicast, *args, **kwargs)
+
+# 定義重複使用的教學訊息
+WELCOME_TEXT = (
+    "🌟 您好！歡迎使用「記帳助手」🌟\n\n"
+    "🚀 快速上手指南：\n"
+    "1.【直接記帳】：輸入「金額 備註」，例如「100 宵夜」\n"
+    "2.【選擇類別】：輸入金額後點選彈出的按鈕\n"
+    "3.【設定預算】：輸入「設定 類別 金額」，例如「設定 飲食 5000」\n"
+    "4.【查看報告】：點擊下方選單按鈕\n\n"
+    "💡 現在就輸入一個數字試試看吧！"
+)
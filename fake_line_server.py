@@ -0,0 +1,100 @@
+# 本機假的 LINE Messaging API，供離線壓測與測試使用
+# 執行：python fake_line_server.py（預設 port 8080），再以 LINE_API_HOST=http://127.0.0.1:8080 啟動機器人
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+from aiohttp import web
+
+class FakeLineServer:
+    """
+    接受 reply / push / multicast / narrowcast / broadcast 等請求並記錄下來，不真的送出訊息。
+    latency 可模擬 LINE 伺服器的回應時間；GET /_stats 回傳各 API 的呼叫次數。
+    quota 為每月訊息額度（None 表示不限）；push / multicast 依收件人數計入用量，超過額度時回 429。
+    """
+
+    def __init__(self, latency=0.0, quota=None):
+        self.latency = latency
+        self.quota = quota
+        self.usage = 0
+        self.received = []
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._runner = None
+        self._loop = None
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post("/v2/bot/message/{kind}", self._message)
+        app.router.add_get("/v2/bot/message/quota", self._quota)
+        app.router.add_get("/v2/bot/message/quota/consumption", self._consumption)
+        app.router.add_get("/_stats", self._stats)
+        return app
+
+    async def _message(self, request):
+        kind = request.match_info["kind"]
+        body = await request.json()
+        with self._lock:
+            recipients = {"push": 1, "multicast": len(body.get("to", []))}.get(kind, 0)
+            if self.quota is not None and self.usage + recipients > self.quota:
+                return web.json_response({"message": "You have reached your monthly limit."}, status=429)
+            self.usage += recipients
+            self.received.append((kind, body, time.time()))
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if kind in ("reply", "push"):
+            sent = [{"id": uuid.uuid4().hex, "quoteToken": uuid.uuid4().hex} for _ in body.get("messages", [])]
+            return web.json_response({"sentMessages": sent})
+        return web.json_response({}, headers={"X-Line-Request-Id": uuid.uuid4().hex})
+
+    async def _quota(self, request):
+        if self.quota is None:
+            return web.json_response({"type": "none"})
+        return web.json_response({"type": "limited", "value": self.quota})
+
+    async def _consumption(self, request):
+        with self._lock:
+            return web.json_response({"totalUsage": self.usage})
+
+    async def _stats(self, request):
+        with self._lock:
+            return web.json_response(dict(self.counts))
+
+    def messages(self, kind=None):
+        with self._lock:
+            return [body for k, body, _ in self.received if kind is None or k == kind]
+
+    # --- 在背景執行緒啟動（給測試程式使用）---
+    def start_in_thread(self, port=0):
+        """在背景執行緒啟動伺服器，回傳 base URL（例如 http://127.0.0.1:54321）"""
+        ready = threading.Event()
+        result = {}
+
+        def _serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.make_app())
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, "127.0.0.1", port)
+            self._loop.run_until_complete(site.start())
+            result["port"] = site._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=_serve, daemon=True).start()
+        ready.wait()
+        return f"http://127.0.0.1:{result['port']}"
+
+    def stop(self):
+        if self._loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop)
+        future.result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+if __name__ == "__main__":
+    latency = float(os.environ.get("FAKE_LINE_LATENCY_MS", "0")) / 1000
+    web.run_app(FakeLineServer(latency).make_app(), port=int(os.environ.get("PORT", "8080")))
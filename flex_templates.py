@@ -1,100 +1,181 @@
-def budget_setup_guide(categories, budgets):
-    guide_contents = [
+from services.flex_template import FlexTemplate, RenderedFlex, Rows, component
+
+# 各模板的骨架在 import 時驗證一次，回覆時只填入 {欄位} 與可變長度的 Rows
+
+_BUDGET_ROW = component({
+    "type": "box", "layout": "horizontal", "margin": "lg", "spacing": "sm",
+    "contents": [
+        {
+            "type": "box", "layout": "vertical", "flex": 3,
+            "contents": [
+                {"type": "text", "text": "{category}", "weight": "bold", "size": "sm"},
+                {"type": "text", "text": "{status}", "size": "xs", "color": "#888888"}
+            ]
+        },
+        {
+            "type": "button",
+            "style": "{style}",
+            "height": "sm",
+            "flex": 2,
+            "color": "{color}",
+            "action": {
+                "type": "message",
+                "label": "{label}",
+                "text": "設定 {category} "
+            }
+        }
+    ]
+}, sample={"style": "primary"})
+
+_BUDGET_GUIDE = FlexTemplate({
+    "type": "bubble",
+    "body": {"type": "box", "layout": "vertical", "contents": [
         {"type": "text", "text": "🎯 預算初始化設定", "weight": "bold", "size": "lg", "margin": "md"},
         {"type": "text", "text": "請點擊下方類別設定每月額度：", "size": "xs", "color": "#aaaaaa", "margin": "sm"},
-        {"type": "separator", "margin": "md"}
-    ]
-    
+        {"type": "separator", "margin": "md"},
+        Rows("rows")
+    ]}
+})
+
+def budget_setup_guide(categories, budgets):
+    rows = []
     for cat in categories:
         current_limit = budgets.get(cat, 0)
         is_set = current_limit is not None and int(current_limit) > 0
-        status_text = f"目前：${current_limit}" if is_set else "🔴 尚未設定"
-        
-        guide_contents.append({
-            "type": "box", "layout": "horizontal", "margin": "lg", "spacing": "sm",
-            "contents": [
-                {
-                    "type": "box", "layout": "vertical", "flex": 3,
-                    "contents": [
-                        {"type": "text", "text": cat, "weight": "bold", "size": "sm"},
-                        {"type": "text", "text": status_text, "size": "xs", "color": "#888888"}
-                    ]
-                },
-                {
-                    "type": "button", 
-                    "style": "primary" if not is_set else "secondary",
-                    "height": "sm", 
-                    "flex": 2, 
-                    "color": "#1DB446" if not is_set else "#eeeeee",
-                    "action": {
-                        "type": "message", 
-                        "label": "設定" if not is_set else "修改", 
-                        "text": f"設定 {cat} "
+        rows.append(_BUDGET_ROW.render(
+            category=cat,
+            status=f"目前：${current_limit}" if is_set else "🔴 尚未設定",
+            style="primary" if not is_set else "secondary",
+            color="#1DB446" if not is_set else "#eeeeee",
+            label="設定" if not is_set else "修改"
+        ))
+    return _BUDGET_GUIDE.container(rows=rows)
+
+_RECORD_SUCCESS = FlexTemplate({
+    "type": "bubble",
+    "size": "mega",
+    "body": {
+        "type": "box",
+        "layout": "vertical",
+        "spacing": "md",
+        "contents": [
+            {"type": "text", "text": "✅ 記錄成功", "weight": "bold", "size": "md", "color": "#1DB446"},
+            {
+                "type": "box",
+                "layout": "vertical",
+                "contents": [
+                    {"type": "text", "text": "{category}：${amount}", "size": "xl", "weight": "bold"},
+                    {"type": "text", "text": "備註：{memo}", "size": "xs", "color": "#aaaaaa"}
+                ]
+            },
+            {"type": "separator"},
+            {
+                "type": "box",
+                "layout": "vertical",
+                "spacing": "xs",
+                "contents": [
+                    {
+                        "type": "box",
+                        "layout": "horizontal",
+                        "contents": [
+                            {"type": "text", "text": "{category}預算進度", "size": "xs", "color": "#888888"},
+                            {"type": "text", "text": "{percent}%", "size": "xs", "align": "end", "color": "{color}", "weight": "bold"}
+                        ]
+                    },
+                    {
+                        "type": "box",
+                        "layout": "vertical",
+                        "backgroundColor": "#eeeeee",
+                        "height": "6px",
+                        "cornerRadius": "3px",
+                        "contents": [
+                            {
+                                "type": "box",
+                                "layout": "vertical",
+                                "width": "{width}%",
+                                "backgroundColor": "{color}",
+                                "height": "6px",
+                                "cornerRadius": "3px",
+                                "contents": []
+                            }
+                        ]
                     }
-                }
-            ]
-        })
-        
-    return {
-        "type": "bubble", 
-        "body": {"type": "box", "layout": "vertical", "contents": guide_contents}
+                ]
+            }
+        ]
     }
+})
 
 def record_success_card(category, amount, memo, percent, color):
     # 安全檢查：確保進度條寬度不會超過 100%，且不能為負數
     display_percent = min(100, max(0, percent))
-    
-    return {
-        "type": "bubble",
-        "size": "mega",
-        "body": {
-            "type": "box",
-            "layout": "vertical",
-            "spacing": "md",
-            "contents": [
-                {"type": "text", "text": "✅ 記錄成功", "weight": "bold", "size": "md", "color": "#1DB446"},
-                {
-                    "type": "box",
-                    "layout": "vertical",
-                    "contents": [
-                        {"type": "text", "text": f"{category}：${amount}", "size": "xl", "weight": "bold"},
-                        {"type": "text", "text": f"備註：{memo if memo else '無'}", "size": "xs", "color": "#aaaaaa"}
-                    ]
-                },
-                {"type": "separator"},
-                {
-                    "type": "box",
-                    "layout": "vertical",
-                    "spacing": "xs",
-                    "contents": [
-                        {
-                            "type": "box",
-                            "layout": "horizontal",
-                            "contents": [
-                                {"type": "text", "text": f"{category}預算進度", "size": "xs", "color": "#888888"},
-                                {"type": "text", "text": f"{percent}%", "size": "xs", "align": "end", "color": color, "weight": "bold"}
-                            ]
-                        },
-                        {
-                            "type": "box",
-                            "layout": "vertical",
-                            "backgroundColor": "#eeeeee",
-                            "height": "6px",
-                            "cornerRadius": "3px",
-                            "contents": [
-                                {
-                                    "type": "box",
-                                    "layout": "vertical",
-                                    "width": f"{display_percent}%",
-                                    "backgroundColor": color,
-                                    "height": "6px",
-                                    "cornerRadius": "3px",
-                                    "contents": [] 
-                                }
-                            ]
-                        }
-                    ]
-                }
-            ]
+    return _RECORD_SUCCESS.container(
+        category=category, amount=amount, memo=memo if memo else '無',
+        percent=percent, color=color, width=display_percent
+    )
+
+_DETAIL_ITEM = component({
+    "type": "box", "layout": "horizontal", "margin": "md", "spacing": "sm",
+    "contents": [
+        {"type": "text", "text": "{date}", "size": "xs", "color": "#aaaaaa", "flex": 2, "gravity": "center"},
+        {"type": "text", "text": "{category}", "size": "sm", "flex": 2, "gravity": "center"},
+        {"type": "text", "text": "${amount}", "size": "sm", "weight": "bold", "flex": 2, "align": "end", "gravity": "center"},
+        {
+            "type": "text", "text": "🗑️", "size": "lg", "flex": 1, "align": "center", "gravity": "center",
+            "action": {
+                "type": "postback",
+                "label": "刪除",
+                "data": "action=ask_delete&id={id}&desc={category}${amount}",
+                "displayText": "想刪除 {category} ${amount}"
+            }
         }
-    }
\ No newline at end of file
+    ]
+})
+
+_DETAIL_SEPARATOR = component({"type": "separator", "margin": "md"}).render()
+
+_DETAIL_HEADER = {
+    "type": "box", "layout": "vertical",
+    "contents": [{"type": "text", "text": "{title}", "weight": "bold", "size": "xl", "color": "#1DB446"}]
+}
+
+_DETAIL_PAGE = FlexTemplate({
+    "type": "bubble",
+    "header": _DETAIL_HEADER,
+    "body": {"type": "box", "layout": "vertical", "contents": [Rows("items")]}
+})
+
+_DETAIL_PAGE_WITH_NEXT = FlexTemplate({
+    "type": "bubble",
+    "header": _DETAIL_HEADER,
+    "body": {"type": "box", "layout": "vertical", "contents": [Rows("items")]},
+    "footer": {
+        "type": "box", "layout": "vertical",
+        "contents": [{
+            "type": "button", "style": "secondary", "height": "sm",
+            "action": {"type": "postback", "label": "下一頁 ▶", "data": "{next_page_data}", "displayText": "下一頁"}
+        }]
+    }
+})
+
+_CAROUSEL = FlexTemplate({"type": "carousel", "contents": [Rows("bubbles")]})
+
+def monthly_detail_bubble(records, title, next_page_data=None):
+    """消費明細的一頁（dict）；next_page_data 不為 None 時在底部加上「下一頁」按鈕（postback）"""
+    items = []
+    for r in records:
+        if items:
+            items.append(_DETAIL_SEPARATOR)
+        items.append(_DETAIL_ITEM.render(
+            date=r['time'][5:10], category=r['category'], amount=r['amount'], id=r['id']
+        ))
+    if next_page_data is None:
+        return _DETAIL_PAGE.render(title=title, items=items)
+    return _DETAIL_PAGE_WITH_NEXT.render(title=title, items=items, next_page_data=next_page_data)
+
+def monthly_detail(pages):
+    """pages 為 [(紀錄列表, 標題, 下一頁 postback 或 None), ...]；只有一頁時回傳 bubble，否則為 carousel"""
+    bubbles = [monthly_detail_bubble(records, title, next_page_data) for records, title, next_page_data in pages]
+    if len(bubbles) == 1:
+        return RenderedFlex(bubbles[0])
+    return _CAROUSEL.container(bubbles=bubbles)
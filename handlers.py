@@ -1,23 +1,31 @@
-import re
-from urllib.parse import parse_qsl
-from datetime import datetime
+import io
+import os
+from functools import lru_cache
+from itertools import islice
+from urllib.parse import parse_qsl, urlencode
 from linebot.v3.messaging import (
     ReplyMessageRequest, TextMessage, ImageMessage,
     QuickReply, QuickReplyItem, MessageAction,
-    FlexMessage, FlexContainer, ConfirmTemplate,
+    FlexMessage, ConfirmTemplate,
     TemplateMessage, PostbackAction
 )
 
 from services.json_store import (
     add_transaction, 
-    get_user_transactions, 
+    iter_transactions_desc,
     set_budget, 
     get_user_budgets, 
-    get_monthly_summary,
+    get_monthly_category_total,
     delete_transaction
 )
 
-from services.chart import generate_expense_pie_chart
+from services.chart import PUBLIC_BASE_URL, user_pie_chart, user_trend_chart
+from services.date_ranges import parse_chart_range
+from services.records import current_month, next_month
+from services.text_commands import CommandRouter, EntryParser
+from services.importer import IMPORT_MAX_BYTES, import_transactions, format_result
+from services.exporter import EXPORT_LINK_TTL, EXPORT_LINKS, export_query
+from services import metrics
 import flex_templates as flex
 
 CATEGORIES = ["飲食", "娛樂", "運動", "交通", "健康", "其他"]
@@ -32,191 +40,292 @@ WELCOME_TEXT = (
     "💡 現在就輸入一個數字試試看吧！"
 )
 
+# 消費明細：每頁筆數、每次回覆的頁數（一則 carousel 最多 12 頁，且整則訊息不得超過 50KB）
+MONTH_PAGE_SIZE = 10
+MONTH_PAGES_PER_REPLY = 3
+
+IMPORT_GUIDE_TEXT = (
+    "📥 匯入歷史紀錄\n\n"
+    "請直接傳送 CSV、JSON 或 JSON Lines 檔案，每筆需包含：\n"
+    "日期(date)、類別(category)、金額(amount)，可另加 類型(type：支出/收入)、備註(memo)、id\n\n"
+    "例：\ndate,category,amount,memo\n2025-11-03,飲食,120,午餐\n\n"
+    "重複匯入同一個檔案不會重複記帳。"
+)
+
+# 圖表的區間切換按鈕
+CHART_QUICK_REPLY = QuickReply(items=[
+    QuickReplyItem(action=MessageAction(label=label, text=text)) for label, text in [
+        ("本月", "圖表 本月"), ("上月", "圖表 上月"), ("近7天", "圖表 近7天"), ("近30天", "圖表 近30天"), ("月趨勢", "趨勢")
+    ]
+])
+
+def reply_trend_chart(api, event, user_id):
+    """最近 6 個月的每月支出長條圖"""
+    chart = user_trend_chart(user_id)
+    if chart:
+        chart_url, legend = chart
+        messages = [
+            TextMessage(text="📈 最近 6 個月的支出趨勢：\n" + legend),
+            ImageMessage(original_content_url=chart_url, preview_image_url=chart_url, quick_reply=CHART_QUICK_REPLY)
+        ]
+    else:
+        messages = [TextMessage(text="最近 6 個月沒有支出紀錄喔！")]
+    api.reply_message(ReplyMessageRequest(reply_token=event.reply_token, messages=messages))
+
+router = CommandRouter()
+entry_parser = EntryParser(CATEGORIES)
+
+@lru_cache(maxsize=None)
+def _handler_histogram(kind, name):
+    return metrics.histogram("handler_seconds", "各文字指令 / postback 動作的處理耗時", labels={"kind": kind, "name": name})
+
 def handle_text_logic(api, event):
     user_id = event.source.user_id
     text = event.message.text.strip()
+    command, arg = router.resolve(text)
+    if command is not None:
+        with metrics.timer(_handler_histogram("text", command.__name__)):
+            command(api, event, user_id, arg)
 
-    # --- 1. 固定指令判斷 ---
-    if text == "圖表":
-        records = get_user_transactions(user_id)
-        chart_url = generate_expense_pie_chart(records)
-        if chart_url:
-            messages = [
-                TextMessage(text="📊 這是您的消費分析圓餅圖："),
-                ImageMessage(original_content_url=chart_url, preview_image_url=chart_url)
-            ]
-        else:
-            messages = [TextMessage(text="查無紀錄，請先開始記帳喔！")]
-        api.reply_message(ReplyMessageRequest(reply_token=event.reply_token, messages=messages))
+# --- 1. 固定指令 ---
+@router.exact("圖表")
+@router.prefix("圖表 ")
+def reply_pie_chart(api, event, user_id, arg):
+    if arg == "趨勢":
+        reply_trend_chart(api, event, user_id)
         return
-    
-    elif text == "使用教學":
+    date_range = parse_chart_range(arg)
+    if date_range is None:
         api.reply_message(ReplyMessageRequest(
             reply_token=event.reply_token,
-            messages=[TextMessage(text=WELCOME_TEXT)]
+            messages=[TextMessage(text="⚠️ 區間格式：圖表 本月 / 上月 / 近7天 / 2025-12 / 2025-12-01~2025-12-31",
+                                  quick_reply=CHART_QUICK_REPLY)]
         ))
         return
-    
-    elif text == "本月花費":
-        records = get_user_transactions(user_id)
-        this_month = datetime.now().strftime("%Y-%m")
-        monthly_records = [r for r in records if r["time"].startswith(this_month) and r["type"] == "expense"]
-        monthly_records.reverse()
-        
-        if not monthly_records:
+    start, end, label = date_range
+    chart = user_pie_chart(user_id, start, end)
+    if chart:
+        chart_url, legend = chart
+        messages = [
+            TextMessage(text=f"📊 {label}的支出分析圓餅圖：\n" + legend),
+            ImageMessage(original_content_url=chart_url, preview_image_url=chart_url, quick_reply=CHART_QUICK_REPLY)
+        ]
+    else:
+        messages = [TextMessage(text=f"{label}查無支出紀錄，請先開始記帳喔！", quick_reply=CHART_QUICK_REPLY)]
+    api.reply_message(ReplyMessageRequest(reply_token=event.reply_token, messages=messages))
+
+@router.exact("趨勢")
+def reply_trend(api, event, user_id, arg):
+    reply_trend_chart(api, event, user_id)
+
+@router.exact("使用教學")
+def reply_tutorial(api, event, user_id, arg):
+    api.reply_message(ReplyMessageRequest(
+        reply_token=event.reply_token,
+        messages=[TextMessage(text=WELCOME_TEXT)]
+    ))
+
+@router.exact("本月花費")
+def reply_this_month(api, event, user_id, arg):
+    reply_month_detail(api, event, user_id, current_month())
+
+@router.exact("設定額度")
+def reply_budget_guide(api, event, user_id, arg):
+    budgets = get_user_budgets(user_id)
+    # 直接調用 flex_templates 裡的導引卡片（已預先編譯，不需再 from_dict 驗證）
+    bubble = flex.budget_setup_guide(CATEGORIES, budgets)
+    api.reply_message(ReplyMessageRequest(
+        reply_token=event.reply_token,
+        messages=[FlexMessage(alt_text="快速預算設定", contents=bubble)]
+    ))
+
+@router.exact("匯入")
+def reply_import_guide(api, event, user_id, arg):
+    api.reply_message(ReplyMessageRequest(
+        reply_token=event.reply_token,
+        messages=[TextMessage(text=IMPORT_GUIDE_TEXT)]
+    ))
+
+@router.exact("匯出")
+@router.prefix("匯出 ")
+def reply_export_links(api, event, user_id, arg):
+    if not EXPORT_LINKS:
+        api.reply_message(ReplyMessageRequest(
+            reply_token=event.reply_token, messages=[TextMessage(text="⚠️ 目前沒有開放匯出功能。")]
+        ))
+        return
+    # 沒有指定區間時匯出全部紀錄
+    if arg:
+        date_range = parse_chart_range(arg)
+        if date_range is None:
             api.reply_message(ReplyMessageRequest(
                 reply_token=event.reply_token,
-                messages=[TextMessage(text="本月目前沒有消費紀錄喔！")]
+                messages=[TextMessage(text="⚠️ 格式：匯出 / 匯出 本月 / 匯出 上月 / 匯出 2025-12 / 匯出 2025-12-01~2025-12-31")]
             ))
             return
+        start, end, label = date_range
+    else:
+        start, end, label = None, None, "全部"
+    links = "\n\n".join(
+        f"{title}：\n{PUBLIC_BASE_URL}/export?{export_query(user_id, fmt, start, end, compress)}"
+        for title, fmt, compress in [("CSV", "csv", False), ("CSV（gzip 壓縮）", "csv", True), ("JSON Lines", "jsonl", False)]
+    )
+    api.reply_message(ReplyMessageRequest(
+        reply_token=event.reply_token,
+        messages=[TextMessage(text=f"📤 {label}紀錄的下載連結（{EXPORT_LINK_TTL // 60} 分鐘內有效）：\n\n{links}")]
+    ))
 
-        contents = []
-        for r in monthly_records:
-            display_date = r['time'][5:10]
-            item_box = {
-                "type": "box", "layout": "horizontal", "margin": "md", "spacing": "sm",
-                "contents": [
-                    {"type": "text", "text": display_date, "size": "xs", "color": "#aaaaaa", "flex": 2, "gravity": "center"},
-                    {"type": "text", "text": r['category'], "size": "sm", "flex": 2, "gravity": "center"},
-                    {"type": "text", "text": f"${r['amount']}", "size": "sm", "weight": "bold", "flex": 2, "align": "end", "gravity": "center"},
-                    {
-                        "type": "text", "text": "🗑️", "size": "lg", "flex": 1, "align": "center", "gravity": "center",
-                        "action": {
-                            "type": "postback",
-                            "label": "刪除",
-                            "data": f"action=ask_delete&id={r['id']}&desc={r['category']}${r['amount']}",
-                            "displayText": f"想刪除 {r['category']} ${r['amount']}"
-                        }
-                    }
-                ]
-            }
-            contents.append(item_box)
-            contents.append({"type": "separator", "margin": "md"})
-
-        flex_bubble = {
-            "type": "bubble",
-            "header": {
-                "type": "box", "layout": "vertical",
-                "contents": [{"type": "text", "text": "📅 本月消費明細", "weight": "bold", "size": "xl", "color": "#1DB446"}]
-            },
-            "body": {"type": "box", "layout": "vertical", "contents": contents[:-1]}
-        }
+# --- 2. 前綴指令 ---
+@router.prefix("設定")
+def reply_set_budget(api, event, user_id, arg):
+    parts = arg.split()
+    if len(parts) == 1:
+        category = parts[0]
+        qr = QuickReply(items=[
+            QuickReplyItem(action=MessageAction(label=p, text=f"設定 {category} {p}")) for p in ["3000", "5000", "8000", "10000"]
+        ])
         api.reply_message(ReplyMessageRequest(
             reply_token=event.reply_token,
-            messages=[FlexMessage(alt_text="本月消費明細", contents=FlexContainer.from_dict(flex_bubble))]
+            messages=[TextMessage(text=f"請選擇【{category}】的每月預算：", quick_reply=qr)]
         ))
-        return
-    
-    elif text == "設定額度":
-        budgets = get_user_budgets(user_id)
-        # 直接調用 flex_templates 裡的導引卡片，保持代碼乾淨
-        bubble = flex.budget_setup_guide(CATEGORIES, budgets)
+    elif len(parts) >= 2:
+        try:
+            category, amount = parts[0], int(parts[1])
+            set_budget(user_id, category, amount)
+            reply_text = f"✅ 【{category}】額度設定成功！\n每月預算為：${amount}"
+        except:
+            reply_text = "❌ 設定格式錯誤。\n範例：設定 飲食 5000"
+        api.reply_message(ReplyMessageRequest(reply_token=event.reply_token, messages=[TextMessage(text=reply_text)]))
+
+@router.prefix("刪除")
+def reply_delete(api, event, user_id, arg):
+    parts = arg.split()
+    if len(parts) == 1:
+        res_text = "✅ 紀錄已成功刪除！" if delete_transaction(user_id, parts[0]) else "❌ 刪除失敗，找不到該 ID。"
+    else:
+        res_text = "⚠️ 格式：刪除 [ID]"
+    api.reply_message(ReplyMessageRequest(reply_token=event.reply_token, messages=[TextMessage(text=res_text)]))
+
+# --- 3. 核心：金額與記帳邏輯 (模糊匹配) ---
+@router.fallback
+def record_expense(api, event, user_id, text):
+    entry = entry_parser.parse(text)
+    if entry is None:
+        return # 非數字且非指令，不予理會
+    amount = entry.amount
+
+    # A. 找不到類別 -> 彈出 Quick Reply 詢問
+    if not entry.category:
+        memo = entry.memo
+        quick_reply_items = [
+            QuickReplyItem(action=MessageAction(label=cat, text=f"{cat} {amount} {memo}".strip())) 
+            for cat in CATEGORIES
+        ]
         api.reply_message(ReplyMessageRequest(
             reply_token=event.reply_token,
-            messages=[FlexMessage(alt_text="快速預算設定", contents=FlexContainer.from_dict(bubble))]
+            messages=[TextMessage(
+                text=f"💵 金額：${amount}\n這是屬於哪個類別的支出？",
+                quick_reply=QuickReply(items=quick_reply_items)
+            )]
         ))
         return
 
-    # --- 2. 前綴指令判斷 ---
-    elif text.startswith("設定"):
-        parts = text.split()
-        if len(parts) == 2:
-            category = parts[1]
-            qr = QuickReply(items=[
-                QuickReplyItem(action=MessageAction(label=p, text=f"設定 {category} {p}")) for p in ["3000", "5000", "8000", "10000"]
-            ])
-            api.reply_message(ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=f"請選擇【{category}】的每月預算：", quick_reply=qr)]
-            ))
-        elif len(parts) >= 3:
-            try:
-                category, amount = parts[1], int(parts[2])
-                set_budget(user_id, category, amount)
-                reply_text = f"✅ 【{category}】額度設定成功！\n每月預算為：${amount}"
-            except:
-                reply_text = "❌ 設定格式錯誤。\n範例：設定 飲食 5000"
-            api.reply_message(ReplyMessageRequest(reply_token=event.reply_token, messages=[TextMessage(text=reply_text)]))
+    # B. 已有類別 -> 存檔並檢查預算
+    category = entry.category
+    memo = entry.memo
+    budgets = get_user_budgets(user_id)
+    limit = budgets.get(category)
+
+    if limit is None or int(limit) <= 0:
+        qr = QuickReply(items=[
+            QuickReplyItem(action=MessageAction(label=p, text=f"設定 {category} {p}")) for p in ["3000", "5000", "8000"]
+        ])
+        api.reply_message(ReplyMessageRequest(
+            reply_token=event.reply_token,
+            messages=[TextMessage(text=f"⚠️ 請先設定【{category}】的預算額度：", quick_reply=qr)]
+        ))
         return
+
+    # 正常存檔
+    add_transaction(user_id, {"category": category, "amount": int(amount), "type": "expense", "memo": memo})
     
-    elif text.startswith("刪除"):
-        parts = text.split()
-        if len(parts) == 2:
-            res_text = "✅ 紀錄已成功刪除！" if delete_transaction(user_id, parts[1]) else "❌ 刪除失敗，找不到該 ID。"
-        else:
-            res_text = "⚠️ 格式：刪除 [ID]"
-        api.reply_message(ReplyMessageRequest(reply_token=event.reply_token, messages=[TextMessage(text=res_text)]))
-        return
+    # 計算進度
+    curr_total = get_monthly_category_total(user_id, category)
+    limit_val = int(limit)
+    percent = min(100, int((curr_total / limit_val) * 100)) if limit_val > 0 else 0
+    color = "#FF334B" if percent >= 100 else ("#F7AF1D" if percent >= 80 else "#1DB446")
     
-    # --- 3. 核心：金額與記帳邏輯 (模糊匹配) ---
+    # 回傳成功卡片
+    success_bubble = flex.record_success_card(category, amount, memo, percent, color)
+    api.reply_message(ReplyMessageRequest(
+        reply_token=event.reply_token,
+        messages=[FlexMessage(alt_text="記帳成功", contents=success_bubble)]
+    ))
+
+def handle_file_logic(api, event, download):
+    """使用者上傳檔案：CSV / JSON / JSON Lines 視為歷史紀錄匯入；download() 回傳檔案內容（bytes）"""
+    user_id = event.source.user_id
+    message = event.message
+    if os.path.splitext(message.file_name or "")[1].lower() not in (".csv", ".json", ".jsonl"):
+        reply_text = "⚠️ 只支援匯入 CSV、JSON 或 JSON Lines 檔案。輸入「匯入」查看格式說明。"
+    elif message.file_size and message.file_size > IMPORT_MAX_BYTES:
+        reply_text = f"⚠️ 檔案太大（上限 {IMPORT_MAX_BYTES // 1024 // 1024}MB），請分成多個檔案匯入。"
     else:
-        match = re.search(r"(\d+)", text)
-        if not match:
-            return # 非數字且非指令，不予理會
-
-        amount = match.group(1)
-        remaining_text = text.replace(amount, "").strip()
-
-        found_category = None
-        for cat in CATEGORIES:
-            if cat in remaining_text:
-                found_category = cat
-                break
-
-        # A. 找不到類別 -> 彈出 Quick Reply 詢問
-        if not found_category:
-            memo = remaining_text
-            quick_reply_items = [
-                QuickReplyItem(action=MessageAction(label=cat, text=f"{cat} {amount} {memo}".strip())) 
-                for cat in CATEGORIES
-            ]
-            api.reply_message(ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(
-                    text=f"💵 金額：${amount}\n這是屬於哪個類別的支出？",
-                    quick_reply=QuickReply(items=quick_reply_items)
-                )]
-            ))
-            return
-        
-        # B. 已有類別 -> 存檔並檢查預算
-        else:
-            category = found_category
-            memo = remaining_text.replace(category, "").strip()
-            budgets = get_user_budgets(user_id)
-            limit = budgets.get(category)
-
-            if limit is None or int(limit) <= 0:
-                qr = QuickReply(items=[
-                    QuickReplyItem(action=MessageAction(label=p, text=f"設定 {category} {p}")) for p in ["3000", "5000", "8000"]
-                ])
-                api.reply_message(ReplyMessageRequest(
-                    reply_token=event.reply_token,
-                    messages=[TextMessage(text=f"⚠️ 請先設定【{category}】的預算額度：", quick_reply=qr)]
-                ))
-                return
-
-            # 正常存檔
-            add_transaction(user_id, {"category": category, "amount": int(amount), "type": "expense", "memo": memo})
-            
-            # 計算進度
-            summary = get_monthly_summary(user_id)
-            curr_total = summary.get(category, 0)
-            limit_val = int(limit)
-            percent = min(100, int((curr_total / limit_val) * 100)) if limit_val > 0 else 0
-            color = "#FF334B" if percent >= 100 else ("#F7AF1D" if percent >= 80 else "#1DB446")
-            
-            # 回傳成功卡片
-            success_bubble = flex.record_success_card(category, amount, memo, percent, color)
-            api.reply_message(ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[FlexMessage(alt_text="記帳成功", contents=FlexContainer.from_dict(success_bubble))]
-            ))
+        try:
+            result = import_transactions(user_id, io.BytesIO(download()), message.file_name)
+            reply_text = format_result(result)
+        except ValueError as e:
+            reply_text = f"❌ 無法讀取檔案：{e}"
+    api.reply_message(ReplyMessageRequest(reply_token=event.reply_token, messages=[TextMessage(text=reply_text)]))
+
+def reply_month_detail(api, event, user_id, month, before=None, page=1):
+    """
+    回覆某月的消費明細 carousel（由新到舊），一次最多 MONTH_PAGES_PER_REPLY 頁。
+    紀錄由 generator 逐筆取出，只讀到這次要顯示的筆數（多讀一筆判斷是否還有下一頁）；
+    還有更多時，最後一頁底部的「下一頁」帶著最後一筆的 (time, id) 作為游標。
+    """
+    expenses = (r for r in iter_transactions_desc(user_id, month, next_month(month), before) if r["type"] == "expense")
+    limit = MONTH_PAGE_SIZE * MONTH_PAGES_PER_REPLY
+    records = list(islice(expenses, limit + 1))
+    has_more = len(records) > limit
+    records = records[:limit]
+
+    if not records:
+        text = "本月目前沒有消費紀錄喔！" if before is None else "已經沒有更早的紀錄囉！"
+        api.reply_message(ReplyMessageRequest(reply_token=event.reply_token, messages=[TextMessage(text=text)]))
+        return
+
+    pages = []
+    chunks = [records[i:i + MONTH_PAGE_SIZE] for i in range(0, len(records), MONTH_PAGE_SIZE)]
+    for i, chunk in enumerate(chunks):
+        number = page + i
+        title = "📅 本月消費明細" if month == current_month() else f"📅 {month} 消費明細"
+        if number > 1:
+            title += f"（{number}）"
+        next_page_data = None
+        if has_more and i == len(chunks) - 1:
+            last = chunk[-1]
+            next_page_data = urlencode({
+                "action": "month_page", "month": month, "page": number + 1,
+                "before": f"{last['time']}|{last['id']}"
+            })
+        pages.append((chunk, title, next_page_data))
+
+    api.reply_message(ReplyMessageRequest(
+        reply_token=event.reply_token,
+        messages=[FlexMessage(alt_text="本月消費明細", contents=flex.monthly_detail(pages))]
+    ))
+
+POSTBACK_ACTIONS = ("ask_delete", "month_page", "confirm_delete")
 
 def handle_postback_logic(api, event):
-    # (此部分與你原本的代碼一致，邏輯正確)
-    data = event.postback.data
-    params = dict(parse_qsl(data))
+    params = dict(parse_qsl(event.postback.data))
+    # 動作名稱來自使用者送出的資料，只以已知的動作作為 label，避免指標數量無限增加
+    action = params.get('action')
+    with metrics.timer(_handler_histogram("postback", action if action in POSTBACK_ACTIONS else "other")):
+        _handle_postback(api, event, params)
+
+def _handle_postback(api, event, params):
     user_id = event.source.user_id
 
     if params.get('action') == 'ask_delete':
@@ -234,6 +343,11 @@ def handle_postback_logic(api, event):
             messages=[TemplateMessage(alt_text="確認刪除", template=confirm_template)]
         ))
 
+    elif params.get('action') == 'month_page':
+        before_time, _, before_id = params.get('before', '').partition('|')
+        before = (before_time, before_id) if before_time else None
+        reply_month_detail(api, event, user_id, params.get('month') or current_month(), before, int(params.get('page', 1)))
+
     elif params.get('action') == 'confirm_delete':
         success = delete_transaction(user_id, params.get('id'))
         msg = "✅ 已成功刪除紀錄！" if success else "❌ 刪除失敗。"
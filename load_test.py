@@ -0,0 +1,65 @@
+# Webhook 壓測：對 /callback 送出帶正確簽章的文字訊息事件，回報吞吐量與延遲
+# 用法：python load_test.py [url] [總請求數] [同時連線數]
+#   例：python fake_line_server.py & LINE_API_HOST=http://127.0.0.1:8080 python async_app.py &
+#       python load_test.py http://127.0.0.1:5000/callback 2000 200
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import sys
+import time
+
+import aiohttp
+
+from bot_common import CHANNEL_SECRET
+
+TEXTS = ["100 飲食 早餐", "本月花費", "圖表", "使用教學", "250 交通"]
+
+def build_body(i, users=50):
+    event = {
+        "type": "message", "mode": "active", "timestamp": int(time.time() * 1000),
+        "source": {"type": "user", "userId": f"Uloadtest{i % users:04d}"},
+        "webhookEventId": f"01LOADTEST{i:016d}",
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": f"token{i}",
+        "message": {"id": str(i), "type": "text", "quoteToken": "q", "text": TEXTS[i % len(TEXTS)]}
+    }
+    return json.dumps({"destination": "Uloadtest", "events": [event]})
+
+def sign(body):
+    return base64.b64encode(hmac.new(CHANNEL_SECRET.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).digest()).decode()
+
+async def run(url, total, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession() as session:
+        async def one(i):
+            nonlocal errors
+            body = build_body(i)
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post(url, data=body.encode("utf-8"), headers={
+                    "X-Line-Signature": sign(body), "Content-Type": "application/json"
+                }) as resp:
+                    await resp.read()
+                    if resp.status != 200:
+                        errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{total} 次請求 / {elapsed:.2f}s = {total / elapsed:.1f} req/s，p50 {p50:.1f}ms，p99 {p99:.1f}ms，失敗 {errors}")
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:5000/callback"
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    asyncio.run(run(url, total, concurrency))
@@ -0,0 +1,249 @@
+#budget_alerts.py
+# 主動預算提醒：背景定期比對各使用者本月各類別的支出（帳本增量維護的月統計）與額度，
+# 達到 80% / 100% 時推播提醒；進入新的月份後推播上個月的月結摘要。
+# 內容相同的訊息合併成一次 multicast（每次最多 500 位收件人），呼叫頻率以 token bucket 限制，
+# 送出前查詢本月訊息額度，額度不足時只送能送的部分，其餘留待下次。
+# 已送出的提醒記錄在 data/budget_alerts.json（跨行程鎖保護），多個行程同時執行也不會重複推播。
+import logging
+import os
+import threading
+import time
+
+from linebot.v3.messaging import MessageAction, MulticastRequest, QuickReply, QuickReplyItem, TextMessage
+
+from services import metrics
+from services.fileio import atomic_write_json, process_lock, read_json
+from services.json_store import get_budget_version, get_data_version, get_expense_totals_between, iter_all_budgets
+from services.records import current_month, next_month, previous_month
+
+BUDGET_ALERTS = os.environ.get("BUDGET_ALERTS", "0") == "1"
+BUDGET_ALERT_INTERVAL = float(os.environ.get("BUDGET_ALERT_INTERVAL", "300"))  # 秒
+BUDGET_ALERT_RATE = float(os.environ.get("BUDGET_ALERT_RATE", "10"))  # 每秒最多幾次 multicast 請求
+ALERT_STATE_PATH = os.path.join("data", "budget_alerts.json")
+
+THRESHOLDS = (80, 100)
+MULTICAST_MAX = 500  # LINE multicast 單次收件人上限
+
+logger = logging.getLogger(__name__)
+
+RUN_SECONDS = metrics.histogram("budget_alert_run_seconds", "一輪預算檢查與推播的耗時")
+
+def _sent_counter(kind):
+    return metrics.counter("budget_alerts_sent_total", "已推播的預算提醒 / 月結（收件人數）", labels={"kind": kind})
+
+def _deferred_counter(kind):
+    return metrics.counter("budget_alerts_deferred_total", "因額度不足或推播失敗而延後的收件人數", labels={"kind": kind})
+
+class RateLimiter:
+    """token bucket：平均每秒 rate 次，最多累積 burst 次"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+def alert_level(spent, limit):
+    """支出已達的提醒門檻（百分比），未達任何門檻時為 0"""
+    if limit <= 0:
+        return 0
+    percent = spent * 100 // limit
+    return max((t for t in THRESHOLDS if percent >= t), default=0)
+
+def alert_messages(alerts):
+    """alerts 為 ((類別, 門檻), ...)，合併成一則訊息；內容不含金額，相同組合的使用者可共用同一次 multicast"""
+    lines = []
+    for category, level in alerts:
+        if level >= 100:
+            lines.append(f"🚨 本月【{category}】支出已超過預算！")
+        else:
+            lines.append(f"⚠️ 本月【{category}】支出已達預算的 {level}%")
+    qr = QuickReply(items=[QuickReplyItem(action=MessageAction(label="本月花費", text="本月花費"))])
+    return [TextMessage(text="\n".join(lines), quick_reply=qr)]
+
+def summary_messages(month, over):
+    """月結摘要；over 為超出預算的類別"""
+    if over:
+        text = f"📅 {month} 月結：超出預算的類別 —— {'、'.join(over)}"
+    else:
+        text = f"📅 {month} 月結：所有類別都在預算內，繼續保持！"
+    qr = QuickReply(items=[QuickReplyItem(action=MessageAction(label="上月圖表", text="圖表 上月"))])
+    return [TextMessage(text=text, quick_reply=qr)]
+
+def remaining_quota(api):
+    """本月剩餘的訊息額度；不限額度、api 沒有額度查詢或查詢失敗時回傳 None"""
+    get_quota = getattr(api, "get_message_quota", None)
+    get_consumption = getattr(api, "get_message_quota_consumption", None)
+    if get_quota is None or get_consumption is None:
+        return None
+    try:
+        quota = get_quota()
+        if quota.type != "limited" or quota.value is None:
+            return None
+        return max(0, quota.value - get_consumption().total_usage)
+    except Exception:
+        logger.exception("無法查詢訊息額度")
+        return None
+
+class BudgetAlertScheduler:
+    """
+    每 interval 秒執行一次 run_once()。api 為同步的 MessagingApi（需有 multicast，
+    並可選擇提供 get_message_quota / get_message_quota_consumption）。
+    """
+
+    def __init__(self, api, interval=BUDGET_ALERT_INTERVAL, rate=BUDGET_ALERT_RATE, state_path=ALERT_STATE_PATH):
+        self.api = api
+        self.interval = interval
+        self.limiter = RateLimiter(rate)
+        self.state_path = state_path
+        # user_id -> (資料版本, 額度版本)：上次檢查後都沒變、也沒有待送提醒的使用者不必重新比對
+        self._checked = {}
+        self._checked_month = None
+        self._quota_left = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="budget-alerts", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("預算提醒執行失敗")
+
+    def run_once(self, month=None):
+        """檢查一輪並送出需要的提醒與月結，回傳 {"alert": 收件人數, "summary": 收件人數}"""
+        month = month or current_month()
+        sent = {"alert": 0, "summary": 0}
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with metrics.timer(RUN_SECONDS), process_lock(self.state_path):
+            state = read_json(self.state_path) if os.path.exists(self.state_path) else {}
+            if state.get("month") != month:
+                # 新的月份：提醒紀錄歸零；第一次執行時不補送更早的月結
+                state = {
+                    "month": month,
+                    "alerted": {},
+                    "summarized": previous_month(state.get("month", month)),
+                    "summary_pending": {},
+                    "summary_sent": []
+                }
+            if self._checked_month != month:
+                self._checked = {}
+                self._checked_month = month
+            outbox = self._collect(state, month)
+            if outbox:
+                self._quota_left = remaining_quota(self.api)
+            for kind, messages, recipients, on_sent in outbox:
+                sent[kind] += self._multicast(kind, messages, recipients, on_sent)
+            deferred = sum(len(recipients) for _, _, recipients, _ in outbox) - sum(sent.values())
+            if deferred:
+                logger.warning("%d 位收件人的預算提醒延後到下一輪（訊息額度：%s）", deferred, self._quota_left)
+            if not state["summary_pending"]:
+                state["summarized"] = previous_month(month)
+                state["summary_sent"] = []
+            atomic_write_json(self.state_path, state)
+        return sent
+
+    def _collect(self, state, month):
+        """列出要送的 (種類, 訊息, 收件人, 送達後的記錄函式)；內容相同的使用者合併在同一組"""
+        alerted = state["alerted"]
+        pending = state["summary_pending"]
+        # 已送達月結的使用者：部分批次失敗、下一輪補送時不能再把他們加回待送
+        summary_sent = state.setdefault("summary_sent", [])
+        delivered = set(summary_sent)
+        summary_month = previous_month(month)
+        want_summary = state["summarized"] != summary_month
+        alert_groups = {}
+        summary_groups = {}
+        for user_id, budgets in iter_all_budgets():
+            limits = {category: int(amount) for category, amount in budgets.items() if int(amount) > 0}
+            if not limits:
+                continue
+            if want_summary and user_id not in pending and user_id not in delivered:
+                spent = get_expense_totals_between(user_id, summary_month, month)
+                if spent:
+                    pending[user_id] = [c for c in limits if spent.get(c, 0) > limits[c]]
+            if user_id in pending:
+                summary_groups.setdefault(tuple(pending[user_id]), []).append(user_id)
+
+            version = (get_data_version(user_id), get_budget_version(user_id))
+            if self._checked.get(user_id) == version:
+                continue
+            spent = get_expense_totals_between(user_id, month, next_month(month))
+            levels = alerted.get(user_id, {})
+            fresh = []
+            for category, limit in limits.items():
+                level = alert_level(spent.get(category, 0), limit)
+                if level > levels.get(category, 0):
+                    fresh.append((category, level))
+                elif level < levels.get(category, 0):
+                    # 調高額度或刪除紀錄後回到門檻以下，之後再次達到時要重新提醒
+                    levels[category] = level
+            if fresh:
+                alert_groups.setdefault(tuple(fresh), []).append(user_id)
+            else:
+                self._checked[user_id] = version
+
+        def _on_alerted(fresh):
+            def _record(user_id):
+                levels = alerted.setdefault(user_id, {})
+                for category, level in fresh:
+                    levels[category] = level
+            return _record
+
+        def _on_summarized(user_id):
+            pending.pop(user_id, None)
+            summary_sent.append(user_id)
+
+        outbox = [("alert", alert_messages(fresh), users, _on_alerted(fresh)) for fresh, users in alert_groups.items()]
+        outbox += [("summary", summary_messages(summary_month, over), users, _on_summarized)
+                   for over, users in summary_groups.items()]
+        return outbox
+
+    def _multicast(self, kind, messages, recipients, on_sent):
+        """分批送出（每批最多 MULTICAST_MAX 人），回傳實際送達的收件人數；沒送出的收件人留待下一輪"""
+        delivered = 0
+        for i in range(0, len(recipients), MULTICAST_MAX):
+            batch = recipients[i:i + MULTICAST_MAX]
+            if self._quota_left is not None and self._quota_left < len(batch):
+                batch = batch[:self._quota_left]
+            if not batch:
+                break
+            self.limiter.acquire()
+            try:
+                self.api.multicast(MulticastRequest(to=batch, messages=messages))
+            except Exception:
+                logger.exception("預算提醒推播失敗（%d 位收件人）", len(batch))
+                break
+            for user_id in batch:
+                on_sent(user_id)
+            delivered += len(batch)
+            if self._quota_left is not None:
+                self._quota_left -= len(batch)
+        _sent_counter(kind).inc(delivered)
+        if delivered < len(recipients):
+            _deferred_counter(kind).inc(len(recipients) - delivered)
+        return delivered
@@ -1,23 +1,64 @@
+import hashlib
 import json
+import os
+import threading
 import urllib.parse
+from collections import OrderedDict
+from datetime import datetime
 
-def generate_expense_pie_chart(records):
-    """
-    輸入紀錄列表，回傳 QuickChart 圓餅圖 URL
-    """
-    if not records:
-        return None
+from services.chart_render import render_pie_png, render_bar_png
+from services.exporter import EXPORT_LINKS
+from services.json_store import (
+    get_category_totals,
+    get_data_version,
+    get_expense_totals_between,
+    get_monthly_expense_trend
+)
+
+# 圖表產生方式："quickchart"（外部服務產生）或 "local"（本機產生 PNG，由 /charts/<hash>.png 提供）
+CHART_RENDERER = os.environ.get("CHART_RENDERER", "quickchart")
+# 本機產生時，LINE 需要以公開的 https 網址下載圖片，例如 https://example.com
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "").rstrip("/")
+CHART_CACHE_DIR = os.path.join("data", "charts")
+# 本機圖檔最多保留幾張，超過時依最後使用時間（mtime）刪除最舊的
+CHART_CACHE_MAX_FILES = int(os.environ.get("CHART_CACHE_MAX_FILES", "5000"))
+CHART_RENDER_VERSION = "1"  # 畫法改變時遞增，讓舊的快取失效
+CHART_MEMO_SIZE = int(os.environ.get("CHART_MEMO_SIZE", "256"))
 
-    # 1. 統計資料
+COLORS = ["#FF6384", "#36A2EB", "#FFCE56", "#4BC0C0", "#9966FF", "#FF9F40", "#C9CBCF"]
+# 與 COLORS 一一對應的色塊，用於文字圖例
+COLOR_EMOJIS = ["🟥", "🟦", "🟨", "🟩", "🟪", "🟧", "⬜"]
+
+def summarize_by_category(records):
+    """依類別加總金額（保持類別第一次出現的順序）"""
     summary = {}
     for r in records:
         cat = r.get('category', '未分類')
         amt = r.get('amount', 0)
         summary[cat] = summary.get(cat, 0) + amt
+    return summary
+
+def generate_expense_pie_chart(records):
+    """
+    輸入紀錄列表，回傳圓餅圖 URL（QuickChart 或本機產生的 PNG）
+    """
+    if not records:
+        return None
+    return generate_pie_chart_from_summary(summarize_by_category(records))
+
+def generate_pie_chart_from_summary(summary):
+    """
+    輸入已彙總的 {類別: 金額}，回傳圓餅圖 URL；不需要原始紀錄列表
+    """
+    if not summary:
+        return None
+
+    if CHART_RENDERER == "local":
+        return _local_pie_chart_url(summary)
 
     labels = list(summary.keys())
     values = list(summary.values())
-    
+
     # 2. 建立 QuickChart 配置
     chart_config = {
         "type": "pie",
@@ -25,10 +66,7 @@ def generate_expense_pie_chart(records):
             "labels": labels,
             "datasets": [{
                 "data": values,
-                "backgroundColor": [
-                    "#FF6384", "#36A2EB", "#FFCE56", 
-                    "#4BC0C0", "#9966FF", "#FF9F40", "#C9CBCF"
-                ]
+                "backgroundColor": COLORS
             }]
         },
         "options": {
@@ -50,5 +88,157 @@ def generate_expense_pie_chart(records):
     # 3. 轉成 URL
     config_str = json.dumps(chart_config)
     encoded_config = urllib.parse.quote(config_str)
-    
-    return f"https://quickchart.io/chart?c={encoded_config}"
\ No newline at end of file
+
+    return f"https://quickchart.io/chart?c={encoded_config}"
+
+def chart_legend(summary):
+    """圖表的文字圖例：色塊 + 類別 + 金額 + 百分比，每個類別一行"""
+    total = sum(summary.values())
+    lines = []
+    for i, (cat, amt) in enumerate(summary.items()):
+        percent = round(amt / total * 100) if total else 0
+        lines.append(f"{COLOR_EMOJIS[i % len(COLOR_EMOJIS)]} {cat}：${amt}（{percent}%）")
+    return "\n".join(lines)
+
+def check_public_base_url():
+    """啟動時檢查：本機圖表與匯出連結都要給 LINE / 使用者開啟，必須設定絕對網址的 PUBLIC_BASE_URL"""
+    needs = []
+    if CHART_RENDERER == "local":
+        needs.append("CHART_RENDERER=local")
+    if EXPORT_LINKS:
+        needs.append("EXPORT_LINKS=1")
+    if needs and not PUBLIC_BASE_URL.startswith(("https://", "http://")):
+        raise RuntimeError(f"{'、'.join(needs)} 需要設定 PUBLIC_BASE_URL（例如 https://example.com）")
+
+def chart_cache_path(digest):
+    return os.path.join(CHART_CACHE_DIR, f"{digest}.png")
+
+def _chart_available(url):
+    """本機圖檔可能已被淘汰；記憶中的結果指向不存在的檔案時要重新產生"""
+    if CHART_RENDERER != "local" or url is None:
+        return True
+    return os.path.exists(chart_cache_path(url.rsplit("/", 1)[-1][:-len(".png")]))
+
+def generate_trend_bar_chart(trend):
+    """輸入 [(月份, 金額), ...]，回傳逐月支出長條圖 URL"""
+    if not trend or not any(amount for _, amount in trend):
+        return None
+
+    if CHART_RENDERER == "local":
+        return _local_chart_url(["bar", trend], lambda: render_bar_png([a for _, a in trend], COLORS[1]))
+
+    chart_config = {
+        "type": "bar",
+        "data": {
+            "labels": [month for month, _ in trend],
+            "datasets": [{"label": "每月支出", "data": [amount for _, amount in trend], "backgroundColor": COLORS[1]}]
+        },
+        "options": {"plugins": {"legend": {"display": False}}}
+    }
+    return f"https://quickchart.io/chart?c={urllib.parse.quote(json.dumps(chart_config))}"
+
+def _local_pie_chart_url(summary):
+    return _local_chart_url(list(summary.items()), lambda: render_pie_png(list(summary.values()), COLORS))
+
+def _local_chart_url(data, render):
+    """以圖表資料內容雜湊作為檔名；同樣的資料直接沿用已產生的圖檔"""
+    key = json.dumps([CHART_RENDER_VERSION, data], ensure_ascii=False)
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+    path = chart_cache_path(digest)
+    try:
+        # 更新 mtime 作為最後使用時間，淘汰時保留常用的圖
+        os.utime(path)
+    except FileNotFoundError:
+        os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+        png = render()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+        _evict_charts(keep=path)
+    return f"{PUBLIC_BASE_URL}/charts/{digest}.png"
+
+_evict_lock = threading.Lock()
+
+def _evict_charts(keep=None):
+    """圖檔超過 CHART_CACHE_MAX_FILES 張時，依 mtime 刪除最久沒用到的（keep 為剛產生的圖，不刪）"""
+    with _evict_lock:
+        with os.scandir(CHART_CACHE_DIR) as it:
+            entries = [e for e in it if e.name.endswith(".png")]
+        excess = len(entries) - CHART_CACHE_MAX_FILES
+        if excess <= 0:
+            return
+        aged = []
+        for entry in entries:
+            try:
+                aged.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+        aged.sort()
+        for _, path in aged[:excess]:
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+class _ChartMemo:
+    """(user_id, 資料版本) -> (圖表 URL, 圖例) 的 LRU 快取"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+_memo = _ChartMemo(CHART_MEMO_SIZE)
+
+def user_pie_chart(user_id, start=None, end=None):
+    """
+    回傳使用者的 (圓餅圖 URL, 圖例文字)，沒有紀錄時回傳 None。
+    指定 [start, end) 時只統計該期間的支出；未指定則為歷來所有紀錄。
+    資料版本沒變（期間沒有新增/刪除）時直接沿用上次的結果，不重新彙總與編碼。
+    """
+    key = ("pie", user_id, get_data_version(user_id), start, end)
+    cached = _memo.get(key)
+    if cached is not None and _chart_available(cached[0]):
+        return cached
+
+    if start is None:
+        summary = get_category_totals(user_id)
+    else:
+        summary = get_expense_totals_between(user_id, start, end)
+    url = generate_pie_chart_from_summary(summary)
+    result = (url, chart_legend(summary)) if url else None
+    if result is not None:
+        _memo.put(key, result)
+    return result
+
+def user_trend_chart(user_id, months=6):
+    """回傳使用者最近幾個月的 (支出長條圖 URL, 逐月金額文字)，沒有支出時回傳 None"""
+    # 月份會隨時間前進，因此本月也納入快取鍵
+    key = ("trend", user_id, get_data_version(user_id), months, datetime.now().strftime("%Y-%m"))
+    cached = _memo.get(key)
+    if cached is not None and _chart_available(cached[0]):
+        return cached
+
+    trend = get_monthly_expense_trend(user_id, months)
+    url = generate_trend_bar_chart(trend)
+    result = (url, "\n".join(f"{month}：${amount}" for month, amount in trend)) if url else None
+    if result is not None:
+        _memo.put(key, result)
+    return result
@@ -0,0 +1,94 @@
+#chart_render.py
+import math
+import struct
+import zlib
+
+def encode_png(width, height, rows):
+    """rows 為每一列的 RGB bytes（長度 width * 3），輸出 PNG 檔內容"""
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    raw = b"".join(b"\x00" + row for row in rows)  # 每列前面的 0 代表不使用 filter
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 9))
+        + chunk(b"IEND", b"")
+    )
+
+def hex_to_rgb(color):
+    color = color.lstrip("#")
+    return bytes(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+def render_pie_png(values, colors, size=480, background="#FFFFFF"):
+    """
+    畫出圓餅圖（由 12 點鐘方向順時針排列），回傳 PNG bytes。
+    純 Python 實作，不依賴 matplotlib / Pillow；結果會被快取，只有資料改變時才需要重畫。
+    """
+    total = float(sum(values))
+    bg = hex_to_rgb(background)
+    if total <= 0:
+        return encode_png(size, size, [bg * size] * size)
+
+    # 每個扇形的結束角度（0 ~ 2π，以 12 點鐘方向為 0，順時針增加）
+    bounds = []
+    running = 0.0
+    for v in values:
+        running += v
+        bounds.append(running / total * 2 * math.pi)
+    fills = [hex_to_rgb(colors[i % len(colors)]) for i in range(len(values))]
+
+    center = (size - 1) / 2.0
+    radius = size * 0.46
+    r2 = radius * radius
+    two_pi = 2 * math.pi
+    rows = []
+    for y in range(size):
+        dy = y - center
+        row = bytearray(bg * size)
+        if dy * dy <= r2:
+            half = math.sqrt(r2 - dy * dy)
+            x_start = max(0, int(math.ceil(center - half)))
+            x_end = min(size - 1, int(math.floor(center + half)))
+            for x in range(x_start, x_end + 1):
+                angle = math.atan2(x - center, -dy)
+                if angle < 0:
+                    angle += two_pi
+                i = 0
+                while i < len(bounds) - 1 and angle > bounds[i]:
+                    i += 1
+                row[x * 3:x * 3 + 3] = fills[i]
+        rows.append(bytes(row))
+    return encode_png(size, size, rows)
+
+def render_bar_png(values, color, width=640, height=400, background="#FFFFFF", axis_color="#CCCCCC"):
+    """畫出長條圖（由左到右），回傳 PNG bytes；數值標示由呼叫端另以文字提供"""
+    bg = hex_to_rgb(background)
+    fill = hex_to_rgb(color)
+    axis = hex_to_rgb(axis_color)
+    margin = 24
+    baseline = height - margin
+    plot_height = baseline - margin
+    peak = max(values) if values and max(values) > 0 else 1
+
+    slot = (width - margin * 2) / max(1, len(values))
+    bar_width = max(1, int(slot * 0.6))
+    # 每根長條的 (左, 右, 頂端 y)
+    bars = []
+    for i, v in enumerate(values):
+        left = int(margin + slot * i + (slot - bar_width) / 2)
+        top = baseline - int(round(plot_height * max(0, v) / peak))
+        bars.append((left, left + bar_width, top))
+
+    rows = []
+    for y in range(height):
+        row = bytearray(bg * width)
+        if y == baseline:
+            row[margin * 3:(width - margin) * 3] = axis * (width - margin * 2)
+        elif y < baseline:
+            for left, right, top in bars:
+                if y >= top:
+                    row[left * 3:right * 3] = fill * (right - left)
+        rows.append(bytes(row))
+    return encode_png(width, height, rows)
@@ -0,0 +1,52 @@
+#date_ranges.py
+import re
+from datetime import datetime, timedelta
+
+from services.records import next_month, previous_month
+
+_DAYS_RE = re.compile(r"^近?(\d{1,3})\s*[天日]$")
+_DATE_RANGE_RE = re.compile(r"^(\d{4}[-/]\d{1,2}[-/]\d{1,2})\s*[~～到至]\s*(\d{4}[-/]\d{1,2}[-/]\d{1,2})$")
+_MONTH_RE = re.compile(r"^(\d{4})[-/](\d{1,2})$")
+
+def _parse_date(text):
+    return datetime.strptime(text.replace("/", "-"), "%Y-%m-%d")
+
+def parse_chart_range(arg, now=None):
+    """
+    解析圖表指令後面的時間區間，回傳 (start, end, 顯示名稱)，區間為 [start, end)；無法解析時回傳 None。
+    支援：本月（預設）、上月、近7天 / 30天、2025-12、2025-12-01~2025-12-31
+    """
+    now = now or datetime.now()
+    arg = arg.strip()
+    this_month = now.strftime("%Y-%m")
+
+    if arg in ("", "本月"):
+        return this_month, next_month(this_month), "本月"
+    if arg == "上月":
+        last_month = previous_month(this_month)
+        return last_month, this_month, "上月"
+
+    match = _DAYS_RE.match(arg)
+    if match and int(match.group(1)) > 0:
+        days = int(match.group(1))
+        start = (now - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        end = (now + timedelta(days=1)).strftime("%Y-%m-%d")
+        return start, end, f"近{days}天"
+
+    match = _MONTH_RE.match(arg)
+    if match and 1 <= int(match.group(2)) <= 12:
+        month = f"{int(match.group(1)):04d}-{int(match.group(2)):02d}"
+        return month, next_month(month), month
+
+    match = _DATE_RANGE_RE.match(arg)
+    if match:
+        try:
+            first, last = _parse_date(match.group(1)), _parse_date(match.group(2))
+        except ValueError:
+            return None
+        if last < first:
+            first, last = last, first
+        start = first.strftime("%Y-%m-%d")
+        end = (last + timedelta(days=1)).strftime("%Y-%m-%d")
+        return start, end, f"{start} ~ {last.strftime('%Y-%m-%d')}"
+    return None
@@ -0,0 +1,105 @@
+#event_dedup.py
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+from services.fileio import atomic_write_text
+
+class ProcessedEvents:
+    """
+    已處理過的 webhookEventId（LRU，最多保留 capacity 筆）。
+    記憶體中以 OrderedDict 查詢；每筆新 ID 追加寫入 path，重啟後仍能辨識 LINE 的重送事件。
+    檔案行數超過 capacity 的兩倍時改寫成只剩最近的 capacity 筆。
+    """
+
+    def __init__(self, path, capacity=10000):
+        self.path = path
+        self.capacity = capacity
+        self._ids = OrderedDict()
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    event_id = line.strip()
+                    if event_id:
+                        self._remember(event_id)
+                        self._lines += 1
+        self._loaded = True
+
+    def _remember(self, event_id):
+        self._ids[event_id] = True
+        self._ids.move_to_end(event_id)
+        while len(self._ids) > self.capacity:
+            self._ids.popitem(last=False)
+
+    def mark(self, event_id):
+        """登記事件 ID；回傳 True 表示第一次看到，False 表示重複（應略過）"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if event_id in self._ids:
+                self._ids.move_to_end(event_id)
+                return False
+            self._remember(event_id)
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if self._lines >= self.capacity * 2:
+                atomic_write_text(self.path, "".join(i + "\n" for i in self._ids))
+                self._lines = len(self._ids)
+            else:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(event_id + "\n")
+                self._lines += 1
+            return True
+
+    def forget(self, event_id):
+        """取消登記（處理失敗時），讓 LINE 重送的同一事件可以再處理一次"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if self._ids.pop(event_id, None) is None:
+                return
+            # 處理失敗很少發生，直接改寫整個檔案
+            atomic_write_text(self.path, "".join(i + "\n" for i in self._ids))
+            self._lines = len(self._ids)
+
+PROCESSED_EVENTS_PATH = os.path.join("data", "processed_events.txt")
+PROCESSED_EVENTS_CAPACITY = int(os.environ.get("PROCESSED_EVENTS_CAPACITY", "10000"))
+
+processed_events = ProcessedEvents(PROCESSED_EVENTS_PATH, PROCESSED_EVENTS_CAPACITY)
+
+def is_duplicate(event):
+    """LINE 重送（或重複收到）的事件回傳 True；沒有 webhookEventId 的事件一律視為新事件"""
+    event_id = getattr(event, "webhook_event_id", None)
+    if not event_id:
+        return False
+    return not processed_events.mark(event_id)
+
+def forget_event(event):
+    """事件處理失敗時呼叫：取消 is_duplicate 的登記，LINE 重送時會再處理"""
+    event_id = getattr(event, "webhook_event_id", None)
+    if event_id:
+        processed_events.forget(event_id)
+
+def skip_duplicate_events(func):
+    """
+    處理函式的裝飾器：重複的事件直接略過，不執行任何處理邏輯。
+    事件在處理前就先登記（處理中收到的重送也會被略過），處理函式拋出例外時取消登記。
+    """
+    @functools.wraps(func)
+    def wrapper(event):
+        if is_duplicate(event):
+            return None
+        try:
+            return func(event)
+        except Exception:
+            forget_event(event)
+            raise
+    return wrapper
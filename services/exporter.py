@@ -0,0 +1,108 @@
+#exporter.py
+# 串流匯出使用者的記帳紀錄（CSV / JSON Lines，可 gzip），以及有時效的簽章下載連結
+import csv
+import hashlib
+import hmac
+import io
+import json
+import os
+import re
+import secrets
+import time
+import zlib
+from urllib.parse import urlencode
+
+from services.json_store import iter_user_transactions
+
+# 下載連結的簽章金鑰；多個行程 / 重新啟動後仍要能驗證時，請以環境變數指定同一把金鑰
+EXPORT_SIGNING_KEY = os.environ.get("EXPORT_SIGNING_KEY") or secrets.token_hex(32)
+# 「匯出」指令是否回覆下載連結；預設關閉，開啟時需要設定 PUBLIC_BASE_URL
+EXPORT_LINKS = os.environ.get("EXPORT_LINKS", "0") == "1"
+EXPORT_LINK_TTL = int(os.environ.get("EXPORT_LINK_TTL", "3600"))  # 秒
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+EXPORT_FIELDS = ("id", "time", "type", "category", "amount", "memo")
+EXPORT_FORMATS = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson; charset=utf-8"}
+SIGNED_PARAMS = ("user", "format", "start", "end", "gzip", "expires")
+_PERIOD = re.compile(r"^\d{4}-\d{2}(-\d{2})?$")
+
+def _signature(params):
+    message = json.dumps([params.get(k, "") for k in SIGNED_PARAMS])
+    return hmac.new(EXPORT_SIGNING_KEY.encode("utf-8"), message.encode("utf-8"), hashlib.sha256).hexdigest()
+
+def export_query(user_id, fmt="csv", start=None, end=None, compress=False, ttl=None):
+    """產生下載連結的 query string（含到期時間與簽章）"""
+    params = {
+        "user": user_id, "format": fmt, "start": start or "", "end": end or "",
+        "gzip": "1" if compress else "0", "expires": str(int(time.time()) + (ttl or EXPORT_LINK_TTL))
+    }
+    params["sig"] = _signature(params)
+    return urlencode(params)
+
+def verify_export_query(params):
+    """
+    驗證下載連結的參數，通過時回傳 (user_id, 格式, start, end, 是否 gzip)，否則回傳 None。
+    params 為 dict-like（Flask 的 request.args、aiohttp 的 request.query 皆可）。
+    """
+    values = {k: params.get(k, "") for k in SIGNED_PARAMS}
+    if not hmac.compare_digest(_signature(values), params.get("sig", "")):
+        return None
+    if not values["expires"].isdigit() or int(values["expires"]) < time.time():
+        return None
+    if values["format"] not in EXPORT_FORMATS:
+        return None
+    if any(v and not _PERIOD.match(v) for v in (values["start"], values["end"])):
+        return None
+    return values["user"], values["format"], values["start"] or None, values["end"] or None, values["gzip"] == "1"
+
+def export_filename(fmt, start=None, end=None, compress=False):
+    period = f"{start}_{end}" if start or end else "all"
+    return f"ledger_{period}.{fmt}" + (".gz" if compress else "")
+
+def iter_csv(records):
+    """逐筆轉成 CSV，每累積 EXPORT_CHUNK_BYTES 輸出一次（開頭加 BOM，讓 Excel 正確判斷 UTF-8）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_FIELDS)
+    for r in records:
+        writer.writerow([r.get(f, "") for f in EXPORT_FIELDS])
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def iter_jsonl(records):
+    """逐筆轉成 JSON Lines，每累積 EXPORT_CHUNK_BYTES 輸出一次"""
+    lines = []
+    size = 0
+    for r in records:
+        line = json.dumps({f: r.get(f, "") for f in EXPORT_FIELDS}, ensure_ascii=False) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(lines).encode("utf-8")
+            lines = []
+            size = 0
+    if lines:
+        yield "".join(lines).encode("utf-8")
+
+def gzip_chunks(chunks):
+    """以 gzip 格式逐段壓縮，不需要先取得完整內容"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31：gzip 標頭
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+def export_stream(user_id, fmt="csv", start=None, end=None, compress=False):
+    """
+    回傳逐段產生匯出內容（bytes）的 generator；紀錄直接從儲存層逐筆讀出，
+    不論歷史紀錄多少，記憶體用量都只有一個 chunk。
+    """
+    records = iter_user_transactions(user_id, start, end)
+    chunks = iter_csv(records) if fmt == "csv" else iter_jsonl(records)
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,192 @@
+#fileio.py
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from services import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，只保留行程內的執行緒鎖
+    fcntl = None
+
+def io_histogram(phase):
+    """儲存層 I/O 各階段的耗時：read 讀檔、parse 解析 JSON、serialize 轉成 JSON、write 寫檔與 fsync、index 重建索引"""
+    return metrics.histogram("store_io_seconds", "儲存層 I/O 各階段的耗時", labels={"phase": phase})
+
+READ_SECONDS = io_histogram("read")
+PARSE_SECONDS = io_histogram("parse")
+SERIALIZE_SECONDS = io_histogram("serialize")
+WRITE_SECONDS = io_histogram("write")
+
+def read_json(path):
+    """讀入並解析 JSON 檔；讀檔與解析分開計時"""
+    with metrics.timer(READ_SECONDS):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    with metrics.timer(PARSE_SECONDS):
+        return json.loads(text)
+
+def file_signature(path):
+    """檔案的 (mtime, size)，不存在時為 None；用來偵測檔案是否被修改"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def write_temp_json(path, obj, compact=False):
+    """
+    把 obj 寫到 path 同目錄下的暫存檔並 fsync，回傳暫存檔路徑（之後再以 replace_file 換上）。
+    compact=True 時不縮排、不加空白（較小、解析較快），給只由程式讀取的大檔使用。
+    """
+    with metrics.timer(SERIALIZE_SECONDS):
+        if compact:
+            text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+        else:
+            text = json.dumps(obj, ensure_ascii=False, indent=2)
+    return _write_temp(path, lambda f: f.write(text))
+
+def _write_temp(path, write, binary=False):
+    directory = os.path.dirname(path) or "."
+    with metrics.timer(WRITE_SECONDS):
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with (os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", encoding="utf-8")) as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return tmp_path
+
+def replace_file(tmp_path, path):
+    with metrics.timer(WRITE_SECONDS):
+        os.replace(tmp_path, path)
+        _fsync_dir(os.path.dirname(path) or ".")
+
+def atomic_write_json(path, obj, compact=False):
+    """先寫到同目錄的暫存檔並 fsync，再以 os.replace 原子替換，中途當機也不會留下半截檔案"""
+    replace_file(write_temp_json(path, obj, compact), path)
+
+def atomic_write_bytes(path, chunks):
+    """以同樣的方式原子寫入二進位內容；chunks 為 bytes 的序列，依序寫入"""
+    replace_file(_write_temp(path, lambda f: f.writelines(chunks), binary=True), path)
+
+def atomic_write_text(path, text):
+    replace_file(_write_temp(path, lambda f: f.write(text)), path)
+
+def _fsync_dir(directory):
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def process_lock(path):
+    """以 path + ".lock" 做跨行程的排他鎖（fcntl.flock）"""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+class _PendingUpdate:
+    __slots__ = ("mutate", "done", "result", "error")
+
+    def __init__(self, mutate):
+        self.mutate = mutate
+        self.done = False
+        self.result = None
+        self.error = None
+
+class LockedJsonFile:
+    """
+    JSON 檔案的「讀取 -> 修改 -> 原子寫回」：行程內以執行緒鎖、跨行程以 flock 保護。
+    batching=True 時，排隊等待同一把鎖的修改會由取得鎖的執行緒一次套用、只寫檔一次。
+    cache=True 時保留解析後的內容，檔案的 (mtime, size) 沒變就不重新讀檔；
+    修改直接套用在保留的內容上再寫回（write-through）。此時 read() 回傳的是共用的物件，呼叫端不可修改。
+    generation 在每次從磁碟重新載入時加一（第一次載入或檔案被其他行程修改）。
+    """
+
+    def __init__(self, path, default=list, batching=True, compact=False, cache=False):
+        self.path = path
+        self.default = default
+        self.batching = batching
+        self.compact = compact
+        self.cache = cache
+        self.generation = 0
+        # (signature, data)；整組一起替換，其他執行緒不會讀到不一致的組合
+        self._cached = None
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_lock = threading.Lock()
+
+    def read(self):
+        if not self.cache:
+            if not os.path.exists(self.path):
+                return self.default()
+            return read_json(self.path)
+        signature = file_signature(self.path)
+        cached = self._cached
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        # 先取 signature 再讀檔：讀檔期間若又被修改，下次比對時 signature 不同會再重讀
+        data = self.default() if signature is None else read_json(self.path)
+        self._cached = (signature, data)
+        self.generation += 1
+        return data
+
+    def update(self, mutate):
+        """mutate(data) 直接修改讀入的資料，其回傳值會原樣回傳給呼叫者"""
+        op = _PendingUpdate(mutate)
+        if not self.batching:
+            with self._lock:
+                self._flush([op])
+        else:
+            with self._pending_lock:
+                self._pending.append(op)
+            with self._lock:
+                # 取得鎖時若這筆修改已被前一個執行緒一併寫入，就不必再寫
+                if not op.done:
+                    with self._pending_lock:
+                        batch, self._pending = self._pending, []
+                    self._flush(batch)
+        if op.error is not None:
+            raise op.error
+        return op.result
+
+    def _flush(self, batch):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            with process_lock(self.path):
+                data = self.read()
+                for op in batch:
+                    try:
+                        op.result = op.mutate(data)
+                    except Exception as e:
+                        op.error = e
+                atomic_write_json(self.path, data, self.compact)
+                if self.cache:
+                    # 仍持有跨行程鎖，此時的檔案狀態就是剛寫入的內容
+                    self._cached = (file_signature(self.path), data)
+        except Exception as e:
+            # 保留的內容可能已被修改但沒寫入，下次讀取時從磁碟重新載入
+            self._cached = None
+            for op in batch:
+                op.error = op.error or e
+        finally:
+            for op in batch:
+                op.done = True
@@ -0,0 +1,121 @@
+#flex_template.py
+# 預先編譯的 Flex 模板：骨架在 import 時驗證一次，每次回覆只填入變動的欄位
+from string import Formatter
+
+from pydantic.v1 import PrivateAttr
+from linebot.v3.messaging import FlexComponent, FlexContainer
+
+class Rows:
+    """放在骨架的 list 中，代表一段由呼叫端提供、長度不固定的元件（例如每個類別一列）"""
+
+    def __init__(self, name):
+        self.name = name
+
+class RenderedFlex(FlexContainer):
+    """
+    已填好內容的 Flex 容器，可直接放進 FlexMessage(contents=...)。
+    to_dict 直接回傳模板產生的 dict，不再逐欄位建立 / 驗證 pydantic 模型。
+    """
+    _payload = PrivateAttr()
+
+    def __init__(self, payload):
+        super().__init__(type=payload["type"])
+        self._payload = payload
+
+    def to_dict(self):
+        return self._payload
+
+class FlexTemplate:
+    """
+    skeleton 為一般的 Flex dict，字串中可使用 str.format 的 {欄位}（字面上的大括號請寫成 {{ }}），
+    list 中可放 Rows("名稱") 代表一段可變長度的元件。
+    建立時以 SDK 的模型驗證一次骨架，並確認骨架已是 SDK 輸出的標準形式；
+    有列舉限制的欄位（例如按鈕的 style）無法以 {欄位} 通過驗證，可由 sample 提供驗證用的值。
+    render 時只重建含有欄位的路徑，其餘不變的子樹直接共用（因此回傳的 dict 不可再修改）。
+    """
+
+    def __init__(self, skeleton, model=FlexContainer, sample=None):
+        stripped = _strip_rows(skeleton, _Sample(sample or {}))
+        normalized = model.from_dict(stripped).to_dict()
+        if normalized != stripped:
+            raise ValueError(f"Flex 模板含有 SDK 不認得或非標準的欄位：{stripped}")
+        self._render = _compile(skeleton) or (lambda values: skeleton)
+
+    def render(self, **values):
+        """回傳填好欄位的 dict（可再放進其他模板的 Rows）"""
+        return self._render(values)
+
+    def container(self, **values):
+        """回傳可直接放進 FlexMessage 的容器"""
+        return RenderedFlex(self.render(**values))
+
+def component(skeleton, sample=None):
+    """用於 Rows 的單一元件（box、text、separator 等）模板"""
+    return FlexTemplate(skeleton, model=FlexComponent, sample=sample)
+
+class _Sample(dict):
+    """驗證用的欄位值：沒有提供 sample 的欄位維持 {欄位} 原樣"""
+
+    def __missing__(self, name):
+        return "{" + name + "}"
+
+def _strip_rows(node, sample):
+    """驗證用：拿掉 Rows 標記、套入 sample 後的骨架"""
+    if isinstance(node, dict):
+        return {k: _strip_rows(v, sample) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_strip_rows(v, sample) for v in node if not isinstance(v, Rows)]
+    if isinstance(node, str) and "{" in node:
+        return node.format_map(sample)
+    return node
+
+def _compile(node):
+    """回傳 render(values) -> 節點 的函式；整個子樹都不含欄位時回傳 None，render 時直接共用"""
+    if isinstance(node, str):
+        fields = [name for _, name, _, _ in Formatter().parse(node) if name is not None]
+        if not fields:
+            if "{" in node or "}" in node:
+                text = node.format()  # {{ }} 跳脫的字面大括號
+                return lambda values: text
+            return None
+        if node == "{" + fields[0] + "}":
+            name = fields[0]
+            return lambda values: str(values[name])
+        return lambda values: node.format_map(values)
+
+    if isinstance(node, dict):
+        dynamic = [(k, f) for k, f in ((k, _compile(v)) for k, v in node.items()) if f is not None]
+        if not dynamic:
+            return None
+
+        def render_dict(values):
+            out = dict(node)
+            for k, f in dynamic:
+                out[k] = f(values)
+            return out
+        return render_dict
+
+    if isinstance(node, list):
+        parts = []
+        for item in node:
+            if isinstance(item, Rows):
+                parts.append(("rows", item.name))
+            else:
+                f = _compile(item)
+                parts.append(("static", item) if f is None else ("dynamic", f))
+        if all(kind == "static" for kind, _ in parts):
+            return None
+
+        def render_list(values):
+            out = []
+            for kind, part in parts:
+                if kind == "static":
+                    out.append(part)
+                elif kind == "dynamic":
+                    out.append(part(values))
+                else:
+                    out.extend(values[part])
+            return out
+        return render_list
+
+    return None
@@ -0,0 +1,67 @@
+#group_commit.py
+import threading
+import time
+
+from services import metrics
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+class _Ticket:
+    __slots__ = ("item", "event", "error")
+
+    def __init__(self, item):
+        self.item = item
+        self.event = threading.Event()
+        self.error = None
+
+class GroupCommitter:
+    """
+    寫入緩衝（group commit）：把 window 秒內、或累積到 max_batch 筆的寫入交給 flush(items) 一次寫入。
+    submit() 會等到該筆資料真正寫入完成才返回（寫入失敗則拋出例外），呼叫者可以放心回覆使用者。
+    """
+
+    def __init__(self, flush, window=0.02, max_batch=64, name="group_commit"):
+        self.flush = flush
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flush_seconds = metrics.histogram(f"{name}_flush_seconds", "每次批次寫入所花的時間（秒）")
+        self._batch_size = metrics.histogram(f"{name}_batch_size", "每次批次寫入的筆數", buckets=BATCH_SIZE_BUCKETS)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        ticket = _Ticket(item)
+        with self._cond:
+            self._pending.append(ticket)
+            self._cond.notify()
+        ticket.event.wait()
+        if ticket.error is not None:
+            raise ticket.error
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # 第一筆到達後最多再等 window 秒，或湊滿 max_batch 筆就立即寫入
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                self._pending = self._pending[self.max_batch:]
+
+            started = time.perf_counter()
+            try:
+                self.flush([t.item for t in batch])
+            except Exception as e:
+                for t in batch:
+                    t.error = e
+            self._flush_seconds.observe(time.perf_counter() - started)
+            self._batch_size.observe(len(batch))
+            for t in batch:
+                t.event.set()
@@ -0,0 +1,33 @@
+#ids.py
+import os
+import threading
+import time
+
+# Crockford Base32（不含 I L O U，避免混淆）
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+_lock = threading.Lock()
+_last_ms = -1
+_last_random = 0
+
+def new_id():
+    """
+    ULID 格式的唯一 ID（26 字元）：前 48 bits 為毫秒時間、後 80 bits 為亂數。
+    同一毫秒內產生的 ID 會把亂數部分加一，因此同一行程內保證不重複且依時間遞增。
+    """
+    global _last_ms, _last_random
+    with _lock:
+        now_ms = int(time.time() * 1000)
+        if now_ms <= _last_ms:
+            now_ms = _last_ms
+            _last_random = (_last_random + 1) & ((1 << 80) - 1)
+        else:
+            _last_random = int.from_bytes(os.urandom(10), "big")
+        _last_ms = now_ms
+        value = (now_ms << 80) | _last_random
+
+    chars = []
+    for _ in range(26):
+        chars.append(_ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
@@ -0,0 +1,231 @@
+#importer.py
+# 歷史紀錄批次匯入：逐列解析 CSV / JSON / JSON Lines，驗證後一次寫入
+# CLI：python -m services.importer <user_id> <檔案路徑>
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+from collections import namedtuple
+from datetime import datetime
+
+from services.json_store import add_transactions
+
+IMPORT_MAX_BYTES = int(os.environ.get("IMPORT_MAX_BYTES", str(5 * 1024 * 1024)))
+IMPORT_MAX_ERRORS = 20  # 回報給使用者的錯誤列數上限
+
+# 欄位名稱（英文 / 中文）-> 紀錄欄位
+FIELD_ALIASES = {
+    "id": "id",
+    "time": "time", "date": "time", "datetime": "time", "日期": "time", "時間": "time",
+    "category": "category", "類別": "category", "分類": "category",
+    "amount": "amount", "金額": "amount",
+    "type": "type", "類型": "type", "收支": "type",
+    "memo": "memo", "note": "memo", "備註": "memo", "說明": "memo",
+}
+TYPE_ALIASES = {"expense": "expense", "支出": "expense", "income": "income", "收入": "income"}
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d",
+                "%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M", "%Y/%m/%d")
+
+ImportResult = namedtuple("ImportResult", ["added", "duplicates", "error_count", "errors"])
+
+def detect_format(name, head):
+    """依副檔名判斷格式，沒有副檔名時看第一個非空白字元：[ 為 JSON 陣列、{ 為 JSON Lines，其餘視為 CSV"""
+    ext = os.path.splitext(name or "")[1].lower()
+    if ext in (".csv", ".json", ".jsonl"):
+        return ext[1:]
+    first = head.lstrip(b"\xef\xbb\xbf \t\r\n")[:1]
+    return {b"[": "json", b"{": "jsonl"}.get(first, "csv")
+
+def iter_rows(stream, fmt):
+    """逐列產生 (列號, dict)；stream 為二進位檔案物件，不會一次讀入整個檔案再解析"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for line_no, row in enumerate(csv.DictReader(text), start=2):
+            yield line_no, row
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(text, start=1):
+            if line.strip():
+                yield line_no, _loads(line)
+    else:
+        for item_no, item in enumerate(_iter_json_array(text), start=1):
+            yield item_no, item
+
+def _loads(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+def _iter_json_array(text, chunk_size=65536):
+    """
+    逐一解析 JSON 陣列中的元素，一次只保留一個 chunk 加上尚未解析完的部分。
+    檔案在 ] 之前就結束（上傳被截斷）、元素之間缺少逗號或 ] 之後還有內容時丟出 ValueError；
+    呼叫端在全部解析完才寫入，格式錯誤的檔案不會只匯入一部分。
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos = "", 0
+
+    def _next_char():
+        # 跳過空白後的下一個字元（必要時補讀），檔案結束時回傳 ""
+        nonlocal buffer, pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            buffer, pos = text.read(chunk_size), 0
+            if not buffer:
+                return ""
+
+    if _next_char() != "[":
+        raise ValueError("JSON 檔案必須是紀錄的陣列")
+    pos += 1
+    if _next_char() == "]":
+        pos += 1
+    else:
+        while True:
+            if _next_char() == "":
+                raise ValueError("JSON 檔案不完整（缺少結尾的 ]）")
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    item, end = None, None
+                if end is not None and end < len(buffer) and not _may_continue(item, buffer[end]):
+                    break
+                # 元素可能被 chunk 切斷（數字停在結尾或停在 "2." 這類未完成的位置也可能還沒讀完），補讀後重新解析
+                more = text.read(chunk_size)
+                if not more:
+                    if end is None:
+                        raise ValueError("JSON 格式錯誤")
+                    break
+                buffer, pos = buffer[pos:] + more, 0
+            yield item
+            pos = end
+            separator = _next_char()
+            if separator == "]":
+                pos += 1
+                break
+            if separator == "":
+                raise ValueError("JSON 檔案不完整（缺少結尾的 ]）")
+            if separator != ",":
+                raise ValueError("JSON 格式錯誤（元素之間缺少逗號）")
+            pos += 1
+            if _next_char() == "]":
+                raise ValueError("JSON 格式錯誤（] 之前多了逗號）")
+            # 已解析的部分不再保留
+            buffer, pos = buffer[pos:], 0
+    if _next_char() != "":
+        raise ValueError("JSON 格式錯誤（] 之後還有其他內容）")
+
+def _may_continue(item, next_char):
+    """數字後面接著數字、小數點或指數符號時，數字可能還沒讀完"""
+    return type(item) in (int, float) and next_char in "0123456789.eE+-"
+
+def parse_row(user_id, row):
+    """把一列原始資料驗證並轉成紀錄；格式錯誤時丟出 ValueError（訊息會回報給使用者）"""
+    if not isinstance(row, dict):
+        raise ValueError("無法解析")
+    fields = {}
+    for key, value in row.items():
+        name = FIELD_ALIASES.get(str(key).strip().lower())
+        if name and value is not None:
+            fields[name] = str(value).strip()
+
+    category = fields.get("category")
+    if not category:
+        raise ValueError("缺少類別")
+
+    raw_amount = fields.get("amount", "").replace(",", "").lstrip("$")
+    try:
+        value = float(raw_amount)
+    except ValueError:
+        raise ValueError(f"金額格式錯誤：{fields.get('amount', '')}")
+    if not value.is_integer() or value <= 0:
+        raise ValueError(f"金額必須是大於 0 的整數：{fields['amount']}")
+    amount = int(value)
+
+    record_type = TYPE_ALIASES.get(fields.get("type", "expense").lower() or "expense")
+    if record_type is None:
+        raise ValueError(f"類型必須是 expense / income：{fields['type']}")
+
+    return {
+        "id": fields.get("id") or None,
+        "user_id": user_id,
+        "category": category,
+        "amount": amount,
+        "type": record_type,
+        "memo": fields.get("memo", ""),
+        "time": _parse_time(fields.get("time", ""))
+    }
+
+def _parse_time(value):
+    if not value:
+        raise ValueError("缺少日期")
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    raise ValueError(f"日期格式錯誤：{value}")
+
+CONTENT_FIELDS = ("user_id", "time", "category", "amount", "type", "memo")
+
+def _content_id(content, occurrence):
+    """
+    沒有 id 的列以內容產生固定的 id，同一個檔案重複匯入時不會重複記帳；
+    occurrence 區分同一檔案中內容完全相同的多筆（例如同一天買了兩杯同價的咖啡）。
+    """
+    key = "\x1f".join(str(v) for v in content)
+    return "imp_" + hashlib.sha1(f"{key}\x1f{occurrence}".encode("utf-8")).hexdigest()[:22]
+
+def import_transactions(user_id, stream, name=None):
+    """
+    從檔案物件匯入使用者的紀錄：逐列解析與驗證，全部通過的列以 add_transactions 一次寫入。
+    回傳 ImportResult(新增筆數, 重複略過筆數, 錯誤列數, [(列號, 錯誤訊息), ...])。
+    """
+    stream = stream if hasattr(stream, "peek") else io.BufferedReader(stream)
+    fmt = detect_format(name, stream.peek(64)[:64])
+
+    records = []
+    errors = []
+    error_count = 0
+    occurrences = {}
+    for line_no, row in iter_rows(stream, fmt):
+        try:
+            record = parse_row(user_id, row)
+        except ValueError as e:
+            error_count += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append((line_no, str(e)))
+            continue
+        if record["id"] is None:
+            content = tuple(record[c] for c in CONTENT_FIELDS)
+            occurrence = occurrences.get(content, 0)
+            occurrences[content] = occurrence + 1
+            record["id"] = _content_id(content, occurrence)
+        records.append(record)
+
+    added = add_transactions(user_id, records) if records else 0
+    return ImportResult(added, len(records) - added, error_count, errors)
+
+def format_result(result):
+    """匯入結果的文字摘要（回覆訊息與 CLI 共用）"""
+    lines = [f"📥 匯入完成：新增 {result.added} 筆"]
+    if result.duplicates:
+        lines.append(f"↩️ 已存在而略過：{result.duplicates} 筆")
+    if result.error_count:
+        lines.append(f"⚠️ 格式錯誤：{result.error_count} 筆")
+        lines.extend(f"  第 {line_no} 列：{message}" for line_no, message in result.errors)
+        if result.error_count > len(result.errors):
+            lines.append("  ……")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("用法：python -m services.importer <user_id> <檔案路徑>")
+        sys.exit(1)
+    with open(sys.argv[2], "rb") as f:
+        print(format_result(import_transactions(sys.argv[1], f, sys.argv[2])))
@@ -0,0 +1,212 @@
+#journal.py
+import json
+import logging
+import os
+import threading
+
+from services import metrics
+from services.fileio import (
+    write_temp_json, replace_file, process_lock, read_json, file_signature,
+    READ_SECONDS, PARSE_SECONDS, SERIALIZE_SECONDS, WRITE_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+class JournalError(ValueError):
+    """日誌中間有無法解析的行（不是程式中斷留下的最後半行），不能略過"""
+
+class TransactionJournal:
+    """
+    追加式（append-only）記帳日誌：
+    - base_path：壓實後的完整紀錄（即原本的 transactions.json，JSON 陣列）
+    - journal_path：每行一筆 JSON 操作（add / delete），寫入只需追加一行
+    累積超過 compact_threshold 行時，於背景執行緒把日誌併回 base_path。
+    重播時同一使用者已存在相同 id 的 add 會略過，壓實中途當機、base 已含舊日誌的內容時也不會重複。
+    on_compact(old_signature, new_signature) 會在壓實改變檔案狀態（但不改變內容）時被呼叫。
+    """
+
+    def __init__(self, base_path, journal_path, compact_threshold=500, on_compact=None):
+        self.base_path = base_path
+        self.journal_path = journal_path
+        self.compacting_path = journal_path + ".compacting"
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._pending = None  # 日誌中尚未壓實的行數（None 表示尚未計算）
+        self._compactor = None
+        self.on_compact = on_compact
+
+    def signature(self):
+        """base 與日誌檔的 (mtime, size)，用來偵測檔案是否被修改"""
+        return tuple(file_signature(p) for p in (self.base_path, self.compacting_path, self.journal_path))
+
+    # --- 寫入 ---
+    def append_add(self, record):
+        self.append({"op": "add", "record": record})
+
+    def append_delete(self, user_id, record_id):
+        self.append({"op": "delete", "user_id": user_id, "id": record_id})
+
+    def append(self, entry):
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        """一次追加多筆操作，只寫檔並 fsync 一次"""
+        with metrics.timer(SERIALIZE_SECONDS):
+            data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        data = data.encode("utf-8")
+        with self._lock:
+            directory = os.path.dirname(self.journal_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with process_lock(self.journal_path), open(self.journal_path, "ab+") as f:
+                with metrics.timer(WRITE_SECONDS):
+                    _trim_torn_tail(f, self.journal_path)
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            if self._pending is None:
+                self._pending = self._count_lines(self.journal_path)
+            else:
+                self._pending += len(entries)
+        self.maybe_compact()
+
+    # --- 讀取 ---
+    def load(self):
+        """回傳目前所有紀錄（base + 尚未壓實的日誌），保持寫入順序"""
+        directory = os.path.dirname(self.journal_path)
+        if directory and not os.path.isdir(directory):
+            # 還沒有任何寫入（日誌目錄不存在，也無法建立鎖檔）
+            return self._read_base()
+        # 持有日誌的跨行程鎖：讀取期間其他行程（或其他實例）不會把日誌換名成壓實檔，否則換名前後各讀到一半會漏掉整段日誌。
+        # 先讀壓實檔再讀 base：期間其他壓實完成時 base 已含壓實檔的內容，重複的 add 由 _replay 略過，不會遺漏
+        with self._lock, process_lock(self.journal_path):
+            compacting = self._read_entries(self.compacting_path)
+            records = self._read_base()
+            # 壓實中的舊日誌要先於新日誌重播
+            return self._replay(records, compacting + self._read_entries(self.journal_path))
+
+    def _read_base(self):
+        if not os.path.exists(self.base_path):
+            return []
+        return read_json(self.base_path)
+
+    @staticmethod
+    def _read_entries(path):
+        """日誌會定期壓實、不會太長，整份讀入後再逐行解析，讀檔與解析分開計時"""
+        if not os.path.exists(path):
+            return []
+        with metrics.timer(READ_SECONDS):
+            with open(path, "r", encoding="utf-8") as f:
+                # 只以 "\n" 分行：備註中的 U+2028 等字元不會被 json.dumps 跳脫，splitlines 會把它們切開
+                lines = f.read().split("\n")
+        while lines and not lines[-1].strip():
+            lines.pop()
+        entries = []
+        with metrics.timer(PARSE_SECONDS):
+            for number, line in enumerate(lines, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    if number == len(lines):
+                        # 程式中斷時最後一行可能只寫了一半（尚未回應使用者），略過；下次追加前會先截掉
+                        logger.warning("略過日誌最後不完整的一行：%s", path)
+                        continue
+                    raise JournalError(f"{path} 第 {number} 行無法解析，日誌可能已損毀")
+        return entries
+
+    @staticmethod
+    def _replay(records, entries):
+        """
+        依序套用日誌；同一使用者已存在相同 id 的 add 略過（重播可重複執行）。
+        以 (user_id, id) 判斷重複：舊版的 id 是毫秒時間，不同使用者的紀錄可能相同。
+        """
+        keys = {(r.get("user_id"), r.get("id")) for r in records if r.get("id") is not None}
+        for entry in entries:
+            if entry.get("op") == "add":
+                record = entry["record"]
+                key = (record.get("user_id"), record.get("id"))
+                if record.get("id") is not None:
+                    if key in keys:
+                        continue
+                    keys.add(key)
+                records.append(record)
+            elif entry.get("op") == "delete":
+                kept = [r for r in records if not (r.get("id") == entry["id"] and r["user_id"] == entry["user_id"])]
+                if len(kept) != len(records):
+                    keys.discard((entry["user_id"], entry["id"]))
+                records = kept
+        return records
+
+    @staticmethod
+    def _count_lines(path):
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb") as f:
+            return sum(1 for _ in f)
+
+    # --- 壓實 ---
+    def maybe_compact(self):
+        """日誌過長時啟動背景壓實（同一時間只會有一個壓實執行緒）"""
+        with self._lock:
+            if (self._pending or 0) < self.compact_threshold:
+                return
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self.compact, daemon=True)
+            self._compactor.start()
+
+    def compact(self):
+        """
+        把日誌併回 base 檔，完成後清除已併入的日誌。
+        整個過程持有壓實專用的跨行程鎖，多個行程不會同時壓實；追加只在換名時短暫等待。
+        """
+        with process_lock(self.compacting_path):
+            with self._lock:
+                # 先把目前的日誌換名，之後的寫入會落在新的日誌檔，不必等待壓實完成
+                if os.path.exists(self.journal_path) and not os.path.exists(self.compacting_path):
+                    before = self.signature()
+                    with process_lock(self.journal_path):
+                        os.replace(self.journal_path, self.compacting_path)
+                    self._notify(before)
+                self._pending = 0
+                if not os.path.exists(self.compacting_path):
+                    return
+                records = self._read_base()
+
+            records = self._replay(records, self._read_entries(self.compacting_path))
+
+            tmp_path = write_temp_json(self.base_path, records, compact=True)
+            with self._lock:
+                before = self.signature()
+                replace_file(tmp_path, self.base_path)
+                # 在這裡當機時 base 已含舊日誌的內容，重播時由 _replay 略過重複的 add
+                os.remove(self.compacting_path)
+                self._notify(before)
+
+    def _notify(self, before):
+        if self.on_compact is not None:
+            self.on_compact(before, self.signature())
+
+def _trim_torn_tail(f, path):
+    """f 以 "ab+" 開啟；檔案結尾不是換行時（上次寫到一半就中斷），截回最後一個換行，避免新的一行接在殘行後面"""
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size == 0:
+        return
+    f.seek(size - 1)
+    if f.read(1) == b"\n":
+        return
+    pos = size
+    while pos > 0:
+        step = min(4096, pos)
+        pos -= step
+        f.seek(pos)
+        newline = f.read(step).rfind(b"\n")
+        if newline >= 0:
+            pos += newline + 1
+            break
+    logger.warning("截掉日誌結尾不完整的 %d bytes：%s", size - pos, path)
+    f.truncate(pos)
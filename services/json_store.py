@@ -1,99 +1,351 @@
 #json_store.py
-import json
+import atexit
+import logging
 import os
-import time
-from datetime import datetime
+import threading
+
+from services import metrics
+from services.fileio import LockedJsonFile, io_histogram
+from services.group_commit import GroupCommitter
+from services.journal import TransactionJournal
+from services.records import new_record, current_month, next_month, previous_month
+from services.sharding import shard_of, shard_dir
+from services.snapshot import Snapshot
+from services.tx_index import TransactionIndex
 
 DATA_DIR = "data"
 FILE_PATH = os.path.join(DATA_DIR, "transactions.json")
+JOURNAL_PATH = os.path.join(DATA_DIR, "transactions.jsonl")
 BUDGET_FILE = os.path.join(DATA_DIR, "budgets.json")
 
-def add_transaction(user_id, data):
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
+# 儲存後端："json"（本檔的 JSON 檔案儲存）或 "sqlite"（services/sqlite_store.py）
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
 
-    if os.path.exists(FILE_PATH):
-        with open(FILE_PATH, "r", encoding="utf-8") as f:
-            records = json.load(f)
-    else:
-        records = []
+# JSON 儲存模式："journal"（追加日誌 + 背景壓實）或 "file"（每次整檔重寫）
+STORAGE_MODE = os.environ.get("JSON_STORE_MODE", "journal")
+JOURNAL_COMPACT_THRESHOLD = int(os.environ.get("JOURNAL_COMPACT_THRESHOLD", "500"))
+
+# 檔案配置："single"（所有使用者共用一組檔案）或 "sharded"（依 user_id 雜湊分到 DATA_DIR/shards/NNN/）
+STORAGE_LAYOUT = os.environ.get("JSON_STORE_LAYOUT", "single")
+SHARD_COUNT = int(os.environ.get("JSON_SHARD_COUNT", "16"))
+
+# 同一檔案上排隊中的整檔寫入合併成一次寫檔（"0" 關閉，每次修改各自寫檔）
+BATCH_WRITES = os.environ.get("JSON_STORE_BATCH_WRITES", "1") == "1"
+
+# 新增紀錄的 group commit：等待視窗（毫秒，0 表示關閉）與單批上限筆數
+GROUP_COMMIT_MS = float(os.environ.get("JSON_GROUP_COMMIT_MS", "0"))
+GROUP_COMMIT_MAX = int(os.environ.get("JSON_GROUP_COMMIT_MAX", "64"))
+
+# 索引的二進位快照（transactions.snapshot）：重新啟動時載入快照，不必解析整份 JSON；
+# 快照與目前的 JSON / 日誌不一致時自動改由 JSON 重建。重建後與正常結束時寫出。
+SNAPSHOT_ENABLED = os.environ.get("JSON_STORE_SNAPSHOT", "1") == "1"
+
+INDEX_SECONDS = io_histogram("index")
+SNAPSHOT_SECONDS = io_histogram("snapshot")
+
+logger = logging.getLogger(__name__)
+
+class _Shard:
+    """一組 transactions.json / budgets.json 及其日誌、索引與鎖；不同分片的讀寫互不阻塞"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.file_path = os.path.join(directory, "transactions.json")
+        self.budget_file = os.path.join(directory, "budgets.json")
+        self.snapshot_path = os.path.join(directory, "transactions.snapshot")
+        self.transactions = LockedJsonFile(self.file_path, list, BATCH_WRITES, compact=True)
+        # 額度設定常駐記憶體（整份只載入一次），set_budget 修改後直接寫回；檔案被外部修改時才重新讀檔
+        self.budgets = LockedJsonFile(self.budget_file, dict, BATCH_WRITES, compact=True, cache=True)
+        self.budget_versions = {}
+        self.index = TransactionIndex()
+        self.journal = TransactionJournal(self.file_path, os.path.join(directory, "transactions.jsonl"),
+                                          JOURNAL_COMPACT_THRESHOLD, on_compact=self.index.replace_signature)
+        self.lock = threading.RLock()
+        # 匯入時「比對既有 id -> 寫入」整段持有，同一使用者同時匯入同一個檔案時不會兩邊都寫入
+        self.import_lock = threading.Lock()
+        # 快照只在第一次載入時嘗試；之後檔案被外部修改時一律由 JSON 重建
+        self.snapshot_checked = not SNAPSHOT_ENABLED
+        # 本行程正在寫入、但尚未反映到索引的筆數；期間檔案狀態改變是自己造成的，不觸發重建
+        self.writes_in_flight = 0
+        self.insert_buffer = None
+        if GROUP_COMMIT_MS > 0:
+            self.insert_buffer = GroupCommitter(self.insert_many, GROUP_COMMIT_MS / 1000, GROUP_COMMIT_MAX,
+                                                name="json_store_group_commit")
+
+    def load_all_records(self):
+        if STORAGE_MODE == "journal":
+            return self.journal.load()
+        return self.transactions.read()
+
+    def get_index(self):
+        """取得記帳索引；第一次使用或資料檔被外部修改時才重新載入"""
+        with self.lock:
+            if self.writes_in_flight == 0:
+                signature = self.journal.signature()
+                if self.index.signature != signature and not self.load_snapshot(signature):
+                    records = self.load_all_records()
+                    with metrics.timer(INDEX_SECONDS):
+                        self.index.rebuild(records, signature)
+                    del records
+                    if SNAPSHOT_ENABLED:
+                        self.save_snapshot()
+            return self.index
+
+    def load_snapshot(self, signature):
+        """第一次載入時，若快照與目前的資料檔一致就直接掛上（使用者的資料之後才逐一載入）"""
+        if self.snapshot_checked:
+            return False
+        self.snapshot_checked = True
+        with metrics.timer(SNAPSHOT_SECONDS):
+            snapshot = Snapshot.open(self.snapshot_path, signature)
+        if snapshot is None:
+            return False
+        self.index.attach(snapshot)
+        return True
+
+    def save_snapshot(self):
+        """把目前的索引寫成快照；寫入中的異動尚未反映到索引時略過"""
+        with self.lock:
+            if self.writes_in_flight:
+                return
+            try:
+                with metrics.timer(SNAPSHOT_SECONDS):
+                    self.index.save(self.snapshot_path)
+            except OSError:
+                logger.exception("無法寫出快照：%s", self.snapshot_path)
+
+    def write(self, journal_entries, mutate, apply_to_index):
+        """
+        寫入異動：journal 模式追加日誌，file 模式以 mutate 修改整份紀錄後原子寫回。
+        檔案寫入不持有分片鎖，讓同時排隊的寫入可以合併成一次寫檔；完成後才更新索引。
+        """
+        with self.lock:
+            index = self.get_index()
+            self.writes_in_flight += 1
+        try:
+            if STORAGE_MODE == "journal":
+                self.journal.append_many(journal_entries)
+            else:
+                self.transactions.update(mutate)
+        except Exception:
+            with self.lock:
+                self.writes_in_flight -= 1
+            raise
+        with self.lock:
+            self.writes_in_flight -= 1
+            return apply_to_index(index, self.journal.signature())
+
+    def insert_many(self, records):
+        """一次寫入多筆新紀錄（group commit 的寫入函式）"""
+        def _apply(index, signature):
+            index.add_many(records, signature)
+        self.write([{"op": "add", "record": r} for r in records],
+                   lambda all_records: all_records.extend(records),
+                   _apply)
+
+    def ensure_dir(self):
+        # 多個執行緒可能同時建立同一個分片目錄
+        os.makedirs(self.directory, exist_ok=True)
+
+_shards = {}
+_shards_lock = threading.Lock()
+
+def _shard(user_id):
+    return _shard_by_key(shard_of(user_id, SHARD_COUNT) if STORAGE_LAYOUT == "sharded" else None)
+
+def _all_shards():
+    if STORAGE_LAYOUT == "sharded":
+        return [_shard_by_key(key) for key in range(SHARD_COUNT)]
+    return [_shard_by_key(None)]
+
+def _shard_by_key(key):
+    shard = _shards.get(key)
+    if shard is None:
+        with _shards_lock:
+            shard = _shards.get(key)
+            if shard is None:
+                shard = _Shard(DATA_DIR if key is None else shard_dir(DATA_DIR, key))
+                _shards[key] = shard
+    return shard
+
+def add_transaction(user_id, data):
+    shard = _shard(user_id)
+    shard.ensure_dir()
 
     # 新增一筆記帳
-    record = {
-        "id": str(int(time.time() * 1000)),
-        "user_id": user_id,
-        "category": data["category"],
-        "amount": data["amount"],
-        "type": data["type"],
-        "memo": data.get("memo", ""),
-        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
-
-    records.append(record)
-    with open(FILE_PATH, "w", encoding="utf-8") as f:
-        json.dump(records, f, ensure_ascii=False, indent=2)
+    record = new_record(user_id, data)
+
+    if shard.insert_buffer is not None:
+        # 與同一時間窗內的其他新增合併寫入；返回時已確實寫入磁碟
+        shard.insert_buffer.submit(record)
+    else:
+        shard.insert_many([record])
     return {"status": True}
 
+def add_transactions(user_id, records):
+    """
+    一次寫入多筆已建立好的紀錄（匯入用）：只寫一次檔（日誌一次追加），索引與統計增量更新。
+    id 已存在或同一批內重複的紀錄會略過，回傳實際新增的筆數。
+    """
+    shard = _shard(user_id)
+    shard.ensure_dir()
+    # 不持有分片鎖寫檔（讀取與一般記帳不必等匯入寫完），改以匯入專用的鎖讓比對與寫入不被其他匯入插隊
+    with shard.import_lock:
+        with shard.lock:
+            existing = shard.get_index().record_ids(user_id)
+        fresh = []
+        for record in records:
+            if record["id"] not in existing:
+                existing.add(record["id"])
+                fresh.append(record)
+        if fresh:
+            shard.insert_many(fresh)
+    return len(fresh)
+
 def get_user_transactions(user_id):
-    if os.path.exists(FILE_PATH):
-        with open(FILE_PATH, "r", encoding="utf-8") as f:
-            all_records = json.load(f)
-            # 過濾出屬於該 user_id 的紀錄
-            user_records = [r for r in all_records if r["user_id"] == user_id]
-            return user_records
-    return []
+    # 直接從索引取出屬於該 user_id 的紀錄
+    return _shard(user_id).get_index().user_records(user_id)
 
 def set_budget(user_id, category, amount):
     """設定使用者的類別額度"""
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-    
-    budgets = {}
-    if os.path.exists(BUDGET_FILE):
-        with open(BUDGET_FILE, "r", encoding="utf-8") as f:
-            budgets = json.load(f)
-    
-    if user_id not in budgets:
-        budgets[user_id] = {}
-    
-    budgets[user_id][category] = amount
-    
-    with open(BUDGET_FILE, "w", encoding="utf-8") as f:
-        json.dump(budgets, f, ensure_ascii=False, indent=2)
+    shard = _shard(user_id)
+    shard.ensure_dir()
+
+    def _set(budgets):
+        budgets.setdefault(user_id, {})[category] = amount
+    shard.budgets.update(_set)
+    # 寫入完成後才遞增版本，依版本快取的結果不會搭配到舊的額度
+    with shard.lock:
+        shard.budget_versions[user_id] = shard.budget_versions.get(user_id, 0) + 1
 
 def get_user_budgets(user_id):
-    """取得使用者的所有額度設定"""
-    if os.path.exists(BUDGET_FILE):
-        with open(BUDGET_FILE, "r", encoding="utf-8") as f:
-            budgets = json.load(f)
-            return budgets.get(user_id, {})
-    return {}
+    """取得使用者的所有額度設定（回傳複本）"""
+    return dict(_shard(user_id).budgets.read().get(user_id, {}))
+
+def iter_all_budgets():
+    """逐一產生 (user_id, 額度設定複本)，涵蓋所有有設定額度的使用者（背景預算提醒用）"""
+    for shard in _all_shards():
+        for user_id, budgets in list(shard.budgets.read().items()):
+            yield user_id, dict(budgets)
+
+def get_budget_version(user_id):
+    """使用者額度設定的版本；設定額度或 budgets.json 被外部修改後會改變"""
+    shard = _shard(user_id)
+    # 先讀取一次，檔案被外部修改時在此重新載入並更新 generation
+    shard.budgets.read()
+    return (shard.budgets.generation, shard.budget_versions.get(user_id, 0))
 
 def get_monthly_summary(user_id):
     """計算本月各類別的支出總和"""
-    records = get_user_transactions(user_id)
-    this_month = datetime.now().strftime("%Y-%m") # 取得目前年份-月份 (如 2025-12)
-    
-    summary = {}
-    for r in records:
-        # 檢查紀錄的時間是否屬於本月，且類型為支出
-        if r["time"].startswith(this_month) and r["type"] == "expense":
-            cat = r["category"]
-            summary[cat] = summary.get(cat, 0) + r["amount"]
-    return summary
+    this_month = current_month()
+    # 由帳本的欄位彙總後快取，新增/刪除時增量更新，不必重新掃描紀錄
+    return _shard(user_id).get_index().month_totals(user_id, this_month)
+
+def get_monthly_category_total(user_id, category):
+    """取得本月單一類別的支出總和"""
+    this_month = current_month()
+    return _shard(user_id).get_index().month_total(user_id, this_month, category)
+
+def get_transactions_between(user_id, start, end):
+    """時間在 [start, end) 之間的紀錄，依時間排序；start / end 可為 "YYYY-MM" 或 "YYYY-MM-DD" 等前綴"""
+    return _shard(user_id).get_index().records_between(user_id, start, end)
+
+def iter_user_transactions(user_id, start=None, end=None):
+    """
+    由舊到新逐筆產生使用者的紀錄（generator，匯出用），可用 start / end 限制期間 [start, end)。
+    與 get_user_transactions 不同，不會一次複製出完整列表。
+    """
+    return _shard(user_id).get_index().iter_records(user_id, start or "", end or "\uffff")
+
+def iter_transactions_desc(user_id, start, end, before=None):
+    """
+    由新到舊逐筆產生 [start, end) 期間的紀錄（generator），呼叫端可只取需要的筆數。
+    before=(time, id) 為上一頁最後一筆的游標，從它之後（較舊）繼續。
+    """
+    return _shard(user_id).get_index().iter_records_desc(user_id, start, end, before)
+
+def get_expense_totals_between(user_id, start, end):
+    """[start, end) 期間各類別的支出總和"""
+    index = _shard(user_id).get_index()
+    if len(start) == 7 and end == next_month(start):
+        # 剛好是整個月份，使用帳本快取的月統計
+        return index.month_totals(user_id, start)
+    return index.expense_totals_between(user_id, start, end)
+
+def get_monthly_expense_trend(user_id, months=6):
+    """最近 months 個月（含本月）每月的支出總額，由舊到新：[(月份, 金額), ...]"""
+    index = _shard(user_id).get_index()
+    month_list = [current_month()]
+    for _ in range(months - 1):
+        month_list.insert(0, previous_month(month_list[0]))
+    return [(m, index.month_expense_total(user_id, m)) for m in month_list]
+
+def get_category_totals(user_id):
+    """取得使用者歷來各類別的金額總和（圖表用）"""
+    return _shard(user_id).get_index().category_totals(user_id)
+
+def get_data_version(user_id):
+    """使用者資料的版本；新增或刪除紀錄後會改變"""
+    return _shard(user_id).get_index().data_version(user_id)
 
 def delete_transaction(user_id, record_id):
-    if not os.path.exists(FILE_PATH):
+    shard = _shard(user_id)
+    if not shard.get_index().contains(user_id, record_id):
         return False
-        
-    with open(FILE_PATH, "r", encoding="utf-8") as f:
-        records = json.load(f)
-    
-    new_records = [r for r in records if not (r.get("id") == record_id and r["user_id"] == user_id)]
-    
-    if len(new_records) == len(records):
-        return False 
-        
-    with open(FILE_PATH, "w", encoding="utf-8") as f:
-        json.dump(new_records, f, ensure_ascii=False, indent=2)
-    return True
\ No newline at end of file
+
+    def _remove(records):
+        records[:] = [r for r in records if not (r.get("id") == record_id and r["user_id"] == user_id)]
+    shard.write([{"op": "delete", "user_id": user_id, "id": record_id}],
+                _remove,
+                lambda index, signature: index.remove(user_id, record_id, signature))
+    return True
+
+def save_snapshots():
+    """把各分片的索引寫成快照（正常結束時呼叫），下次啟動可直接載入"""
+    for shard in list(_shards.values()):
+        shard.save_snapshot()
+
+# --- 依設定切換儲存後端（對外函式名稱不變）---
+if STORAGE_BACKEND == "sqlite":
+    from services.sqlite_store import (
+        add_transaction,
+        add_transactions,
+        get_user_transactions,
+        set_budget,
+        get_user_budgets,
+        get_monthly_summary,
+        get_monthly_category_total,
+        get_transactions_between,
+        iter_user_transactions,
+        iter_transactions_desc,
+        get_expense_totals_between,
+        get_monthly_expense_trend,
+        get_category_totals,
+        get_data_version,
+        get_budget_version,
+        iter_all_budgets,
+        delete_transaction
+    )
+
+if STORAGE_BACKEND != "sqlite" and SNAPSHOT_ENABLED:
+    atexit.register(save_snapshots)
+
+# --- 對外函式的耗時（兩種後端都計時；iter_* 為 generator，耗時發生在呼叫端逐筆取用時，不在此計時）---
+def _timed(fn):
+    return metrics.timed("store_call_seconds", "儲存層對外函式的耗時",
+                         labels={"function": fn.__name__, "backend": STORAGE_BACKEND})(fn)
+
+add_transaction = _timed(add_transaction)
+add_transactions = _timed(add_transactions)
+get_user_transactions = _timed(get_user_transactions)
+set_budget = _timed(set_budget)
+get_user_budgets = _timed(get_user_budgets)
+get_monthly_summary = _timed(get_monthly_summary)
+get_monthly_category_total = _timed(get_monthly_category_total)
+get_transactions_between = _timed(get_transactions_between)
+get_expense_totals_between = _timed(get_expense_totals_between)
+get_monthly_expense_trend = _timed(get_monthly_expense_trend)
+get_category_totals = _timed(get_category_totals)
+get_data_version = _timed(get_data_version)
+get_budget_version = _timed(get_budget_version)
+delete_transaction = _timed(delete_transaction)
@@ -0,0 +1,304 @@
+#ledger.py
+# 以欄位（typed array）儲存的單一使用者帳本：時間為秒數、金額為整數、類別與收支類型為共用代碼表中的小整數，
+# id 與備註另以列表保存。相較每筆一個 dict（含時間字串），每筆約只佔原本的一小部分記憶體，
+# 彙總時也只需在連續的整數陣列上做 C 層級的篩選與單一迴圈累加。
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from functools import lru_cache
+from itertools import compress
+
+from services.records import next_month
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_TIME_TEMPLATE = "0000-01-01 00:00:00"
+# 區間邊界不限起訖（"" 與 "\uffff"）時使用的秒數
+_MIN_TIME = -(1 << 62)
+_MAX_TIME = 1 << 62
+
+@lru_cache(maxsize=4096)
+def _day_seconds(day):
+    return (date(int(day[:4]), int(day[5:7]), int(day[8:10])).toordinal() - _EPOCH_ORDINAL) * 86400
+
+@lru_cache(maxsize=4096)
+def _day_text(days):
+    return date.fromordinal(days + _EPOCH_ORDINAL).isoformat()
+
+def to_epoch(text):
+    """"YYYY-MM-DD HH:MM:SS"（或 "YYYY-MM"、"YYYY-MM-DD" 等前綴）轉成秒數；不含時區，只用於排序與區間比較"""
+    if len(text) != 19:
+        text = text[:19] + _TIME_TEMPLATE[len(text):]
+    return _day_seconds(text[:10]) + int(text[11:13]) * 3600 + int(text[14:16]) * 60 + int(text[17:19])
+
+def from_epoch(seconds):
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{_day_text(days)} {hours:02d}:{minutes:02d}:{secs:02d}"
+
+def time_bound(prefix):
+    """區間查詢的邊界：空字串為最小、非數字開頭（如 "\\uffff"）為最大，其餘視為時間前綴"""
+    if not prefix:
+        return _MIN_TIME
+    if prefix[0] > "9":
+        return _MAX_TIME
+    return to_epoch(prefix)
+
+class CodeTable:
+    """字串 <-> 小整數代碼（所有使用者共用，帳本中只存代碼）"""
+
+    def __init__(self, names=()):
+        self.names = []
+        self.codes = {}
+        self._lock = threading.Lock()
+        for name in names:
+            self.code(name)
+
+    def code(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            with self._lock:
+                code = self.codes.get(name)
+                if code is None:
+                    code = len(self.names)
+                    self.names.append(name)
+                    self.codes[name] = code
+        return code
+
+CATEGORIES = CodeTable()
+TYPES = CodeTable(["expense", "income"])
+EXPENSE = TYPES.code("expense")
+# types 欄位 -> 是否為支出的遮罩（bytes.translate 在 C 層級逐位元組轉換）
+_EXPENSE_MASK = bytes(1 if code == EXPENSE else 0 for code in range(256))
+
+_INT64_MIN = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+
+# 沒有類別的舊紀錄（原本的圖表也以此顯示）
+UNCATEGORIZED = "未分類"
+
+def _category(record):
+    return record.get("category", UNCATEGORIZED)
+
+def invalid_reason(record):
+    """無法放進帳本的紀錄回傳原因（金額不是數字、時間無法解析、類別或收支種類不正確），否則回傳 None"""
+    amount = record.get("amount")
+    if type(amount) not in (int, float):
+        return f"金額不是數字：{amount!r}"
+    category = _category(record)
+    if type(category) is not str:
+        return f"類別不是文字：{category!r}"
+    record_type = record.get("type")
+    if record_type not in ("expense", "income"):
+        return f"收支種類不正確：{record_type!r}"
+    when = record.get("time")
+    try:
+        to_epoch(when)
+    except (TypeError, ValueError):
+        return f"時間無法解析：{when!r}"
+    return None
+
+def _add_total(totals, category, delta):
+    total = totals.get(category, 0) + delta
+    if total:
+        totals[category] = total
+    else:
+        totals.pop(category, None)
+
+def _memo(memo):
+    # 備註重複率高（「午餐」、「捷運」……），共用同一個字串物件
+    return sys.intern(memo) if type(memo) is str else memo
+
+class UserLedger:
+    """
+    單一使用者依時間排序的紀錄，各欄位為平行的陣列。
+    金額通常是 64 位元整數陣列；出現小數（或超出範圍的整數）時，該帳本的金額改用一般 list 保存原值，
+    統計結果與逐筆相加相同。
+    月統計與歷來類別統計在第一次查詢時由欄位彙總並快取，之後的新增 / 刪除直接增量更新快取。
+    本身不加鎖，由 TransactionIndex 的鎖保護。
+    """
+
+    __slots__ = ("times", "amounts", "categories", "types", "ids", "memos", "_month_cache", "_category_cache")
+
+    def __init__(self):
+        self.times = array("q")
+        self.amounts = array("q")
+        self.categories = array("I")
+        self.types = array("B")
+        self.ids = []
+        self.memos = []
+        self._month_cache = {}
+        self._category_cache = None
+
+    @classmethod
+    def from_columns(cls, times, amounts, categories, types, ids, memos):
+        """由已排序的欄位建立帳本（從快照載入用）"""
+        ledger = cls()
+        ledger.times = times
+        ledger.amounts = amounts
+        ledger.categories = categories
+        ledger.types = types
+        ledger.ids = ids
+        ledger.memos = [_memo(memo) for memo in memos]
+        return ledger
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def integer_amounts(self):
+        """金額是否全為 64 位元整數（仍以 array 保存；快照只能存這種帳本）"""
+        return type(self.amounts) is not list
+
+    def _fit_amount(self, amount):
+        if type(amount) is not int or not _INT64_MIN <= amount <= _INT64_MAX:
+            if type(self.amounts) is not list:
+                self.amounts = list(self.amounts)
+
+    # --- 寫入 ---
+    def append(self, record):
+        """加入一筆；新紀錄通常是最新的，直接附加在尾端，補登的舊紀錄才二分插入（同一時間排在既有紀錄之後）"""
+        when = to_epoch(record["time"])
+        if not self.times or self.times[-1] <= when:
+            self._push(record, when)
+        else:
+            i = bisect_right(self.times, when)
+            self._fit_amount(record["amount"])
+            self.times.insert(i, when)
+            self.amounts.insert(i, record["amount"])
+            self.categories.insert(i, CATEGORIES.code(_category(record)))
+            self.types.insert(i, TYPES.code(record["type"]))
+            self.ids.insert(i, record.get("id"))
+            self.memos.insert(i, _memo(record.get("memo", "")))
+        self._count(when, _category(record), record["type"], record["amount"])
+
+    def extend(self, records):
+        """批次加入：全部附加在尾端，有補登的舊紀錄時才整體（穩定）排序一次"""
+        start = len(self.times)
+        for record in records:
+            when = to_epoch(record["time"])
+            self._push(record, when)
+            self._count(when, _category(record), record["type"], record["amount"])
+        times = self.times
+        if any(times[i] > times[i + 1] for i in range(max(0, start - 1), len(times) - 1)):
+            self._reorder(sorted(range(len(times)), key=times.__getitem__))
+
+    def remove(self, record_id):
+        """刪除指定 id 的紀錄，回傳是否有刪到"""
+        removed = False
+        i = self._find(record_id)
+        while i is not None:
+            self._count(self.times[i], CATEGORIES.names[self.categories[i]], TYPES.names[self.types[i]], -self.amounts[i])
+            for column in (self.times, self.amounts, self.categories, self.types, self.ids, self.memos):
+                del column[i]
+            removed = True
+            i = self._find(record_id, i)
+        return removed
+
+    def _push(self, record, when):
+        self._fit_amount(record["amount"])
+        self.times.append(when)
+        self.amounts.append(record["amount"])
+        self.categories.append(CATEGORIES.code(_category(record)))
+        self.types.append(TYPES.code(record["type"]))
+        self.ids.append(record.get("id"))
+        self.memos.append(_memo(record.get("memo", "")))
+
+    def _count(self, when, category, record_type, delta):
+        """已快取的統計隨新增 / 刪除增量更新，不必丟掉重算"""
+        if self._category_cache is not None:
+            _add_total(self._category_cache, category, delta)
+        if record_type == "expense" and self._month_cache:
+            totals = self._month_cache.get(from_epoch(when)[:7])
+            if totals is not None:
+                _add_total(totals, category, delta)
+
+    def _reorder(self, order):
+        self.times = array("q", (self.times[i] for i in order))
+        amounts = [self.amounts[i] for i in order]
+        self.amounts = amounts if type(self.amounts) is list else array("q", amounts)
+        self.categories = array("I", (self.categories[i] for i in order))
+        self.types = array("B", (self.types[i] for i in order))
+        self.ids = [self.ids[i] for i in order]
+        self.memos = [self.memos[i] for i in order]
+
+    def _find(self, record_id, start=0):
+        try:
+            return self.ids.index(record_id, start)
+        except ValueError:
+            return None
+
+    # --- 讀取 ---
+    def span(self, start, end):
+        """時間在 [start, end) 之間的位置範圍 (lo, hi)；start / end 為時間前綴字串"""
+        return bisect_left(self.times, time_bound(start)), bisect_left(self.times, time_bound(end))
+
+    def rows(self, user_id, lo, hi):
+        """位置 [lo, hi) 的紀錄，轉成與儲存檔相同格式的 dict"""
+        categories = CATEGORIES.names
+        types = TYPES.names
+        return [
+            {"id": record_id, "user_id": user_id, "category": categories[c], "amount": amount,
+             "type": types[t], "memo": memo, "time": from_epoch(when)}
+            for record_id, c, amount, t, memo, when in zip(
+                self.ids[lo:hi], self.categories[lo:hi], self.amounts[lo:hi],
+                self.types[lo:hi], self.memos[lo:hi], self.times[lo:hi]
+            )
+        ]
+
+    def position_after(self, cursor):
+        """游標 (秒數, id) 那一筆之後的位置（由舊到新繼續讀取用）"""
+        when, record_id = cursor
+        pos = bisect_left(self.times, when)
+        # 同一秒可能有多筆，跳過游標那一筆（含）之前的
+        i = pos
+        while i < len(self.times) and self.times[i] == when:
+            if self.ids[i] == record_id:
+                return i + 1
+            i += 1
+        return pos
+
+    def position_before(self, end, cursor=None):
+        """從哪個位置（不含）往前讀：沒有游標時為 end 的位置，否則為游標 (秒數, id) 那筆紀錄的位置"""
+        hi = bisect_left(self.times, time_bound(end))
+        if cursor is None:
+            return hi
+        when, record_id = cursor
+        pos = min(hi, bisect_right(self.times, when))
+        # 同一秒可能有多筆，往前找到游標那一筆
+        i = pos - 1
+        while i >= 0 and self.times[i] == when:
+            if self.ids[i] == record_id:
+                return i
+            i -= 1
+        return min(pos, bisect_left(self.times, when))
+
+    # --- 彙總 ---
+    def expense_totals(self, lo, hi):
+        """位置 [lo, hi) 中各類別的支出總和：先以遮罩在 C 層級篩出支出，再單一迴圈累加"""
+        mask = self.types[lo:hi].tobytes().translate(_EXPENSE_MASK)
+        return self._sum_by_category(compress(self.categories[lo:hi], mask), compress(self.amounts[lo:hi], mask))
+
+    def month_totals(self, month):
+        """該月各類別支出總和（快取，呼叫端不可修改）"""
+        totals = self._month_cache.get(month)
+        if totals is None:
+            totals = self._month_cache[month] = self.expense_totals(*self.span(month, next_month(month)))
+        return totals
+
+    def category_totals(self):
+        """歷來各類別的金額總和（收入與支出都計入，快取，呼叫端不可修改）"""
+        if self._category_cache is None:
+            self._category_cache = self._sum_by_category(self.categories, self.amounts)
+        return self._category_cache
+
+    @staticmethod
+    def _sum_by_category(codes, amounts):
+        # 以 dict 累加，類別順序為第一次出現的順序（圖表顏色依此排列）
+        totals = {}
+        for code, amount in zip(codes, amounts):
+            totals[code] = totals.get(code, 0) + amount
+        names = CATEGORIES.names
+        return {names[code]: total for code, total in totals.items() if total}
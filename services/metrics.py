@@ -0,0 +1,136 @@
+#metrics.py
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# 預設的延遲分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Counter:
+    def __init__(self, name, help_text, labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS, labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def snapshot(self):
+        """回傳 {"count", "sum", "buckets": [(上界, 累計筆數), ...]}"""
+        with self._lock:
+            cumulative = []
+            running = 0
+            for bound, c in zip(self.buckets, self.counts):
+                running += c
+                cumulative.append((bound, running))
+            return {"count": self.count, "sum": self.sum, "buckets": cumulative}
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def _get_or_create(cls, name, help_text, labels, **kwargs):
+    key = (name, tuple(sorted((labels or {}).items())))
+    metric = _registry.get(key)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.get(key)
+            if metric is None:
+                metric = cls(name, help_text, labels=labels, **kwargs)
+                _registry[key] = metric
+    return metric
+
+def counter(name, help_text, labels=None):
+    return _get_or_create(Counter, name, help_text, labels)
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS, labels=None):
+    return _get_or_create(Histogram, name, help_text, labels, buckets=buckets)
+
+def all_metrics():
+    with _registry_lock:
+        return list(_registry.values())
+
+@contextmanager
+def timer(metric):
+    """以 with 區塊計時，結束時（含例外）把秒數記錄到 histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric.observe(time.perf_counter() - started)
+
+def timed(name, help_text, labels=None, buckets=DEFAULT_BUCKETS):
+    """函式計時的 decorator；histogram 在裝飾時就建立，呼叫時不必再查表"""
+    def decorator(fn):
+        metric = histogram(name, help_text, buckets, labels)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+# --- Prometheus 文字格式 ---
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_prometheus():
+    """把所有指標輸出成 Prometheus 的文字格式（/metrics 使用）"""
+    by_name = {}
+    for metric in all_metrics():
+        by_name.setdefault(metric.name, []).append(metric)
+
+    lines = []
+    for name in sorted(by_name):
+        metrics = by_name[name]
+        first = metrics[0]
+        kind = "counter" if isinstance(first, Counter) else "histogram"
+        lines.append(f"# HELP {name} {first.help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for metric in metrics:
+            if kind == "counter":
+                lines.append(f"{name}{_format_labels(metric.labels)} {_format_value(metric.value)}")
+                continue
+            snap = metric.snapshot()
+            for bound, count in snap["buckets"]:
+                lines.append(f"{name}_bucket{_format_labels(metric.labels, {'le': _format_value(bound)})} {count}")
+            lines.append(f"{name}_bucket{_format_labels(metric.labels, {'le': '+Inf'})} {snap['count']}")
+            lines.append(f"{name}_sum{_format_labels(metric.labels)} {_format_value(snap['sum'])}")
+            lines.append(f"{name}_count{_format_labels(metric.labels)} {snap['count']}")
+    return "\n".join(lines) + "\n"
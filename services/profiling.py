@@ -0,0 +1,58 @@
+#profiling.py
+# 慢請求取樣：依 PROFILE_SAMPLE_RATE 抽樣以 cProfile 執行請求，耗時超過 PROFILE_SLOW_MS 時把結果存檔。
+# 預設關閉（取樣率 0）；存下的 .prof 可用 python -m pstats 或 snakeviz 查看。
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from services import metrics
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "500"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join("data", "profiles"))
+PROFILE_TOP = 15  # 寫入 log 的函式數
+
+logger = logging.getLogger(__name__)
+# 同一時間只能有一個 cProfile 在執行，取樣中的請求以這把鎖互斥，搶不到就不取樣
+_active = threading.Lock()
+
+_saved = metrics.counter("profile_samples_saved_total", "超過門檻而存檔的取樣數")
+
+@contextmanager
+def profile_request(name):
+    """包住一次請求的處理；未抽中、或已有其他請求在取樣時不做任何事"""
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE or not _active.acquire(blocking=False):
+        yield
+        return
+    try:
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms >= PROFILE_SLOW_MS:
+                _save(profiler, name, elapsed_ms)
+    finally:
+        _active.release()
+
+def _save(profiler, name, elapsed_ms):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{int(elapsed_ms)}ms.prof")
+        profiler.dump_stats(path)
+    except OSError:
+        logger.exception("無法儲存 profile")
+        return
+    _saved.inc()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    logger.warning("慢請求 %s 耗時 %.0fms，已存 %s\n%s", name, elapsed_ms, path, out.getvalue())
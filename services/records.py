@@ -0,0 +1,34 @@
+#records.py
+from datetime import datetime
+
+from services.ids import new_id
+
+def new_record(user_id, data):
+    """建立一筆新的記帳紀錄（各儲存後端共用同一種格式）"""
+    return {
+        "id": new_id(),
+        "user_id": user_id,
+        "category": data["category"],
+        "amount": data["amount"],
+        "type": data["type"],
+        "memo": data.get("memo", ""),
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+def current_month():
+    """取得目前年份-月份 (如 2025-12)"""
+    return datetime.now().strftime("%Y-%m")
+
+def next_month(month):
+    """下一個月，例如 2025-12 -> 2026-01"""
+    year, mon = int(month[:4]), int(month[5:7])
+    if mon == 12:
+        return f"{year + 1:04d}-01"
+    return f"{year:04d}-{mon + 1:02d}"
+
+def previous_month(month):
+    """上一個月，例如 2026-01 -> 2025-12"""
+    year, mon = int(month[:4]), int(month[5:7])
+    if mon == 1:
+        return f"{year - 1:04d}-12"
+    return f"{year:04d}-{mon - 1:02d}"
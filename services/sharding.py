@@ -0,0 +1,57 @@
+#sharding.py
+import hashlib
+import json
+import os
+import sys
+
+def shard_of(user_id, shard_count):
+    """以 user_id 的雜湊決定分片編號（不使用內建 hash()，確保每次啟動結果一致）"""
+    digest = hashlib.md5(user_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % shard_count
+
+def shard_dir(data_dir, shard_no):
+    return os.path.join(data_dir, "shards", f"{shard_no:03d}")
+
+def split_monolithic(data_dir, shard_count):
+    """
+    把單一的 transactions.json（含尚未壓實的日誌）與 budgets.json
+    依 user_id 拆到 data_dir/shards/NNN/ 底下，回傳 {分片編號: 紀錄筆數}
+    """
+    from services.journal import TransactionJournal
+
+    records = TransactionJournal(
+        os.path.join(data_dir, "transactions.json"),
+        os.path.join(data_dir, "transactions.jsonl")
+    ).load()
+    budgets = {}
+    budget_path = os.path.join(data_dir, "budgets.json")
+    if os.path.exists(budget_path):
+        with open(budget_path, "r", encoding="utf-8") as f:
+            budgets = json.load(f)
+
+    shard_records = {}
+    for r in records:
+        shard_records.setdefault(shard_of(r["user_id"], shard_count), []).append(r)
+    shard_budgets = {}
+    for user_id, user_budgets in budgets.items():
+        shard_budgets.setdefault(shard_of(user_id, shard_count), {})[user_id] = user_budgets
+
+    shards_root = os.path.join(data_dir, "shards")
+    if os.path.exists(shards_root) and os.listdir(shards_root):
+        raise RuntimeError(f"{shards_root} 已有資料，請先清空再執行拆分")
+
+    for shard_no in set(shard_records) | set(shard_budgets):
+        directory = shard_dir(data_dir, shard_no)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "transactions.json"), "w", encoding="utf-8") as f:
+            json.dump(shard_records.get(shard_no, []), f, ensure_ascii=False, indent=2)
+        with open(os.path.join(directory, "budgets.json"), "w", encoding="utf-8") as f:
+            json.dump(shard_budgets.get(shard_no, {}), f, ensure_ascii=False, indent=2)
+    return {no: len(rs) for no, rs in shard_records.items()}
+
+if __name__ == "__main__":
+    # 用法：python -m services.sharding [data_dir] [shard_count]
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "data"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else int(os.environ.get("JSON_SHARD_COUNT", "16"))
+    result = split_monolithic(data_dir, count)
+    print(f"已拆分 {sum(result.values())} 筆紀錄到 {len(result)} 個分片")
@@ -0,0 +1,146 @@
+#snapshot.py
+# 記帳索引的二進位快照：重新啟動時不必解析整份 transactions.json 就能開始服務。
+# 檔案格式：前綴（MAGIC、標頭長度、標頭 CRC32）+ 標頭 JSON + 各使用者的欄位區塊。
+# 標頭記錄快照對應的來源檔案 signature（各檔案的 mtime, size）、代碼表與每位使用者區塊的位置 / 筆數 / CRC32；
+# 來源 JSON 或日誌的 signature 與快照不同時就不使用快照（JSON 永遠是資料的來源）。
+# 開啟時只解析標頭並檢查內容的 CRC32，使用者的區塊在第一次存取時才從 mmap 讀出、轉成 UserLedger。
+import json
+import logging
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+
+from services.fileio import atomic_write_bytes
+from services.ledger import CATEGORIES, TYPES, UserLedger
+
+MAGIC = b"LEDGSNP1"
+VERSION = 1
+_PREFIX = struct.Struct("<8sII")
+# 區塊中的陣列欄位（依序存放），之後接著 [ids, memos] 的 JSON
+_COLUMNS = (("times", "q"), ("amounts", "q"), ("categories", "I"), ("types", "B"))
+_ITEMSIZES = [array(code).itemsize for _, code in _COLUMNS]
+
+logger = logging.getLogger(__name__)
+
+class SnapshotError(Exception):
+    """快照內容損毀"""
+
+def write_snapshot(path, signature, ledgers):
+    """把 {user_id: UserLedger} 寫成快照；呼叫端需確保寫入期間帳本不會被修改"""
+    users = {}
+    blocks = []
+    offset = 0
+    body_crc = 0
+    for user_id, ledger in ledgers.items():
+        block = _encode(ledger)
+        users[user_id] = [offset, len(ledger), len(block), zlib.crc32(block)]
+        body_crc = zlib.crc32(block, body_crc)
+        blocks.append(block)
+        offset += len(block)
+    # 代碼表在區塊編碼完之後才取，帳本用到的代碼一定都在其中
+    header = json.dumps({
+        "version": VERSION,
+        "signature": signature,
+        "byteorder": sys.byteorder,
+        "itemsizes": _ITEMSIZES,
+        "categories": list(CATEGORIES.names),
+        "types": list(TYPES.names),
+        "body_size": offset,
+        "body_crc": body_crc,
+        "users": users
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    atomic_write_bytes(path, [_PREFIX.pack(MAGIC, len(header), zlib.crc32(header)), header] + blocks)
+
+def _encode(ledger):
+    strings = json.dumps([ledger.ids, ledger.memos], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"".join([getattr(ledger, name).tobytes() for name, _ in _COLUMNS] + [strings])
+
+def _as_signature(value):
+    """JSON 讀回的 signature（list）轉回與 TransactionJournal.signature() 相同的 tuple 形式"""
+    return tuple(tuple(part) if part is not None else None for part in value)
+
+def _code_map(table, names):
+    codes = [table.code(name) for name in names]
+    return None if codes == list(range(len(codes))) else codes
+
+class Snapshot:
+    """已開啟（mmap）的快照；load(user_id) 讀出單一使用者的帳本。本身不加鎖，由 TransactionIndex 的鎖保護"""
+
+    def __init__(self, header, mm, body_start):
+        self.signature = _as_signature(header["signature"])
+        self._users = header["users"]
+        self._mm = mm
+        self._body_start = body_start
+        # 快照中的代碼 -> 本行程的代碼（代碼表由所有分片共用，順序不一定相同；相同時不必轉換）
+        self._category_map = _code_map(CATEGORIES, header["categories"])
+        self._type_map = _code_map(TYPES, header["types"])
+
+    @classmethod
+    def open(cls, path, signature):
+        """開啟與 signature 相符的快照；檔案不存在、已過期、不相容或標頭損毀時回傳 None"""
+        try:
+            with open(path, "rb") as f:
+                prefix = f.read(_PREFIX.size)
+                if len(prefix) < _PREFIX.size:
+                    return None
+                magic, header_size, header_crc = _PREFIX.unpack(prefix)
+                if magic != MAGIC:
+                    return None
+                raw = f.read(header_size)
+                if len(raw) != header_size or zlib.crc32(raw) != header_crc:
+                    logger.warning("快照標頭損毀，改由 JSON 重建：%s", path)
+                    return None
+                header = json.loads(raw)
+                if (header.get("version") != VERSION or header.get("byteorder") != sys.byteorder
+                        or header.get("itemsizes") != _ITEMSIZES
+                        or _as_signature(header.get("signature") or ()) != signature):
+                    return None
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        # 開啟時先以 CRC32 檢查整個內容（C 層級，遠比解析 JSON 快），損毀時改由 JSON 重建而不是在存取時才出錯
+        body_start = _PREFIX.size + header_size
+        body = memoryview(mm)[body_start:]
+        try:
+            intact = len(body) == header.get("body_size") and zlib.crc32(body) == header.get("body_crc")
+        finally:
+            body.release()
+        if not intact:
+            mm.close()
+            logger.warning("快照內容損毀，改由 JSON 重建：%s", path)
+            return None
+        return cls(header, mm, body_start)
+
+    def user_ids(self):
+        return list(self._users)
+
+    def load(self, user_id):
+        """讀出該使用者的帳本；快照中沒有該使用者時回傳 None，區塊損毀（開啟後檔案被改動）時丟出 SnapshotError"""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        offset, count, size, crc = entry
+        start = self._body_start + offset
+        block = self._mm[start:start + size]
+        if len(block) != size or zlib.crc32(block) != crc:
+            raise SnapshotError(f"使用者 {user_id} 的快照區塊損毀")
+
+        columns = []
+        pos = 0
+        for (_, code), itemsize in zip(_COLUMNS, _ITEMSIZES):
+            column = array(code)
+            column.frombytes(block[pos:pos + count * itemsize])
+            columns.append(column)
+            pos += count * itemsize
+        times, amounts, categories, types = columns
+        if self._category_map is not None:
+            categories = array("I", map(self._category_map.__getitem__, categories))
+        if self._type_map is not None:
+            types = array("B", map(self._type_map.__getitem__, types))
+        ids, memos = json.loads(block[pos:])
+        return UserLedger.from_columns(times, amounts, categories, types, ids, memos)
+
+    def close(self):
+        self._mm.close()
@@ -0,0 +1,394 @@
+#sqlite_store.py
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from itertools import groupby
+from operator import itemgetter
+
+from services.records import new_record, current_month, next_month, previous_month
+
+DB_PATH = os.environ.get("SQLITE_PATH", os.path.join("data", "ledger.db"))
+POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "4"))
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    memo TEXT NOT NULL DEFAULT '',
+    time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_time ON transactions (user_id, time);
+CREATE TABLE IF NOT EXISTS budgets (
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (user_id, category)
+);
+CREATE TABLE IF NOT EXISTS user_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS budget_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+COLUMNS = ("id", "user_id", "category", "amount", "type", "memo", "time")
+INSERT_TRANSACTION = (
+    "INSERT OR IGNORE INTO transactions (id, user_id, category, amount, type, memo, time) VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+class ConnectionPool:
+    """固定大小的 SQLite 連線池，連線可跨執行緒重複使用（WAL 模式允許讀寫並行）"""
+
+    def __init__(self, path, size=4):
+        self.path = path
+        self._pool = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._size = size
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = None
+        with self._lock:
+            if self._pool.empty() and self._created < self._size:
+                conn = self._connect()
+                self._created += 1
+        if conn is None:
+            conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        self._created = 0
+
+_pool = ConnectionPool(DB_PATH, POOL_SIZE)
+_init_lock = threading.Lock()
+_initialized = False
+
+@contextmanager
+def _db():
+    """取得連線；第一次使用時建立資料表，並自動從 JSON 檔案搬移既有資料"""
+    global _initialized
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                with _pool.connection() as conn:
+                    conn.executescript(SCHEMA)
+                    _ensure_unique_ids(conn)
+                    _migrate(conn)
+                _initialized = True
+    with _pool.connection() as conn:
+        yield conn
+
+def _month_range(month):
+    """"2025-12" -> ("2025-12", "2026-01")，用字串比較即可命中 (user_id, time) 索引"""
+    return month, next_month(month)
+
+def add_transaction(user_id, data):
+    record = new_record(user_id, data)
+    with _db() as conn, conn:
+        conn.execute(INSERT_TRANSACTION, tuple(record[c] for c in COLUMNS))
+        _bump_version(conn, user_id)
+    return {"status": True}
+
+def add_transactions(user_id, records):
+    """一次寫入多筆已建立好的紀錄（單一交易）；該使用者 id 已存在或同批重複的略過，回傳實際新增的筆數"""
+    with _db() as conn, conn:
+        before = conn.total_changes
+        conn.executemany(INSERT_TRANSACTION, [tuple(record[c] for c in COLUMNS) for record in records])
+        inserted = conn.total_changes - before
+        if inserted:
+            _bump_version(conn, user_id)
+    return inserted
+
+def get_user_transactions(user_id):
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT id, user_id, category, amount, type, memo, time FROM transactions "
+            "WHERE user_id = ? ORDER BY time, rowid",
+            (user_id,)
+        ).fetchall()
+    return [dict(zip(COLUMNS, row)) for row in rows]
+
+def set_budget(user_id, category, amount):
+    """設定使用者的類別額度"""
+    with _db() as conn, conn:
+        conn.execute(
+            "INSERT INTO budgets (user_id, category, amount) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id, category) DO UPDATE SET amount = excluded.amount",
+            (user_id, category, amount)
+        )
+        _bump_version(conn, user_id, "budget_versions")
+
+def get_user_budgets(user_id):
+    """取得使用者的所有額度設定"""
+    with _db() as conn:
+        rows = conn.execute("SELECT category, amount FROM budgets WHERE user_id = ? ORDER BY rowid", (user_id,)).fetchall()
+    return dict(rows)
+
+def get_monthly_summary(user_id):
+    """計算本月各類別的支出總和"""
+    start, end = _month_range(current_month())
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT category, SUM(amount) FROM transactions "
+            "WHERE user_id = ? AND time >= ? AND time < ? AND type = 'expense' GROUP BY category",
+            (user_id, start, end)
+        ).fetchall()
+    return dict(rows)
+
+def get_monthly_category_total(user_id, category):
+    """取得本月單一類別的支出總和"""
+    start, end = _month_range(current_month())
+    with _db() as conn:
+        row = conn.execute(
+            "SELECT COALESCE(SUM(amount), 0) FROM transactions "
+            "WHERE user_id = ? AND time >= ? AND time < ? AND type = 'expense' AND category = ?",
+            (user_id, start, end, category)
+        ).fetchone()
+    return row[0]
+
+def get_transactions_between(user_id, start, end):
+    """時間在 [start, end) 之間的紀錄，依時間排序"""
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT id, user_id, category, amount, type, memo, time FROM transactions "
+            "WHERE user_id = ? AND time >= ? AND time < ? ORDER BY time, rowid",
+            (user_id, start, end)
+        ).fetchall()
+    return [dict(zip(COLUMNS, row)) for row in rows]
+
+def iter_user_transactions(user_id, start=None, end=None, chunk_size=256):
+    """由舊到新逐筆產生使用者的紀錄，以 (time, rowid) keyset 分段查詢，段與段之間不佔用連線"""
+    cursor = None
+    while True:
+        sql = ("SELECT rowid, id, user_id, category, amount, type, memo, time FROM transactions "
+               "WHERE user_id = ? AND time >= ? AND time < ?")
+        params = [user_id, start or "", end or "\uffff"]
+        if cursor is not None:
+            sql += " AND (time > ? OR (time = ? AND rowid > ?))"
+            params += [cursor[0], cursor[0], cursor[1]]
+        sql += " ORDER BY time, rowid LIMIT ?"
+        params.append(chunk_size)
+        with _db() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        for row in rows:
+            yield dict(zip(COLUMNS, row[1:]))
+        if len(rows) < chunk_size:
+            return
+        cursor = (rows[-1][7], rows[-1][0])
+
+def iter_transactions_desc(user_id, start, end, before=None, chunk_size=32):
+    """
+    由新到舊逐筆產生 [start, end) 期間的紀錄；以 keyset 分段查詢，每段 chunk_size 筆，
+    段與段之間不佔用連線。before=(time, id) 為上一頁最後一筆的游標。
+    """
+    # 段與段之間以 (time, rowid) 定位；before 的 id 只在開始時（以 user_id, id 索引）換成 rowid 一次
+    cursor = None
+    if before is not None:
+        with _db() as conn:
+            row = conn.execute("SELECT rowid FROM transactions WHERE user_id = ? AND id = ?",
+                               (user_id, before[1])).fetchone()
+        # 游標那筆已被刪除時不知道它在同一秒中的位置，從該秒的最後一筆開始（寧可重複也不漏掉）
+        cursor = (before[0], row[0] if row else sys.maxsize)
+    while True:
+        sql = ("SELECT rowid, id, user_id, category, amount, type, memo, time FROM transactions "
+               "WHERE user_id = ? AND time >= ? AND time < ?")
+        params = [user_id, start, end]
+        if cursor is not None:
+            sql += " AND (time < ? OR (time = ? AND rowid < ?))"
+            params += [cursor[0], cursor[0], cursor[1]]
+        sql += " ORDER BY time DESC, rowid DESC LIMIT ?"
+        params.append(chunk_size)
+        with _db() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        for row in rows:
+            yield dict(zip(COLUMNS, row[1:]))
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1]
+        cursor = (last[7], last[0])
+
+def get_expense_totals_between(user_id, start, end):
+    """[start, end) 期間各類別的支出總和"""
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT category, SUM(amount) FROM transactions "
+            "WHERE user_id = ? AND time >= ? AND time < ? AND type = 'expense' GROUP BY category ORDER BY MIN(rowid)",
+            (user_id, start, end)
+        ).fetchall()
+    return dict(rows)
+
+def get_monthly_expense_trend(user_id, months=6):
+    """最近 months 個月（含本月）每月的支出總額，由舊到新：[(月份, 金額), ...]"""
+    month_list = [current_month()]
+    for _ in range(months - 1):
+        month_list.insert(0, previous_month(month_list[0]))
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT substr(time, 1, 7) AS month, SUM(amount) FROM transactions "
+            "WHERE user_id = ? AND time >= ? AND time < ? AND type = 'expense' GROUP BY month",
+            (user_id, month_list[0], next_month(month_list[-1]))
+        ).fetchall()
+    totals = dict(rows)
+    return [(m, totals.get(m, 0)) for m in month_list]
+
+def get_category_totals(user_id):
+    """取得使用者歷來各類別的金額總和（圖表用）"""
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT category, SUM(amount) FROM transactions WHERE user_id = ? GROUP BY category ORDER BY MIN(rowid)",
+            (user_id,)
+        ).fetchall()
+    return dict(rows)
+
+def get_data_version(user_id):
+    """使用者資料的版本；新增或刪除紀錄後會改變"""
+    with _db() as conn:
+        row = conn.execute("SELECT version FROM user_versions WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else 0
+
+def iter_all_budgets():
+    """逐一產生 (user_id, 額度設定)，涵蓋所有有設定額度的使用者（背景預算提醒用）"""
+    with _db() as conn:
+        rows = conn.execute("SELECT user_id, category, amount FROM budgets ORDER BY user_id, rowid").fetchall()
+    for user_id, group in groupby(rows, key=itemgetter(0)):
+        yield user_id, {category: amount for _, category, amount in group}
+
+def get_budget_version(user_id):
+    """使用者額度設定的版本；設定額度後會改變"""
+    with _db() as conn:
+        row = conn.execute("SELECT version FROM budget_versions WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else 0
+
+def _bump_version(conn, user_id, table="user_versions"):
+    conn.execute(
+        f"INSERT INTO {table} (user_id, version) VALUES (?, 1) "
+        "ON CONFLICT (user_id) DO UPDATE SET version = version + 1",
+        (user_id,)
+    )
+
+def delete_transaction(user_id, record_id):
+    with _db() as conn, conn:
+        cur = conn.execute("DELETE FROM transactions WHERE id = ? AND user_id = ?", (record_id, user_id))
+        if cur.rowcount > 0:
+            _bump_version(conn, user_id)
+    return cur.rowcount > 0
+
+# --- 從 JSON 檔案搬移 ---
+def _ensure_unique_ids(conn):
+    """
+    同一使用者的紀錄 id 唯一（舊版以毫秒時間為 id，不同使用者之間可能相同，所以不能只以 id 唯一）。
+    舊資料庫沒有這個限制：欄位完全相同的重複列（重複匯入）只保留最早的一筆；
+    id 相同但內容不同的列改用新的 id 保留下來。兩種情況都會記錄在日誌中。
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_transactions_user_record'").fetchone():
+        return
+    with conn:
+        removed = conn.execute(
+            "DELETE FROM transactions WHERE rowid NOT IN "
+            "(SELECT MIN(rowid) FROM transactions GROUP BY user_id, id, category, amount, type, memo, time)"
+        ).rowcount
+        if removed:
+            logger.warning("移除 %d 筆完全重複的紀錄（同一使用者、相同 id 與內容）", removed)
+        conflicts = conn.execute(
+            "SELECT t.rowid, t.user_id, t.id FROM transactions t JOIN "
+            "(SELECT user_id, id, MIN(rowid) AS first FROM transactions GROUP BY user_id, id HAVING COUNT(*) > 1) d "
+            "ON t.user_id = d.user_id AND t.id = d.id AND t.rowid != d.first"
+        ).fetchall()
+        for rowid, user_id, record_id in conflicts:
+            logger.warning("使用者 %s 有多筆 id 為 %s 的不同紀錄，改為 %s-%d", user_id, record_id, record_id, rowid)
+            conn.execute("UPDATE transactions SET id = ? WHERE rowid = ?", (f"{record_id}-{rowid}", rowid))
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_user_record ON transactions (user_id, id)")
+        # 先前版本建立的索引：只以 id 唯一（會擋下其他使用者相同 id 的紀錄），以及已被唯一索引涵蓋的 (user_id, id)
+        conn.execute("DROP INDEX IF EXISTS idx_transactions_id")
+        conn.execute("DROP INDEX IF EXISTS idx_transactions_user_id")
+
+def _json_directories():
+    """JSON 後端目前使用的資料目錄：single 配置為 DATA_DIR，sharded 配置為每個分片目錄"""
+    # 延後匯入，避免與 json_store 的後端切換互相循環匯入
+    from services import json_store
+    from services.sharding import shard_dir
+
+    if json_store.STORAGE_LAYOUT == "sharded":
+        return [shard_dir(json_store.DATA_DIR, key) for key in range(json_store.SHARD_COUNT)]
+    return [json_store.DATA_DIR]
+
+def _migrate(conn):
+    """把 transactions.json（含尚未壓實的日誌）與 budgets.json 匯入資料庫（分片配置時逐一匯入每個分片），只執行一次"""
+    done = conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+    if done:
+        return 0
+
+    from services.journal import TransactionJournal
+
+    count = 0
+    with conn:
+        for directory in _json_directories():
+            records = TransactionJournal(
+                os.path.join(directory, "transactions.json"),
+                os.path.join(directory, "transactions.jsonl")
+            ).load()
+            budgets = {}
+            budget_file = os.path.join(directory, "budgets.json")
+            if os.path.exists(budget_file):
+                with open(budget_file, "r", encoding="utf-8") as f:
+                    budgets = json.load(f)
+            # 同一使用者 id 已存在的略過：中途失敗後重新搬移、或與先前匯入的資料重疊時不會產生重複紀錄
+            before = conn.total_changes
+            conn.executemany(INSERT_TRANSACTION, [tuple(r.get(c, "") for c in COLUMNS) for r in records])
+            inserted = conn.total_changes - before
+            if inserted < len(records):
+                logger.warning("%s：%d 筆紀錄與同一使用者既有的 id 重複，未匯入", directory, len(records) - inserted)
+            count += inserted
+            conn.executemany(
+                "INSERT INTO budgets (user_id, category, amount) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id, category) DO UPDATE SET amount = excluded.amount",
+                [(uid, cat, amt) for uid, cats in budgets.items() for cat, amt in cats.items()]
+            )
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', '1')")
+    return count
+
+def migrate_from_json():
+    """手動執行搬移：python -m services.sqlite_store migrate"""
+    with _pool.connection() as conn:
+        conn.executescript(SCHEMA)
+        _ensure_unique_ids(conn)
+        return _migrate(conn)
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["migrate"]:
+        count = migrate_from_json()
+        print(f"已匯入 {count} 筆紀錄至 {DB_PATH}")
+    else:
+        print("用法：python -m services.sqlite_store migrate")
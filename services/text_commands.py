@@ -0,0 +1,86 @@
+#text_commands.py
+# 文字指令路由與記帳訊息解析：指令與類別增加時，每則訊息的判斷成本不隨之線性增加
+import re
+from collections import namedtuple
+
+class CommandRouter:
+    """
+    指令註冊表：exact 為完全相符（dict 查表），prefix 為前綴相符（依前綴長度分組查表，長的優先）。
+    處理函式的簽名為 handler(api, event, user_id, arg)，arg 為前綴之後的文字（已去除前後空白）。
+    """
+
+    def __init__(self):
+        self._exact = {}
+        self._prefixes = {}  # 前綴長度 -> {前綴: handler}
+        self._lengths = []   # 由長到短
+        self._fallback = None
+
+    def exact(self, *words):
+        def register(handler):
+            for word in words:
+                self._exact[word] = handler
+            return handler
+        return register
+
+    def prefix(self, *prefixes):
+        def register(handler):
+            for p in prefixes:
+                self._prefixes.setdefault(len(p), {})[p] = handler
+            self._lengths = sorted(self._prefixes, reverse=True)
+            return handler
+        return register
+
+    def fallback(self, handler):
+        """都不相符時使用（例如記帳訊息），arg 為整段文字"""
+        self._fallback = handler
+        return handler
+
+    def resolve(self, text):
+        """回傳 (handler, arg)；沒有相符的指令也沒有 fallback 時 handler 為 None"""
+        handler = self._exact.get(text)
+        if handler is not None:
+            return handler, ""
+        for length in self._lengths:
+            handler = self._prefixes[length].get(text[:length])
+            if handler is not None:
+                return handler, text[length:].strip()
+        return self._fallback, text
+
+    def dispatch(self, api, event, user_id, text):
+        handler, arg = self.resolve(text)
+        if handler is not None:
+            handler(api, event, user_id, arg)
+
+Entry = namedtuple("Entry", ["amount", "category", "memo"])
+Entry.__doc__ = "一則記帳訊息解析出的金額（字串）、類別（可能為 None）與備註"
+
+class EntryParser:
+    """
+    將「100 飲食 午餐」、「午餐120」這類訊息拆成金額（第一段數字）、類別（第一個出現的已知類別）與備註（其餘文字）。
+    數字與類別各自預先編譯成一個 regex（所有類別合併為一個 alternation），
+    比對都在 regex 引擎內完成，不在 Python 中逐一檢查每個類別。
+    """
+
+    def __init__(self, categories):
+        self.categories = list(categories)
+        # 較長的類別名稱優先，避免被較短的同字首類別搶先配對
+        names = sorted(self.categories, key=len, reverse=True)
+        self._amount = re.compile(r"\d+")
+        self._category = re.compile("|".join(re.escape(name) for name in names) or "(?!)")
+
+    def parse(self, text):
+        """回傳 Entry；訊息中沒有數字時回傳 None"""
+        amount = self._amount.search(text)
+        if amount is None:
+            return None
+        a_start, a_end = amount.span()
+        category = self._category.search(text)
+        if category is None:
+            return Entry(amount.group(), None, (text[:a_start] + text[a_end:]).strip())
+
+        c_start, c_end = category.span()
+        if c_start < a_start:
+            memo = text[:c_start] + text[c_end:a_start] + text[a_end:]
+        else:
+            memo = text[:a_start] + text[a_end:c_start] + text[c_end:]
+        return Entry(amount.group(), category.group(), memo.strip())
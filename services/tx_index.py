@@ -0,0 +1,253 @@
+#tx_index.py
+import logging
+import threading
+
+from services.ledger import UserLedger, invalid_reason, to_epoch
+from services.records import next_month
+from services.snapshot import SnapshotError, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+def _valid(records):
+    """略過金額或時間無法處理的紀錄（記錄在 log），不讓一筆壞資料拖垮整個分片的索引"""
+    valid = []
+    for record in records:
+        reason = invalid_reason(record)
+        if reason is None:
+            valid.append(record)
+        else:
+            logger.warning("略過無法建立索引的紀錄 %s：%s", record.get("id"), reason)
+    return valid
+
+class TransactionIndex:
+    """
+    常駐記憶體的記帳索引：user_id -> 依時間排序的欄位式帳本（UserLedger），
+    任何時間區間（某月、近 7 天、自訂日期）都以 bisect 在時間欄位上取出，不必逐筆比對字串。
+    月統計與類別統計由帳本的欄位彙總並快取，新增/刪除時增量更新。
+    data_version(user_id) 在該使用者的資料有任何變動時改變，供圖表等快取判斷是否失效。
+    signature 記錄建立索引時資料檔的 (mtime, size)，用來判斷是否被程式外部修改過。
+    以 attach 掛上快照時，各使用者的帳本在第一次存取（讀或寫）時才從快照載入。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ledgers = {}
+        self._versions = {}
+        self._generation = 0
+        self._snapshot = None
+        # 最近一次寫出 / 載入的快照所對應的 signature，沒有變動時不必重寫
+        self._saved_signature = None
+        self.signature = None
+
+    def attach(self, snapshot):
+        """以快照（services.snapshot.Snapshot）作為索引的內容，取代 rebuild"""
+        with self._lock:
+            self._detach()
+            self._ledgers = {}
+            self._versions = {}
+            self._generation += 1
+            self._snapshot = snapshot
+            self.signature = self._saved_signature = snapshot.signature
+
+    def save(self, path):
+        """
+        把目前的索引寫成快照（尚未載入的使用者先從舊快照載入），回傳是否有寫出。
+        自上次寫出 / 載入快照後沒有任何變動時不重寫。
+        """
+        with self._lock:
+            if self.signature is None or self.signature == self._saved_signature:
+                return False
+            if self._snapshot is not None:
+                for user_id in self._snapshot.user_ids():
+                    self._get(user_id)
+                self._detach()
+            if not all(ledger.integer_amounts for ledger in self._ledgers.values()):
+                # 快照只存整數金額欄位；有小數金額時每次啟動都由 JSON 重建
+                return False
+            write_snapshot(path, self.signature, self._ledgers)
+            self._saved_signature = self.signature
+            return True
+
+    def rebuild(self, records, signature):
+        with self._lock:
+            self._detach()
+            by_user = {}
+            for r in _valid(records):
+                by_user.setdefault(r["user_id"], []).append(r)
+            self._ledgers = {}
+            for user_id, user_records in by_user.items():
+                self._ledgers[user_id] = ledger = UserLedger()
+                ledger.extend(user_records)
+            self._versions = {}
+            # 重建後所有使用者的版本都要視為改變
+            self._generation += 1
+            self._saved_signature = None
+            self.signature = signature
+
+    def add(self, record, signature=None):
+        with self._lock:
+            for record in _valid([record]):
+                self._ledger(record["user_id"]).append(record)
+                self._bump_version(record["user_id"])
+            if signature is not None:
+                self.signature = signature
+
+    def add_many(self, records, signature=None):
+        """
+        一次加入多筆（例如匯入的歷史紀錄）：各使用者的帳本只在有補登的舊紀錄時排序一次，
+        不必每筆都二分插入。
+        """
+        with self._lock:
+            by_user = {}
+            for record in _valid(records):
+                by_user.setdefault(record["user_id"], []).append(record)
+            for user_id, added in by_user.items():
+                self._ledger(user_id).extend(added)
+                self._bump_version(user_id)
+            if signature is not None:
+                self.signature = signature
+
+    def remove(self, user_id, record_id, signature=None):
+        """刪除該使用者指定 id 的紀錄，回傳是否有刪到"""
+        with self._lock:
+            ledger = self._get(user_id)
+            removed = ledger is not None and ledger.remove(record_id)
+            if removed:
+                self._bump_version(user_id)
+            if signature is not None:
+                self.signature = signature
+            return removed
+
+    def contains(self, user_id, record_id):
+        with self._lock:
+            ledger = self._get(user_id)
+            return ledger is not None and record_id in ledger.ids
+
+    def record_ids(self, user_id):
+        """該使用者所有紀錄 id 的集合（匯入時比對重複用）"""
+        with self._lock:
+            ledger = self._get(user_id)
+            return set(ledger.ids) if ledger is not None else set()
+
+    def user_records(self, user_id):
+        with self._lock:
+            ledger = self._get(user_id)
+            return ledger.rows(user_id, 0, len(ledger)) if ledger is not None else []
+
+    def records_between(self, user_id, start, end):
+        """時間在 [start, end) 之間的紀錄（依時間排序）；start / end 為 "YYYY-MM-DD ..." 格式的前綴字串"""
+        with self._lock:
+            ledger = self._get(user_id)
+            if ledger is None:
+                return []
+            return ledger.rows(user_id, *ledger.span(start, end))
+
+    def iter_records(self, user_id, start, end, chunk_size=256):
+        """
+        由舊到新逐筆產生 [start, end) 期間的紀錄，每次只在鎖內轉換 chunk_size 筆（匯出用）。
+        每段都以上一段最後一筆的 (time, id) 重新定位，期間有新增 / 刪除也不會重複或漏掉既有紀錄。
+        """
+        after = None
+        while True:
+            with self._lock:
+                ledger = self._get(user_id)
+                if ledger is None:
+                    return
+                lo, hi = ledger.span(start, end)
+                pos = lo if after is None else max(lo, ledger.position_after(after))
+                stop = min(hi, pos + chunk_size)
+                if stop <= pos:
+                    return
+                chunk = ledger.rows(user_id, pos, stop)
+                after = (ledger.times[stop - 1], ledger.ids[stop - 1])
+            yield from chunk
+
+    def iter_records_desc(self, user_id, start, end, before=None, chunk_size=32):
+        """
+        由新到舊逐筆產生 [start, end) 期間的紀錄；before=(time, id) 時從該筆紀錄的下一筆（較舊）開始。
+        每次只在鎖內轉換 chunk_size 筆，呼叫端只取一頁時不會碰到其餘資料。
+        """
+        cursor = None if before is None else (to_epoch(before[0]), before[1])
+        while True:
+            with self._lock:
+                ledger = self._get(user_id)
+                if ledger is None:
+                    return
+                lo = ledger.span(start, end)[0]
+                pos = ledger.position_before(end, cursor)
+                chunk_start = max(lo, pos - chunk_size)
+                if pos <= chunk_start:
+                    return
+                chunk = ledger.rows(user_id, chunk_start, pos)
+                cursor = (ledger.times[chunk_start], ledger.ids[chunk_start])
+            yield from reversed(chunk)
+
+    def month_records(self, user_id, month):
+        return self.records_between(user_id, month, next_month(month))
+
+    def month_totals(self, user_id, month):
+        """該月各類別支出總和（回傳複本）"""
+        with self._lock:
+            ledger = self._get(user_id)
+            return dict(ledger.month_totals(month)) if ledger is not None else {}
+
+    def month_total(self, user_id, month, category):
+        with self._lock:
+            ledger = self._get(user_id)
+            return ledger.month_totals(month).get(category, 0) if ledger is not None else 0
+
+    def month_expense_total(self, user_id, month):
+        with self._lock:
+            ledger = self._get(user_id)
+            return sum(ledger.month_totals(month).values()) if ledger is not None else 0
+
+    def expense_totals_between(self, user_id, start, end):
+        """[start, end) 期間各類別的支出總和，直接在帳本欄位上彙總，不轉成 dict 紀錄"""
+        with self._lock:
+            ledger = self._get(user_id)
+            return ledger.expense_totals(*ledger.span(start, end)) if ledger is not None else {}
+
+    def category_totals(self, user_id):
+        """該使用者歷來各類別的金額總和（回傳複本）"""
+        with self._lock:
+            ledger = self._get(user_id)
+            return dict(ledger.category_totals()) if ledger is not None else {}
+
+    def data_version(self, user_id):
+        with self._lock:
+            return (self._generation, self._versions.get(user_id, 0))
+
+    def replace_signature(self, old, new):
+        """資料檔內容不變但檔案狀態改變時（例如日誌壓實）更新 signature，避免不必要的重建"""
+        with self._lock:
+            if self.signature == old:
+                self.signature = new
+
+    def _get(self, user_id):
+        """取得該使用者的帳本（必要時從快照載入），沒有任何紀錄時回傳 None；需在鎖內呼叫"""
+        ledger = self._ledgers.get(user_id)
+        if ledger is None and self._snapshot is not None:
+            try:
+                ledger = self._snapshot.load(user_id)
+            except SnapshotError:
+                # 快照區塊損毀：放棄快照，下次 get_index 時改由 JSON 重建
+                self._detach()
+                self.signature = None
+                raise
+            if ledger is not None:
+                self._ledgers[user_id] = ledger
+        return ledger
+
+    def _ledger(self, user_id):
+        ledger = self._get(user_id)
+        if ledger is None:
+            ledger = self._ledgers[user_id] = UserLedger()
+        return ledger
+
+    def _detach(self):
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+
+    def _bump_version(self, user_id):
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
@@ -0,0 +1,27 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+@pytest.fixture
+def json_store(tmp_path, monkeypatch):
+    """在暫存目錄中使用 JSON 儲存（清掉其他測試留下的分片與快取）"""
+    from services import json_store as store
+    if store.STORAGE_BACKEND != "json":
+        pytest.skip("需要 STORAGE_BACKEND=json")
+    monkeypatch.chdir(tmp_path)
+    store._shards.clear()
+    yield store
+    store._shards.clear()
+
+@pytest.fixture
+def sqlite_store(tmp_path, monkeypatch):
+    """以暫存目錄中的新資料庫使用 SQLite 後端"""
+    from services import sqlite_store as store
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(store, "_pool", store.ConnectionPool(str(tmp_path / "ledger.db"), 2))
+    monkeypatch.setattr(store, "_initialized", False)
+    yield store
+    store._pool.close()
@@ -0,0 +1,85 @@
+# 儲存層測試共用的資料與比對函式
+import threading
+
+from services.records import current_month, new_record, next_month
+
+def make_record(user_id, amount, when, category="飲食", kind="expense"):
+    record = new_record(user_id, {"category": category, "amount": amount, "type": kind, "memo": f"m{amount}"})
+    record["time"] = when
+    return record
+
+def sample_records():
+    month = current_month()
+    records = []
+    for i, user_id in enumerate(["U1", "U2", "U3"] * 4):
+        records.append(make_record(user_id, 10 + i, f"{month}-0{i % 9 + 1} 12:00:00", ["飲食", "交通"][i % 2]))
+    records.append(make_record("U1", 500, f"{month}-02 09:00:00", "薪水", "income"))
+    records.append(make_record("U2", 70, "2025-01-15 08:00:00", "交通"))
+    return records
+
+def store_state(store, users):
+    """各使用者可觀察到的查詢結果，用來比較重新載入前後 / 不同後端"""
+    month = current_month()
+    return {
+        user_id: (
+            sorted((r["id"], r["amount"], r["time"]) for r in store.get_user_transactions(user_id)),
+            store.get_monthly_summary(user_id),
+            store.get_monthly_category_total(user_id, "飲食"),
+            store.get_expense_totals_between(user_id, month, next_month(month)),
+            store.get_monthly_expense_trend(user_id),
+            store.get_category_totals(user_id),
+            # 同一秒內的先後不保證（同時寫入時套用到索引與寫入檔案的順序可能不同），只比較時間序與 id 集合
+            _desc(store, user_id, "2025-01", next_month(month)),
+            store.get_user_budgets(user_id),
+        )
+        for user_id in users
+    }
+
+def _desc(store, user_id, start, end):
+    records = list(store.iter_transactions_desc(user_id, start, end))
+    return [r["time"] for r in records], sorted(r["id"] for r in records)
+
+def populate(store, records):
+    for user_id in {r["user_id"] for r in records}:
+        store.add_transactions(user_id, [r for r in records if r["user_id"] == user_id])
+    store.set_budget("U1", "飲食", 100)
+    store.set_budget("U2", "交通", 50)
+    assert store.delete_transaction("U3", records[2]["id"])
+
+def reload_store(store):
+    """模擬重新啟動：丟掉所有分片（索引、快取、快照），之後的查詢全部從檔案重建"""
+    store._shards.clear()
+
+def run_together(targets):
+    """所有 target 在各自的執行緒中同時開始執行，回傳執行緒丟出的例外"""
+    barrier = threading.Barrier(len(targets))
+    errors = []
+
+    def _run(target):
+        barrier.wait()
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_run, args=(target,)) for target in targets]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+def check_concurrent_adds(store, threads_count=8, per_thread=25):
+    """多個執行緒同時 add_transaction：每一筆都要寫入、id 不重複，重新載入後結果相同"""
+    data = {"category": "飲食", "amount": 1, "type": "expense", "memo": ""}
+    errors = run_together([
+        lambda n=n: [store.add_transaction(f"U{n % 3}", data) for _ in range(per_thread)]
+        for n in range(threads_count)
+    ])
+    assert not errors
+    users = ["U0", "U1", "U2"]
+    before = store_state(store, users)
+    ids = [r[0] for user_id in users for r in before[user_id][0]]
+    assert len(ids) == len(set(ids)) == threads_count * per_thread
+    reload_store(store)
+    assert store_state(store, users) == before
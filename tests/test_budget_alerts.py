@@ -0,0 +1,74 @@
+import logging
+
+from linebot.v3.messaging import ApiClient, Configuration, MessagingApi
+
+from fake_line_server import FakeLineServer
+from services import budget_alerts
+from services.budget_alerts import BudgetAlertScheduler, remaining_quota
+from services.records import current_month, next_month
+
+class FlakyApi:
+    """multicast 第 fail_on 次呼叫時失敗，其餘照常記錄"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = 0
+        self.sent = []
+
+    def multicast(self, request):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise RuntimeError("LINE 暫時無法使用")
+        self.sent.append(request)
+
+    def recipients(self):
+        return [user_id for request in self.sent for user_id in request.to]
+
+def _spend(store, user_id, amount, budget=1000):
+    store.set_budget(user_id, "飲食", budget)
+    store.add_transaction(user_id, {"category": "飲食", "amount": amount, "type": "expense", "memo": ""})
+
+def test_alert_sent_once_per_threshold(json_store, tmp_path):
+    api = FlakyApi()
+    scheduler = BudgetAlertScheduler(api, rate=0, state_path=str(tmp_path / "alerts.json"))
+    _spend(json_store, "U1", 850)
+    assert scheduler.run_once()["alert"] == 1
+    assert scheduler.run_once()["alert"] == 0
+    json_store.add_transaction("U1", {"category": "飲食", "amount": 200, "type": "expense", "memo": ""})
+    assert scheduler.run_once()["alert"] == 1
+    assert "超過預算" in api.sent[-1].messages[0].text
+
+def test_summary_not_repeated_after_partial_failure(json_store, tmp_path, monkeypatch):
+    monkeypatch.setattr(budget_alerts, "MULTICAST_MAX", 1)
+    for user_id in ("U0", "U1", "U2"):
+        _spend(json_store, user_id, 10)
+    api = FlakyApi(fail_on=2)
+    scheduler = BudgetAlertScheduler(api, rate=0, state_path=str(tmp_path / "alerts.json"))
+    # 第一次執行是本月：只建立狀態，不補送更早的月結
+    scheduler.run_once()
+    later = next_month(current_month())
+    assert scheduler.run_once(later)["summary"] == 1
+    assert scheduler.run_once(later)["summary"] == 2
+    assert scheduler.run_once(later)["summary"] == 0
+    assert sorted(api.recipients()) == ["U0", "U1", "U2"]
+
+def test_quota_limited_defers_without_duplicates(json_store, tmp_path):
+    server = FakeLineServer(quota=2)
+    api = MessagingApi(ApiClient(Configuration(access_token="test", host=server.start_in_thread())))
+    try:
+        for user_id in ("U0", "U1", "U2"):
+            _spend(json_store, user_id, 900)
+        scheduler = BudgetAlertScheduler(api, rate=0, state_path=str(tmp_path / "alerts.json"))
+        assert scheduler.run_once()["alert"] == 2
+        assert scheduler.run_once()["alert"] == 0
+        server.quota = 10
+        assert scheduler.run_once()["alert"] == 1
+        recipients = [user_id for body in server.messages("multicast") for user_id in body["to"]]
+        assert sorted(recipients) == ["U0", "U1", "U2"]
+    finally:
+        server.stop()
+
+def test_remaining_quota_without_quota_api_is_silent(caplog):
+    with caplog.at_level(logging.WARNING):
+        assert remaining_quota(FlakyApi()) is None
+    assert not caplog.records
@@ -0,0 +1,38 @@
+import json
+import os
+import threading
+
+from store_helpers import reload_store
+
+def test_concurrent_set_budget_keeps_every_category(json_store):
+    categories = [f"C{i}" for i in range(20)]
+    threads = [threading.Thread(target=json_store.set_budget, args=("U1", c, i + 1)) for i, c in enumerate(categories)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    expected = {c: i + 1 for i, c in enumerate(categories)}
+    assert json_store.get_user_budgets("U1") == expected
+    reload_store(json_store)
+    assert json_store.get_user_budgets("U1") == expected
+
+def test_budget_version_changes_on_set_and_external_edit(json_store):
+    json_store.set_budget("U1", "飲食", 100)
+    version = json_store.get_budget_version("U1")
+    assert json_store.get_budget_version("U1") == version
+    # 回傳的是複本，修改不影響常駐記憶體的設定
+    json_store.get_user_budgets("U1")["飲食"] = 1
+    assert json_store.get_user_budgets("U1") == {"飲食": 100}
+
+    json_store.set_budget("U1", "交通", 50)
+    assert json_store.get_budget_version("U1") != version
+    version = json_store.get_budget_version("U1")
+
+    # 其他行程直接修改 budgets.json：重新讀檔並改變版本
+    path = json_store._shard("U1").budget_file
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"U1": {"飲食": 300}}, f)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert json_store.get_budget_version("U1") != version
+    assert json_store.get_user_budgets("U1") == {"飲食": 300}
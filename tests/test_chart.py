@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from services import chart
+
+@pytest.fixture
+def local_charts(tmp_path, monkeypatch):
+    monkeypatch.setattr(chart, "CHART_RENDERER", "local")
+    monkeypatch.setattr(chart, "PUBLIC_BASE_URL", "https://example.com")
+    monkeypatch.setattr(chart, "CHART_CACHE_DIR", str(tmp_path / "charts"))
+    monkeypatch.setattr(chart, "CHART_CACHE_MAX_FILES", 3)
+    return tmp_path / "charts"
+
+def _url(data):
+    return chart._local_chart_url(data, lambda: b"png")
+
+def test_cache_is_bounded_and_keeps_recently_used(local_charts):
+    first = _url(["a"])
+    for name in ("b", "c"):
+        _url([name])
+    # 命中時更新 mtime，"a" 變成最近使用
+    past = os.path.getmtime(local_charts / first.rsplit("/", 1)[-1]) - 100
+    for path in local_charts.iterdir():
+        os.utime(path, (past, past))
+    _url(["a"])
+    _url(["d"])
+    _url(["e"])
+    names = sorted(p.name for p in local_charts.iterdir())
+    assert len(names) == 3
+    assert first.rsplit("/", 1)[-1] in names
+
+def test_memo_rerenders_evicted_chart(local_charts, json_store, monkeypatch):
+    json_store.add_transaction("U1", {"category": "飲食", "amount": 10, "type": "expense", "memo": ""})
+    monkeypatch.setattr(chart, "render_pie_png", lambda values, colors: b"png")
+    url, _ = chart.user_pie_chart("U1")
+    path = local_charts / url.rsplit("/", 1)[-1]
+    os.remove(path)
+    assert chart.user_pie_chart("U1")[0] == url
+    assert path.exists()
+
+def test_public_base_url_required(monkeypatch):
+    monkeypatch.setattr(chart, "PUBLIC_BASE_URL", "")
+    monkeypatch.setattr(chart, "EXPORT_LINKS", False)
+    monkeypatch.setattr(chart, "CHART_RENDERER", "quickchart")
+    chart.check_public_base_url()
+    monkeypatch.setattr(chart, "CHART_RENDERER", "local")
+    with pytest.raises(RuntimeError):
+        chart.check_public_base_url()
+    monkeypatch.setattr(chart, "CHART_RENDERER", "quickchart")
+    monkeypatch.setattr(chart, "EXPORT_LINKS", True)
+    with pytest.raises(RuntimeError):
+        chart.check_public_base_url()
+    monkeypatch.setattr(chart, "PUBLIC_BASE_URL", "https://example.com")
+    chart.check_public_base_url()
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+import pytest
+
+from services.date_ranges import parse_chart_range
+
+NOW = datetime(2025, 1, 15, 22, 30)
+
+@pytest.mark.parametrize("arg, expected", [
+    ("", ("2025-01", "2025-02", "本月")),
+    (" 本月 ", ("2025-01", "2025-02", "本月")),
+    ("上月", ("2024-12", "2025-01", "上月")),
+    ("近7天", ("2025-01-09", "2025-01-16", "近7天")),
+    ("30 日", ("2024-12-17", "2025-01-16", "近30天")),
+    ("近1天", ("2025-01-15", "2025-01-16", "近1天")),
+    ("2024-12", ("2024-12", "2025-01", "2024-12")),
+    ("2025/3", ("2025-03", "2025-04", "2025-03")),
+    ("2024-12-30~2025/1/2", ("2024-12-30", "2025-01-03", "2024-12-30 ~ 2025-01-02")),
+    # 起訖顛倒時自動對調
+    ("2025-01-10 到 2025-01-01", ("2025-01-01", "2025-01-11", "2025-01-01 ~ 2025-01-10")),
+    ("2024-02-29～2024-02-29", ("2024-02-29", "2024-03-01", "2024-02-29 ~ 2024-02-29")),
+])
+def test_parse_chart_range(arg, expected):
+    assert parse_chart_range(arg, NOW) == expected
+
+@pytest.mark.parametrize("arg", ["下月", "0天", "近1000天", "2025-13", "2025-00", "2025-02-30~2025-03-01",
+                                 "2025-01-01~", "趨勢 本月"])
+def test_unparsable_range_returns_none(arg):
+    assert parse_chart_range(arg, NOW) is None
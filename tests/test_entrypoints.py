@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_async_app_import_has_no_flask_side_effects(tmp_path):
+    pytest.importorskip("aiohttp")
+    # 即使開啟背景提醒與非同步 webhook，匯入 aiohttp 入口也不能載入 Flask 入口或啟動背景執行緒
+    env = dict(os.environ, BUDGET_ALERTS="1", ASYNC_WEBHOOK="1", PYTHONPATH=ROOT)
+    code = (
+        "import sys, threading, async_app\n"
+        "assert 'app' not in sys.modules, 'async_app imported app'\n"
+        "assert threading.active_count() == 1, [t.name for t in threading.enumerate()]\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+def test_default_configuration_starts_without_public_base_url(tmp_path):
+    pytest.importorskip("flask")
+    # 預設設定（quickchart 圖表、不開放匯出連結）不需要 PUBLIC_BASE_URL
+    env = {k: v for k, v in os.environ.items() if k not in ("PUBLIC_BASE_URL", "EXPORT_LINKS", "CHART_RENDERER")}
+    env["PYTHONPATH"] = ROOT
+    code = "import app, async_app\nasync_app.create_app()\n"
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
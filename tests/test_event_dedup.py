@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services import event_dedup
+from services.event_dedup import ProcessedEvents, skip_duplicate_events
+
+@pytest.fixture
+def processed(tmp_path, monkeypatch):
+    events = ProcessedEvents(str(tmp_path / "processed_events.txt"), capacity=10)
+    monkeypatch.setattr(event_dedup, "processed_events", events)
+    return events
+
+def _event(event_id):
+    return SimpleNamespace(webhook_event_id=event_id)
+
+def test_duplicate_is_skipped(processed):
+    calls = []
+    handle = skip_duplicate_events(calls.append)
+    handle(_event("E1"))
+    handle(_event("E1"))
+    assert len(calls) == 1
+
+def test_redelivery_after_failure_is_processed(processed, tmp_path):
+    calls = []
+
+    @skip_duplicate_events
+    def handle(event):
+        calls.append(event.webhook_event_id)
+        if len(calls) == 1:
+            raise RuntimeError("儲存暫時失敗")
+
+    with pytest.raises(RuntimeError):
+        handle(_event("E1"))
+    handle(_event("E1"))
+    handle(_event("E1"))
+    assert calls == ["E1", "E1"]
+    # 重新啟動後仍記得成功處理過的事件
+    reloaded = ProcessedEvents(processed.path, capacity=10)
+    assert reloaded.mark("E1") is False
+
+def test_async_dispatch_forgets_failed_event(processed, monkeypatch):
+    async_app = pytest.importorskip("async_app")
+    from linebot.v3.webhooks import FollowEvent
+
+    event = FollowEvent.from_dict({
+        "type": "follow", "mode": "active", "timestamp": 0, "webhookEventId": "E9",
+        "source": {"type": "user", "userId": "U1"}, "replyToken": "r", "deliveryContext": {"isRedelivery": False},
+        "follow": {"isUnblocked": False}
+    })
+    monkeypatch.setattr(async_app, "_handle_event", lambda api, event, content: (_ for _ in ()).throw(RuntimeError()))
+    with pytest.raises(RuntimeError):
+        async_app._dispatch_event(event, None)
+    assert processed.mark("E9") is True
@@ -0,0 +1,83 @@
+import csv
+import gzip
+import io
+import json
+from urllib.parse import parse_qsl
+
+import pytest
+
+from services import exporter
+from services.exporter import export_query, export_stream, gzip_chunks, iter_csv, iter_jsonl, verify_export_query
+from store_helpers import make_record
+
+def _params(query):
+    return dict(parse_qsl(query, keep_blank_values=True))
+
+def test_signed_query_round_trip():
+    params = _params(export_query("U1", "jsonl", "2025-01", "2025-02-15", compress=True))
+    assert verify_export_query(params) == ("U1", "jsonl", "2025-01", "2025-02-15", True)
+    assert verify_export_query(_params(export_query("U1"))) == ("U1", "csv", None, None, False)
+
+@pytest.mark.parametrize("key, value", [
+    ("user", "U2"), ("format", "jsonl"), ("start", "2024-01"), ("end", ""), ("gzip", "1"),
+    ("expires", "9999999999"), ("sig", "0" * 64),
+])
+def test_tampered_query_is_rejected(key, value):
+    params = _params(export_query("U1", "csv", "2025-01", "2025-02"))
+    params[key] = value
+    assert verify_export_query(params) is None
+
+def test_query_signed_with_another_key_is_rejected(monkeypatch):
+    params = _params(export_query("U1"))
+    monkeypatch.setattr(exporter, "EXPORT_SIGNING_KEY", "another-key")
+    assert verify_export_query(params) is None
+    assert verify_export_query({k: v for k, v in params.items() if k != "sig"}) is None
+
+def test_expired_query_is_rejected(monkeypatch):
+    params = _params(export_query("U1", ttl=60))
+    now = exporter.time.time()
+    monkeypatch.setattr(exporter.time, "time", lambda: now + 61)
+    assert verify_export_query(params) is None
+
+@pytest.mark.parametrize("fmt, start, end", [
+    ("xml", None, None), ("csv", "2025-1", None), ("csv", None, "2025/01"), ("csv", "2025-01-02x", None),
+])
+def test_correctly_signed_but_invalid_values_are_rejected(fmt, start, end):
+    # 簽章正確也要檢查格式與期間，避免金鑰外洩或產生連結的程式有誤時傳入任意字串
+    assert verify_export_query(_params(export_query("U1", fmt, start, end))) is None
+
+RECORDS = [make_record("U1", i + 1, f"2025-01-{i % 28 + 1:02d} 12:00:00") | {"memo": f"備註, \"{i}\"\n第二行"}
+           for i in range(200)]
+
+def test_csv_is_chunked_and_round_trips(monkeypatch):
+    monkeypatch.setattr(exporter, "EXPORT_CHUNK_BYTES", 500)
+    chunks = list(iter_csv(RECORDS))
+    assert len(chunks) > 10
+    assert all(len(c) >= 500 for c in chunks[:-1])
+    text = b"".join(chunks).decode("utf-8")
+    assert text.startswith("\ufeff")
+    rows = list(csv.DictReader(io.StringIO(text[1:])))
+    assert [(r["id"], r["memo"], int(r["amount"])) for r in rows] == [(r["id"], r["memo"], r["amount"]) for r in RECORDS]
+
+def test_jsonl_is_chunked_and_round_trips(monkeypatch):
+    monkeypatch.setattr(exporter, "EXPORT_CHUNK_BYTES", 500)
+    chunks = list(iter_jsonl(RECORDS))
+    assert len(chunks) > 10
+    assert all(c.endswith(b"\n") for c in chunks)
+    lines = b"".join(chunks).decode("utf-8").split("\n")
+    assert lines.pop() == ""
+    assert [json.loads(line) for line in lines] == [{f: r[f] for f in exporter.EXPORT_FIELDS} for r in RECORDS]
+    assert list(iter_jsonl([])) == []
+
+def test_gzip_chunks_round_trip():
+    chunks = list(iter_jsonl(RECORDS))
+    assert gzip.decompress(b"".join(gzip_chunks(iter(chunks)))) == b"".join(chunks)
+    assert gzip.decompress(b"".join(gzip_chunks([]))) == b""
+
+def test_export_stream_limits_period(json_store):
+    json_store.add_transactions("U1", [make_record("U1", 10, "2024-12-31 23:59:59"),
+                                       make_record("U1", 20, "2025-01-01 00:00:00"),
+                                       make_record("U1", 30, "2025-02-01 00:00:00")])
+    json_store.add_transactions("U2", [make_record("U2", 40, "2025-01-05 00:00:00")])
+    body = gzip.decompress(b"".join(export_stream("U1", "jsonl", "2025-01", "2025-02", compress=True)))
+    assert [json.loads(line)["amount"] for line in body.decode("utf-8").splitlines()] == [20]
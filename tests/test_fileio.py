@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from services import fileio
+from services.fileio import LockedJsonFile, atomic_write_json
+from store_helpers import check_concurrent_adds, run_together
+
+@pytest.mark.parametrize("mode", ["journal", "file"])
+def test_concurrent_adds_are_all_persisted(json_store, monkeypatch, mode):
+    monkeypatch.setattr(json_store, "STORAGE_MODE", mode)
+    monkeypatch.setattr(json_store, "JOURNAL_COMPACT_THRESHOLD", 20)
+    monkeypatch.setattr(json_store, "GROUP_COMMIT_MS", 0)
+    check_concurrent_adds(json_store)
+
+@pytest.mark.parametrize("batching", [True, False])
+def test_updates_from_separate_instances_are_not_lost(tmp_path, batching):
+    # 各自的 LockedJsonFile 實例相當於不同行程：只靠跨行程鎖保護「讀取 -> 修改 -> 寫回」
+    path = str(tmp_path / "counts.json")
+    files = [LockedJsonFile(path, dict, batching) for _ in range(4)]
+
+    def _bump(data):
+        data["n"] = data.get("n", 0) + 1
+
+    errors = run_together([lambda f=f: [f.update(_bump) for _ in range(25)] for f in files])
+    assert not errors
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"n": 100}
+
+def test_failed_write_keeps_previous_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.json")
+    atomic_write_json(path, {"v": 1})
+
+    def _fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(fileio, "_fsync_dir", _fail)
+    monkeypatch.setattr(os, "fsync", _fail)
+    with pytest.raises(OSError):
+        atomic_write_json(path, {"v": 2})
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"v": 1}
+    # 暫存檔已清掉
+    assert os.listdir(tmp_path) == ["data.json"]
+
+def test_mutate_error_is_raised_to_its_caller_only(tmp_path):
+    store = LockedJsonFile(str(tmp_path / "data.json"), dict)
+
+    def _bad(data):
+        raise KeyError("x")
+
+    with pytest.raises(KeyError):
+        store.update(_bad)
+    store.update(lambda data: data.update(ok=1))
+    assert store.read() == {"ok": 1}
@@ -0,0 +1,71 @@
+import pytest
+from linebot.v3.messaging import FlexContainer, FlexMessage
+
+import flex_templates as flex
+from services.flex_template import FlexTemplate, Rows, component
+
+ROW = component({"type": "text", "text": "{name}：${amount}", "size": "sm"})
+
+CARD = FlexTemplate({
+    "type": "bubble",
+    "header": {"type": "box", "layout": "vertical", "contents": [{"type": "text", "text": "標題 {{固定}}"}]},
+    "body": {"type": "box", "layout": "vertical", "contents": [
+        {"type": "text", "text": "{title}", "color": "{color}"},
+        Rows("rows"),
+        {"type": "separator"},
+    ]},
+})
+
+def test_render_fills_fields_and_rows():
+    rows = [ROW.render(name="飲食", amount=100), ROW.render(name="交通", amount=20)]
+    rendered = CARD.render(title="本月", color="#1DB446", rows=rows)
+    assert rendered["header"]["contents"][0]["text"] == "標題 {固定}"
+    assert rendered["body"]["contents"] == [
+        {"type": "text", "text": "本月", "color": "#1DB446"},
+        {"type": "text", "text": "飲食：$100", "size": "sm"},
+        {"type": "text", "text": "交通：$20", "size": "sm"},
+        {"type": "separator"},
+    ]
+    # 與 SDK 建立模型後輸出的結果相同
+    assert FlexContainer.from_dict(rendered).to_dict() == rendered
+
+def test_static_subtrees_are_shared_and_fields_are_not():
+    first = CARD.render(title="a", color="#000000", rows=[])
+    second = CARD.render(title="b", color="#000000", rows=[])
+    assert first["body"]["contents"][-1] is second["body"]["contents"][-1]
+    assert first["body"]["contents"][0]["text"] == "a"
+    assert second["body"]["contents"][0]["text"] == "b"
+
+def test_missing_field_raises():
+    with pytest.raises(KeyError):
+        CARD.render(title="本月", rows=[])
+
+@pytest.mark.parametrize("skeleton", [
+    {"type": "bubble", "unknown": "{x}"},
+    {"type": "bubble", "body": {"type": "box", "layout": "{layout}", "contents": []}},
+])
+def test_invalid_skeleton_is_rejected_at_definition(skeleton):
+    with pytest.raises(ValueError):
+        FlexTemplate(skeleton)
+
+def test_enum_field_validated_with_sample():
+    template = component({"type": "button", "style": "{style}", "action": {"type": "message", "label": "好", "text": "好"}},
+                         sample={"style": "primary"})
+    assert template.render(style="secondary")["style"] == "secondary"
+
+def test_cards_match_sdk_models():
+    records = [{"id": f"r{i}", "time": "2025-01-02 12:00:00", "category": "飲食", "amount": i} for i in range(3)]
+    containers = [
+        flex.record_success_card("飲食", "100", "", 120, "#FF334B"),
+        flex.budget_setup_guide(["飲食", "交通"], {"飲食": 5000}),
+        flex.monthly_detail([(records, "一月", "action=month&page=2")]),
+        flex.monthly_detail([(records, "一月", "action=month&page=2"), (records[:1], "一月 (2)", None)]),
+    ]
+    for container in containers:
+        payload = container.to_dict()
+        assert FlexContainer.from_dict(payload).to_dict() == payload
+        # 放進 FlexMessage 後輸出的也是模板產生的內容
+        assert FlexMessage(alt_text="x", contents=container).to_dict()["contents"] == payload
+    # 沒有備註時顯示「無」，進度條寬度不超過 100%
+    success = str(containers[0].to_dict())
+    assert "備註：無" in success and "'width': '100%'" in success
@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from services.group_commit import GroupCommitter
+from store_helpers import check_concurrent_adds, run_together
+
+@pytest.mark.parametrize("mode", ["journal", "file"])
+def test_concurrent_adds_with_group_commit(json_store, monkeypatch, mode):
+    monkeypatch.setattr(json_store, "STORAGE_MODE", mode)
+    monkeypatch.setattr(json_store, "JOURNAL_COMPACT_THRESHOLD", 20)
+    monkeypatch.setattr(json_store, "GROUP_COMMIT_MS", 5)
+    check_concurrent_adds(json_store)
+
+def test_every_item_is_flushed_once_in_bounded_batches():
+    batches = []
+    lock = threading.Lock()
+
+    def _flush(items):
+        with lock:
+            batches.append(list(items))
+
+    committer = GroupCommitter(_flush, window=0.005, max_batch=4, name="test_group_commit")
+    errors = run_together([lambda n=n: [committer.submit((n, i)) for i in range(10)] for n in range(6)])
+    assert not errors
+    flushed = [item for batch in batches for item in batch]
+    assert sorted(flushed) == [(n, i) for n in range(6) for i in range(10)]
+    assert all(1 <= len(batch) <= 4 for batch in batches)
+    # submit 返回前該筆已寫入：每個執行緒自己的資料保持送出順序
+    for n in range(6):
+        assert [i for m, i in flushed if m == n] == list(range(10))
+
+def test_flush_error_is_raised_to_every_submitter_in_the_batch():
+    started = threading.Event()
+    release = threading.Event()
+
+    def _flush(items):
+        if items == ["first"]:
+            # 第一批寫入期間累積後面的資料，讓它們落在同一批
+            started.set()
+            release.wait()
+            return
+        raise OSError("disk full")
+
+    committer = GroupCommitter(_flush, window=0.05, max_batch=8, name="test_group_commit")
+    first = threading.Thread(target=committer.submit, args=("first",))
+    first.start()
+    started.wait()
+    results = []
+
+    def _submit(item):
+        try:
+            committer.submit(item)
+            results.append(None)
+        except OSError as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=_submit, args=(i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads + [first]:
+        t.join()
+    assert len(results) == 3 and all(isinstance(e, OSError) for e in results)
+    # 寫入失敗後背景執行緒仍繼續處理之後的寫入（不會卡住）
+    with pytest.raises(OSError):
+        committer.submit("again")
@@ -0,0 +1,93 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+
+from services import importer
+from services.importer import _iter_json_array, import_transactions, parse_row
+
+ITEMS = [{"time": f"2025-01-{i % 28 + 1:02d}", "category": "飲食", "amount": i + 1, "memo": "咖啡 ☕" * (i % 3)}
+         for i in range(40)] + [1, 2.5, -0.0025, 10, "x]", None, True, [3, {"a": "}"}]]
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64, 65536])
+def test_json_array_across_chunk_boundaries(chunk_size):
+    text = json.dumps(ITEMS, ensure_ascii=False, indent=1)
+    assert list(_iter_json_array(io.StringIO(text), chunk_size)) == ITEMS
+    assert list(_iter_json_array(io.StringIO(" [ ] "), chunk_size)) == []
+
+@pytest.mark.parametrize("text", ["[1, 2", "[1, 2 3]", "[1,]", "[,1]", "[1] 2", "[", "", "{}", '[{"a": 1}'])
+@pytest.mark.parametrize("chunk_size", [1, 3, 65536])
+def test_malformed_json_array_raises(text, chunk_size):
+    with pytest.raises(ValueError):
+        list(_iter_json_array(io.StringIO(text), chunk_size))
+
+def test_truncated_upload_imports_nothing(json_store):
+    body = json.dumps([{"time": "2025-01-02", "category": "飲食", "amount": 100}] * 3)[:-1]
+    with pytest.raises(ValueError):
+        import_transactions("U1", io.BytesIO(body.encode("utf-8")), "history.json")
+    assert json_store.get_user_transactions("U1") == []
+
+def test_parse_row_accepts_aliases_and_formats():
+    record = parse_row("U1", {"日期": "2025/01/02 08:30", "類別": " 飲食 ", "金額": "$1,200", "收支": "支出", "備註": "午餐"})
+    assert record == {"id": None, "user_id": "U1", "category": "飲食", "amount": 1200, "type": "expense",
+                      "memo": "午餐", "time": "2025-01-02 08:30:00"}
+    assert parse_row("U1", {"date": "2025-01-02", "category": "薪水", "amount": 5.0, "type": "income"})["type"] == "income"
+
+@pytest.mark.parametrize("row, message", [
+    ({"date": "2025-01-02", "amount": "10"}, "缺少類別"),
+    ({"date": "2025-01-02", "category": "飲食", "amount": "abc"}, "金額格式錯誤"),
+    ({"date": "2025-01-02", "category": "飲食", "amount": "12.5"}, "金額必須是大於 0 的整數"),
+    ({"date": "2025-01-02", "category": "飲食", "amount": "-3"}, "金額必須是大於 0 的整數"),
+    ({"date": "2025-01-02", "category": "飲食", "amount": "3", "type": "refund"}, "類型必須是"),
+    ({"category": "飲食", "amount": "3"}, "缺少日期"),
+    ({"date": "02/01/2025", "category": "飲食", "amount": "3"}, "日期格式錯誤"),
+    ([1, 2], "無法解析"),
+])
+def test_parse_row_rejects_invalid(row, message):
+    with pytest.raises(ValueError, match=message):
+        parse_row("U1", row)
+
+CSV = "日期,類別,金額,備註\n2025-01-02,飲食,80,咖啡\n2025-01-02,飲食,80,咖啡\n2025-01-03,交通,abc,\n2025-01-04,交通,30,\n"
+
+def test_reimport_is_deduplicated_by_content_id(json_store):
+    first = import_transactions("U1", io.BytesIO(CSV.encode("utf-8")), "history.csv")
+    # 同一檔案內容完全相同的兩列都要匯入，錯誤列回報列號
+    assert (first.added, first.duplicates, first.error_count) == (3, 0, 1)
+    assert first.errors == [(4, "金額格式錯誤：abc")]
+    again = import_transactions("U1", io.BytesIO(CSV.encode("utf-8")), "history.csv")
+    assert (again.added, again.duplicates) == (0, 3)
+    assert len(json_store.get_user_transactions("U1")) == 3
+    # 其他使用者匯入同一個檔案不受影響
+    assert import_transactions("U2", io.BytesIO(CSV.encode("utf-8")), "history.csv").added == 3
+
+def test_jsonl_and_detected_format(json_store):
+    body = '{"time": "2025-01-02", "category": "飲食", "amount": 10}\nnot json\n\n{"id": "x1", "time": "2025-01-03", "category": "飲食", "amount": 20}\n'
+    result = import_transactions("U1", io.BytesIO(body.encode("utf-8")))
+    assert (result.added, result.error_count, result.errors) == (2, 1, [(2, "無法解析")])
+    assert "x1" in {r["id"] for r in json_store.get_user_transactions("U1")}
+
+def test_content_id_is_stable():
+    content = ("U1", "2025-01-02 00:00:00", "飲食", 80, "expense", "咖啡")
+    assert importer._content_id(content, 0) == importer._content_id(content, 0)
+    assert importer._content_id(content, 0) != importer._content_id(content, 1)
+
+def test_overlapping_imports_of_the_same_file_add_once(json_store, monkeypatch):
+    insert_many = json_store._Shard.insert_many
+
+    def _slow_insert_many(self, records):
+        # 拉長「比對既有 id」與「寫入」之間的時間，讓兩個匯入重疊
+        time.sleep(0.05)
+        insert_many(self, records)
+
+    monkeypatch.setattr(json_store._Shard, "insert_many", _slow_insert_many)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        import_transactions("U1", io.BytesIO(CSV.encode("utf-8")), "history.csv"))) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(r.added for r in results) == [0, 3]
+    assert json_store.get_expense_totals_between("U1", "2025-01", "2025-02") == {"飲食": 160, "交通": 30}
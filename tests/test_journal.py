@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+
+import pytest
+
+from services.journal import JournalError, TransactionJournal
+from services.records import new_record
+
+def _journal(tmp_path, threshold=10**9):
+    return TransactionJournal(str(tmp_path / "transactions.json"), str(tmp_path / "transactions.jsonl"), threshold)
+
+def _record(user_id="U1", amount=100, memo=""):
+    return new_record(user_id, {"category": "飲食", "amount": amount, "type": "expense", "memo": memo})
+
+def test_round_trip(tmp_path):
+    journal = _journal(tmp_path)
+    records = [_record(amount=i) for i in range(5)]
+    journal.append_many([{"op": "add", "record": r} for r in records])
+    journal.append_delete("U1", records[1]["id"])
+    assert _journal(tmp_path).load() == [records[0]] + records[2:]
+
+def test_memo_with_line_separator_survives(tmp_path):
+    journal = _journal(tmp_path)
+    record = _record(memo="早餐 午餐\x85")
+    journal.append_add(record)
+    assert _journal(tmp_path).load() == [record]
+
+def test_append_after_torn_tail_keeps_new_record(tmp_path):
+    journal = _journal(tmp_path)
+    first, second = _record(amount=1), _record(amount=2)
+    journal.append_add(first)
+    # 模擬寫到一半當機：最後一行沒有換行
+    with open(journal.journal_path, "ab") as f:
+        f.write(b'{"op": "add", "record": {"id": "half')
+    assert _journal(tmp_path).load() == [first]
+    journal.append_add(second)
+    assert _journal(tmp_path).load() == [first, second]
+
+def test_corrupt_middle_line_raises(tmp_path):
+    journal = _journal(tmp_path)
+    journal.append_add(_record())
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write("not json\n")
+    journal.append_add(_record())
+    with pytest.raises(JournalError):
+        _journal(tmp_path).load()
+
+def test_compact_merges_and_clears(tmp_path):
+    journal = _journal(tmp_path)
+    records = [_record(amount=i) for i in range(20)]
+    for r in records:
+        journal.append_add(r)
+    journal.append_delete("U1", records[0]["id"])
+    journal.compact()
+    assert not os.path.exists(journal.journal_path)
+    assert not os.path.exists(journal.compacting_path)
+    with open(journal.base_path, encoding="utf-8") as f:
+        assert json.load(f) == records[1:]
+    assert _journal(tmp_path).load() == records[1:]
+
+def test_crash_between_base_replace_and_compacting_delete_does_not_duplicate(tmp_path):
+    journal = _journal(tmp_path)
+    records = [_record(amount=i) for i in range(5)]
+    for r in records:
+        journal.append_add(r)
+    journal.append_delete("U1", records[2]["id"])
+    expected = records[:2] + records[3:]
+    # 模擬當機：base 已寫入合併結果，但 .compacting 還在
+    os.replace(journal.journal_path, journal.compacting_path)
+    with open(journal.base_path, "w", encoding="utf-8") as f:
+        json.dump(expected, f)
+    later = _record(amount=99)
+    journal.append_add(later)
+    assert _journal(tmp_path).load() == expected + [later]
+    journal.compact()
+    assert _journal(tmp_path).load() == expected + [later]
+    with open(journal.base_path, encoding="utf-8") as f:
+        assert json.load(f) == expected
+
+def test_load_during_compaction_by_another_instance_keeps_every_record(tmp_path, monkeypatch):
+    writer = _journal(tmp_path)
+    records = [_record(amount=i) for i in range(5)]
+    for r in records:
+        writer.append_add(r)
+    reader = _journal(tmp_path)
+    read_base = reader._read_base
+    compactor = []
+
+    def _read_base_then_compact():
+        # 讀完 base 之後，另一個實例（例如另一個行程）開始壓實
+        base = read_base()
+        compactor.append(threading.Thread(target=writer.compact))
+        compactor[0].start()
+        compactor[0].join(0.2)
+        return base
+
+    monkeypatch.setattr(reader, "_read_base", _read_base_then_compact)
+    assert reader.load() == records
+    compactor[0].join()
+    assert _journal(tmp_path).load() == records
+
+def test_same_id_for_different_users_is_replayed(tmp_path):
+    # 匯入的紀錄 id 可能與其他使用者的紀錄相同（舊版 id 為毫秒時間）
+    mine, theirs = _record("A", amount=1), _record("B", amount=2)
+    theirs["id"] = mine["id"]
+    journal = _journal(tmp_path)
+    journal.append_add(mine)
+    journal.append_add(theirs)
+    assert _journal(tmp_path).load() == [mine, theirs]
+    journal.append_delete("A", mine["id"])
+    assert _journal(tmp_path).load() == [theirs]
+    journal.compact()
+    assert _journal(tmp_path).load() == [theirs]
@@ -0,0 +1,13 @@
+import pytest
+
+from store_helpers import populate, reload_store, sample_records, store_state
+
+@pytest.mark.parametrize("mode", ["journal", "file"])
+def test_round_trip(json_store, monkeypatch, mode):
+    monkeypatch.setattr(json_store, "STORAGE_MODE", mode)
+    records = sample_records()
+    populate(json_store, records)
+    before = store_state(json_store, ["U1", "U2", "U3"])
+    reload_store(json_store)
+    assert store_state(json_store, ["U1", "U2", "U3"]) == before
+    assert records[2]["id"] not in {r["id"] for r in json_store.get_user_transactions("U3")}
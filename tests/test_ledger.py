@@ -0,0 +1,65 @@
+from services.records import new_record
+from services.tx_index import TransactionIndex
+
+def _record(user_id, amount, when, category="飲食", record_type="expense"):
+    record = new_record(user_id, {"category": category, "amount": amount, "type": record_type, "memo": ""})
+    record["time"] = when
+    return record
+
+def test_fractional_amounts_keep_baseline_sums(tmp_path):
+    records = [
+        _record("U1", 100, "2025-01-03 10:00:00"),
+        _record("U1", 12.5, "2025-01-02 10:00:00"),
+        _record("U2", 7, "2025-01-02 10:00:00"),
+    ]
+    index = TransactionIndex()
+    index.rebuild(records, ("sig",))
+    assert index.month_totals("U1", "2025-01") == {"飲食": 112.5}
+    assert index.category_totals("U1") == {"飲食": 112.5}
+    assert [r["amount"] for r in index.user_records("U1")] == [12.5, 100]
+    index.add(_record("U1", 0.25, "2025-01-01 00:00:00"))
+    assert index.month_total("U1", "2025-01", "飲食") == 112.75
+    assert index.month_totals("U2", "2025-01") == {"飲食": 7}
+    # 有小數金額時不寫快照，但不影響索引本身
+    assert index.save(str(tmp_path / "transactions.snapshot")) is False
+
+def test_bad_rows_are_skipped_not_fatal():
+    good = _record("U1", 100, "2025-01-03 10:00:00")
+    records = [good, _record("U1", "abc", "2025-01-03 10:00:00"), _record("U1", 5, "not a time"),
+               _record("U2", None, "2025-01-03 10:00:00")]
+    index = TransactionIndex()
+    index.rebuild(records, ("sig",))
+    assert index.user_records("U1") == [good]
+    assert index.user_records("U2") == []
+
+def test_index_matches_dict_scan():
+    records = [_record(f"U{i % 3}", i * 10 + 1, f"2025-0{1 + i % 3}-{1 + i % 27:02d} 0{i % 10}:00:00",
+                       category=["飲食", "交通", "娛樂"][i % 3], record_type="income" if i % 7 == 0 else "expense")
+               for i in range(300)]
+    index = TransactionIndex()
+    index.rebuild(records, ("sig",))
+    for user_id in ("U0", "U1", "U2"):
+        mine = sorted((r for r in records if r["user_id"] == user_id), key=lambda r: r["time"])
+        assert index.user_records(user_id) == mine
+        expected = {}
+        for r in mine:
+            if r["type"] == "expense" and r["time"].startswith("2025-02"):
+                expected[r["category"]] = expected.get(r["category"], 0) + r["amount"]
+        assert index.month_totals(user_id, "2025-02") == expected
+        assert index.records_between(user_id, "2025-02-05", "2025-03-02") == \
+            [r for r in mine if "2025-02-05" <= r["time"] < "2025-03-02"]
+
+def test_missing_category_or_type_does_not_break_the_shard():
+    uncategorized = _record("U1", 30, "2025-01-04 10:00:00")
+    del uncategorized["category"]
+    untyped = _record("U1", 40, "2025-01-05 10:00:00")
+    del untyped["type"]
+    other = _record("U2", 7, "2025-01-02 10:00:00")
+    index = TransactionIndex()
+    index.rebuild([_record("U1", 100, "2025-01-03 10:00:00"), uncategorized, untyped, other], ("sig",))
+    # 沒有類別的舊紀錄歸到「未分類」（與原本圖表的處理相同），沒有收支種類的紀錄略過
+    assert index.month_totals("U1", "2025-01") == {"飲食": 100, "未分類": 30}
+    assert [r["amount"] for r in index.user_records("U1")] == [100, 30]
+    assert index.user_records("U2") == [other]
+    index.add(_record("U2", 3, "2025-01-06 10:00:00", category=None))
+    assert index.month_totals("U2", "2025-01") == {"飲食": 7}
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from services.fileio import LockedJsonFile
+from services.journal import TransactionJournal
+from services.sharding import shard_dir, shard_of, split_monolithic
+from store_helpers import make_record, populate, reload_store, run_together, sample_records, store_state
+
+@pytest.mark.parametrize("mode", ["journal", "file"])
+def test_sharded_round_trip(json_store, monkeypatch, mode):
+    monkeypatch.setattr(json_store, "STORAGE_MODE", mode)
+    monkeypatch.setattr(json_store, "STORAGE_LAYOUT", "sharded")
+    monkeypatch.setattr(json_store, "SHARD_COUNT", 4)
+    records = sample_records()
+    populate(json_store, records)
+    before = store_state(json_store, ["U1", "U2", "U3"])
+    reload_store(json_store)
+    assert store_state(json_store, ["U1", "U2", "U3"]) == before
+    # 每位使用者的資料只在自己的分片
+    for user_id in ("U1", "U2", "U3"):
+        directory = shard_dir("data", shard_of(user_id, 4))
+        with open(os.path.join(directory, "budgets.json"), encoding="utf-8") as f:
+            assert set(json.load(f)) <= {u for u in ("U1", "U2", "U3") if shard_of(u, 4) == shard_of(user_id, 4)}
+    assert not os.path.exists(os.path.join("data", "transactions.json"))
+
+def test_shard_of_is_stable():
+    # 不可使用內建 hash()：每次啟動的結果必須相同，否則找不到既有的分片
+    assert [shard_of(f"U{i}", 16) for i in range(5)] == [shard_of(f"U{i}", 16) for i in range(5)]
+    assert shard_of("Uabc", 16) == int.from_bytes(hashlib.md5(b"Uabc").digest()[:4], "big") % 16
+
+def test_split_monolithic_then_read_sharded(json_store, monkeypatch):
+    records = sample_records()
+    populate(json_store, records)
+    before = store_state(json_store, ["U1", "U2", "U3"])
+    counts = split_monolithic("data", 4)
+    assert sum(counts.values()) == len(records) - 1
+    with pytest.raises(RuntimeError):
+        split_monolithic("data", 4)
+    monkeypatch.setattr(json_store, "STORAGE_LAYOUT", "sharded")
+    monkeypatch.setattr(json_store, "SHARD_COUNT", 4)
+    reload_store(json_store)
+    assert store_state(json_store, ["U1", "U2", "U3"]) == before
+
+def test_concurrent_first_writes_to_new_shards(json_store, monkeypatch):
+    monkeypatch.setattr(json_store, "STORAGE_LAYOUT", "sharded")
+    monkeypatch.setattr(json_store, "SHARD_COUNT", 2)
+    data = {"category": "飲食", "amount": 1, "type": "expense", "memo": ""}
+    for n in range(10):
+        # 每一輪都是全新的資料目錄：分片目錄、日誌與額度檔都在第一次寫入時建立
+        monkeypatch.setattr(json_store, "DATA_DIR", f"data{n}")
+        json_store._shards.clear()
+        users = [f"U{i}" for i in range(8)]
+        errors = run_together([lambda u=u: json_store.add_transaction(u, data) for u in users[:4]] +
+                              [lambda u=u: json_store.set_budget(u, "飲食", 100) for u in users[4:]])
+        assert not errors
+        assert [len(json_store.get_user_transactions(u)) for u in users[:4]] == [1] * 4
+        assert [json_store.get_user_budgets(u) for u in users[4:]] == [{"飲食": 100}] * 4
+
+def test_concurrent_first_writes_from_separate_instances(tmp_path):
+    # 多個行程（各自的 TransactionJournal / LockedJsonFile 實例）同時第一次寫入同一個尚未建立的目錄
+    for n in range(10):
+        directory = tmp_path / f"d{n}"
+        journals = [TransactionJournal(str(directory / "t.json"), str(directory / "t.jsonl")) for _ in range(4)]
+        files = [LockedJsonFile(str(directory / "b.json"), dict) for _ in range(4)]
+        errors = run_together([lambda j=j, i=i: j.append_add(make_record("U1", i + 1, "2025-01-02 00:00:00"))
+                               for i, j in enumerate(journals)] +
+                              [lambda f=f, i=i: f.update(lambda d, i=i: d.update({f"k{i}": i})) for i, f in enumerate(files)])
+        assert not errors
+        assert len(journals[0].load()) == 4
+        assert len(files[0].read()) == 4
@@ -0,0 +1,40 @@
+import os
+
+from store_helpers import populate, reload_store, sample_records, store_state
+
+def test_snapshot_round_trip_and_corrupt_fallback(json_store, monkeypatch):
+    monkeypatch.setattr(json_store, "SNAPSHOT_ENABLED", True)
+    populate(json_store, sample_records())
+    before = store_state(json_store, ["U1", "U2", "U3"])
+    json_store.save_snapshots()
+    snapshot_path = json_store._shard("U1").snapshot_path
+    assert os.path.exists(snapshot_path)
+
+    reload_store(json_store)
+    assert store_state(json_store, ["U1", "U2", "U3"]) == before
+    assert json_store._shard("U1").index._snapshot is not None
+
+    # 內容損毀（大小不變）時不使用快照，改由 JSON 重建，結果相同
+    with open(snapshot_path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    reload_store(json_store)
+    assert store_state(json_store, ["U1", "U2", "U3"]) == before
+    assert json_store._shard("U1").index._snapshot is None
+
+def test_writes_after_snapshot_are_not_lost(json_store, monkeypatch):
+    monkeypatch.setattr(json_store, "SNAPSHOT_ENABLED", True)
+    records = sample_records()
+    populate(json_store, records)
+    json_store.save_snapshots()
+    # 快照之後的新增與刪除：快照已過期，重新載入時要以 JSON 為準
+    json_store.add_transaction("U1", {"category": "交通", "amount": 7, "type": "expense", "memo": "快照後"})
+    json_store.delete_transaction("U1", records[0]["id"])
+    before = store_state(json_store, ["U1", "U2", "U3"])
+    reload_store(json_store)
+    assert store_state(json_store, ["U1", "U2", "U3"]) == before
+    memos = [r["memo"] for r in json_store.get_user_transactions("U1")]
+    assert "快照後" in memos
+    assert records[0]["id"] not in {r["id"] for r in json_store.get_user_transactions("U1")}
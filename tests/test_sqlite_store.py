@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+
+from services import json_store
+from services.records import new_record
+from services.sharding import split_monolithic
+from store_helpers import populate, sample_records, store_state
+
+def _records(user_id, times):
+    records = []
+    for i, when in enumerate(times):
+        record = new_record(user_id, {"category": "飲食", "amount": i + 1, "type": "expense", "memo": ""})
+        record["time"] = when
+        records.append(record)
+    return records
+
+def _pages(store, user_id, before=None, size=2):
+    """模擬 handlers 的翻頁：每頁 size 筆，以最後一筆的 (time, id) 作為下一頁的游標"""
+    seen = []
+    while True:
+        page = []
+        for record in store.iter_transactions_desc(user_id, "2025-01", "2025-02", before, chunk_size=size):
+            page.append(record)
+            if len(page) == size:
+                break
+        seen += page
+        if len(page) < size:
+            return seen
+        before = (page[-1]["time"], page[-1]["id"])
+
+def test_desc_pages_cover_same_second_records(sqlite_store):
+    records = _records("U1", ["2025-01-05 12:00:00"] * 5 + ["2025-01-04 08:00:00"] * 2)
+    sqlite_store.add_transactions("U1", records)
+    sqlite_store.add_transactions("U2", _records("U2", ["2025-01-05 12:00:00"] * 3))
+    assert [r["id"] for r in _pages(sqlite_store, "U1")] == [r["id"] for r in reversed(records[:5])] + \
+        [r["id"] for r in reversed(records[5:])]
+
+def test_deleted_cursor_does_not_skip_same_second_records(sqlite_store):
+    records = _records("U1", ["2025-01-05 12:00:00"] * 4)
+    sqlite_store.add_transactions("U1", records)
+    cursor = records[2]
+    sqlite_store.delete_transaction("U1", cursor["id"])
+    remaining = [r["id"] for r in sqlite_store.iter_transactions_desc("U1", "2025-01", "2025-02", (cursor["time"], cursor["id"]))]
+    assert set(remaining) >= {records[0]["id"], records[1]["id"]}
+
+def test_cursor_lookup_uses_index(sqlite_store):
+    sqlite_store.add_transactions("U1", _records("U1", ["2025-01-05 12:00:00"]))
+    with sqlite_store._db() as conn:
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT rowid FROM transactions WHERE user_id = ? AND id = ?",
+                            ("U1", "x")).fetchall()
+    assert not any("SCAN transactions" in row[-1] for row in plan)
+
+def test_reimport_does_not_duplicate_ids(sqlite_store):
+    records = _records("U1", ["2025-01-05 12:00:00"] * 3)
+    assert sqlite_store.add_transactions("U1", records) == 3
+    assert sqlite_store.add_transactions("U1", records + records) == 0
+    assert len(sqlite_store.get_user_transactions("U1")) == 3
+
+def _legacy_db(path, rows, index_sql=None):
+    """建立沒有 (user_id, id) 唯一索引的舊資料庫"""
+    conn = sqlite3.connect(str(path))
+    conn.executescript("""
+        CREATE TABLE transactions (id TEXT NOT NULL, user_id TEXT NOT NULL, category TEXT NOT NULL,
+            amount INTEGER NOT NULL, type TEXT NOT NULL, memo TEXT NOT NULL DEFAULT '', time TEXT NOT NULL);
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        INSERT INTO meta VALUES ('migrated_from_json', '1');
+    """)
+    if index_sql:
+        conn.execute(index_sql)
+    conn.executemany("INSERT INTO transactions (id, user_id, category, amount, type, memo, time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     [tuple(r[c] for c in ("id", "user_id", "category", "amount", "type", "memo", "time")) for r in rows])
+    conn.commit()
+    conn.close()
+
+def test_existing_duplicates_are_reported_and_removed(sqlite_store, tmp_path, caplog):
+    record = _records("U1", ["2025-01-05 12:00:00"])[0]
+    _legacy_db(tmp_path / "ledger.db", [record, record])
+    assert len(sqlite_store.get_user_transactions("U1")) == 1
+    assert "移除 1 筆" in caplog.text
+    assert sqlite_store.add_transactions("U1", [record]) == 0
+
+def test_same_id_with_different_content_is_kept(sqlite_store, tmp_path, caplog):
+    first, second = _records("U1", ["2025-01-05 12:00:00", "2025-01-06 12:00:00"])
+    second["id"] = first["id"]
+    _legacy_db(tmp_path / "ledger.db", [first, second])
+    assert sorted(r["amount"] for r in sqlite_store.get_user_transactions("U1")) == [1, 2]
+    assert first["id"] in caplog.text
+
+def test_same_legacy_id_for_different_users_is_kept(sqlite_store, tmp_path):
+    # 舊版以毫秒時間為 id，不同使用者可能相同；先前只以 id 唯一的索引也要換掉
+    a, b = _records("A", ["2025-01-05 12:00:00"])[0], _records("B", ["2025-01-05 12:00:00"])[0]
+    a["id"] = b["id"] = "1700000000000"
+    _legacy_db(tmp_path / "ledger.db", [a], "CREATE UNIQUE INDEX idx_transactions_id ON transactions (id)")
+    assert sqlite_store.add_transactions("B", [b]) == 1
+    assert [r["user_id"] for r in sqlite_store.get_user_transactions("A")] == ["A"]
+    assert [r["user_id"] for r in sqlite_store.get_user_transactions("B")] == ["B"]
+
+def test_migrate_keeps_same_legacy_id_for_different_users(sqlite_store):
+    a, b = _records("A", ["2025-01-05 12:00:00"])[0], _records("B", ["2025-01-05 12:00:00"])[0]
+    a["id"] = b["id"] = "1700000000000"
+    os.makedirs("data")
+    with open(os.path.join("data", "transactions.json"), "w", encoding="utf-8") as f:
+        json.dump([a, b], f)
+    assert len(sqlite_store.get_user_transactions("A")) == 1
+    assert len(sqlite_store.get_user_transactions("B")) == 1
+
+def test_migrate_every_shard(sqlite_store, monkeypatch):
+    monkeypatch.setattr(json_store, "STORAGE_LAYOUT", "sharded")
+    monkeypatch.setattr(json_store, "SHARD_COUNT", 4)
+    users = [f"U{i}" for i in range(12)]
+    records = [r for user_id in users for r in _records(user_id, ["2025-01-05 12:00:00"] * 2)]
+    os.makedirs("data")
+    with open(os.path.join("data", "transactions.json"), "w", encoding="utf-8") as f:
+        json.dump(records, f)
+    with open(os.path.join("data", "budgets.json"), "w", encoding="utf-8") as f:
+        json.dump({user_id: {"飲食": 100} for user_id in users}, f)
+    assert len(split_monolithic("data", 4)) > 1
+    os.remove(os.path.join("data", "transactions.json"))
+    os.remove(os.path.join("data", "budgets.json"))
+
+    for user_id in users:
+        assert len(sqlite_store.get_user_transactions(user_id)) == 2
+        assert sqlite_store.get_user_budgets(user_id) == {"飲食": 100}
+    # 重新執行搬移（例如清掉 meta 標記後手動再跑一次）不會重複匯入
+    with sqlite_store._db() as conn, conn:
+        conn.execute("DELETE FROM meta")
+    assert sqlite_store.migrate_from_json() == 0
+    assert sum(len(sqlite_store.get_user_transactions(user_id)) for user_id in users) == len(records)
+
+def test_json_and_sqlite_backends_agree(json_store, sqlite_store):
+    records = sample_records()
+    populate(json_store, records)
+    populate(sqlite_store, records)
+    users = ["U1", "U2", "U3"]
+    assert store_state(json_store, users) == store_state(sqlite_store, users)
+    assert dict(json_store.iter_all_budgets()) == dict(sqlite_store.iter_all_budgets())
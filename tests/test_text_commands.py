@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services.text_commands import CommandRouter, Entry, EntryParser
+
+def _router():
+    router = CommandRouter()
+    calls = []
+
+    def handler(name):
+        return lambda api, event, user_id, arg: calls.append((name, arg))
+
+    router.exact("圖表")(handler("chart"))
+    router.prefix("圖表 ")(handler("chart_range"))
+    router.exact("設定額度")(handler("guide"))
+    router.prefix("設定")(handler("set"))
+    router.prefix("設定提醒")(handler("alert"))
+    return router, handler, calls
+
+def test_router_prefers_exact_then_longest_prefix():
+    router, handler, calls = _router()
+    for text in ["圖表", "圖表 上月", "設定額度", "設定 飲食 5000", "設定提醒 80", "100 午餐"]:
+        router.dispatch(None, None, "U1", text)
+    assert calls == [("chart", ""), ("chart_range", "上月"), ("guide", ""), ("set", "飲食 5000"), ("alert", "80")]
+
+    # 沒有相符的指令時交給 fallback，arg 為整段文字
+    router.fallback(handler("record"))
+    router.dispatch(None, None, "U1", "100 午餐")
+    assert calls[-1] == ("record", "100 午餐")
+
+PARSER = EntryParser(["飲食", "娛樂", "交通", "交通卡", "其他"])
+
+@pytest.mark.parametrize("text, entry", [
+    ("100 飲食 午餐", Entry("100", "飲食", "午餐")),
+    ("午餐120", Entry("120", None, "午餐")),
+    ("交通 50 捷運", Entry("50", "交通", "捷運")),
+    # 較長的類別優先；以訊息中最先出現的類別為準，不是 CATEGORIES 的順序
+    ("交通卡儲值 500", Entry("500", "交通卡", "儲值")),
+    ("娛樂 飲食 300", Entry("300", "娛樂", "飲食")),
+    # 只移除第一段數字，備註中的其他數字（含相同數字）保留
+    ("100 飲食 1000元", Entry("100", "飲食", "1000元")),
+    ("100 飲食 100元吃到飽", Entry("100", "飲食", "100元吃到飽")),
+    ("午餐", None),
+])
+def test_entry_parser(text, entry):
+    assert PARSER.parse(text) == entry
+
+def test_entry_parser_without_categories():
+    assert EntryParser([]).parse("飲食 100") == Entry("100", None, "飲食")
+
+class _Api:
+    def __init__(self):
+        self.replies = []
+
+    def reply_message(self, request):
+        self.replies.append(request.messages)
+
+def _send(text):
+    import handlers
+    api = _Api()
+    event = SimpleNamespace(source=SimpleNamespace(user_id="U1"), reply_token="token",
+                            message=SimpleNamespace(text=text))
+    handlers.handle_text_logic(api, event)
+    return api.replies
+
+@pytest.mark.parametrize("text", ["設定 飲食 5000", "設定飲食 5000", "設定  飲食   5000 "])
+def test_set_budget_with_or_without_space_after_command(json_store, text):
+    # 「設定飲食 5000」直接設定飲食的額度（舊版會把 5000 當成類別，顯示選擇金額的按鈕）
+    [messages] = _send(text)
+    assert messages[0].text.startswith("✅ 【飲食】額度設定成功")
+    assert json_store.get_user_budgets("U1") == {"飲食": 5000}
+
+def test_set_budget_with_only_a_category_offers_amounts(json_store):
+    [messages] = _send("設定 飲食")
+    assert [item.action.text for item in messages[0].quick_reply.items] == [
+        "設定 飲食 3000", "設定 飲食 5000", "設定 飲食 8000", "設定 飲食 10000"]
+    assert json_store.get_user_budgets("U1") == {}
+
+def test_set_budget_with_invalid_amount(json_store):
+    [messages] = _send("設定 飲食 很多")
+    assert messages[0].text.startswith("❌ 設定格式錯誤")
+    assert json_store.get_user_budgets("U1") == {}
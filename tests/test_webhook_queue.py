@@ -0,0 +1,64 @@
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from webhook_queue import EventDispatcher, source_key
+
+def _event(user_id, seq):
+    return SimpleNamespace(source=SimpleNamespace(user_id=user_id), seq=seq)
+
+def test_events_of_one_user_are_handled_in_order():
+    handled = {}
+    lock = threading.Lock()
+
+    def _handle(event):
+        time.sleep(random.random() / 1000)
+        with lock:
+            handled.setdefault(event.source.user_id, []).append(event.seq)
+
+    dispatcher = EventDispatcher(SimpleNamespace(_handlers={}, _default=_handle), workers=4, queue_size=10)
+    users = [f"U{i}" for i in range(10)]
+    for seq in range(30):
+        for user_id in users:
+            dispatcher.submit(_event(user_id, seq))
+    dispatcher.shutdown()
+    assert handled == {user_id: list(range(30)) for user_id in users}
+
+def test_handler_error_does_not_stop_worker():
+    handled = []
+
+    def _handle(event):
+        if event.seq == 0:
+            raise RuntimeError("boom")
+        handled.append(event.seq)
+
+    dispatcher = EventDispatcher(SimpleNamespace(_handlers={}, _default=_handle), workers=1)
+    for seq in range(3):
+        dispatcher.submit(_event("U1", seq))
+    dispatcher.shutdown()
+    assert handled == [1, 2]
+
+def test_shutdown_drains_queued_events_and_rejects_new_ones():
+    release = threading.Event()
+    handled = []
+
+    def _handle(event):
+        release.wait()
+        handled.append(event.seq)
+
+    dispatcher = EventDispatcher(SimpleNamespace(_handlers={}, _default=_handle), workers=1)
+    for seq in range(5):
+        dispatcher.submit(_event("U1", seq))
+    threading.Timer(0.05, release.set).start()
+    dispatcher.shutdown()
+    assert handled == list(range(5))
+    with pytest.raises(RuntimeError):
+        dispatcher.submit(_event("U1", 5))
+
+def test_source_key_falls_back_to_group_and_room():
+    assert source_key(SimpleNamespace(source=SimpleNamespace(user_id=None, group_id="G1"))) == "G1"
+    assert source_key(SimpleNamespace(source=SimpleNamespace(room_id="R1"))) == "R1"
+    assert source_key(SimpleNamespace()) == ""
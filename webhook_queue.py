@@ -0,0 +1,78 @@
+# Webhook 事件佇列：/callback 驗證簽章後立即回應，事件交給背景 worker 處理
+import queue
+import threading
+import time
+import traceback
+import zlib
+
+from linebot.v3.webhooks import MessageEvent
+
+_STOP = object()
+
+def source_key(event):
+    """同一個使用者（或群組、聊天室）的事件必須依序處理，以此作為分配 worker 的依據"""
+    source = getattr(event, "source", None)
+    for attr in ("user_id", "group_id", "room_id"):
+        value = getattr(source, attr, None)
+        if value:
+            return value
+    return ""
+
+def dispatch_event(handler, event):
+    """依 WebhookHandler 註冊的對應表找出處理函式並執行（與 handler.handle 的查找規則相同）"""
+    func = None
+    if isinstance(event, MessageEvent):
+        func = handler._handlers.get(f"{event.__class__.__name__}_{event.message.__class__.__name__}")
+    if func is None:
+        func = handler._handlers.get(event.__class__.__name__)
+    if func is None:
+        func = handler._default
+    if func is not None:
+        func(event)
+
+class EventDispatcher:
+    """
+    固定數量的 worker 執行緒，每個 worker 有自己的有界佇列。
+    同一個 source_key 永遠分到同一個 worker，因此同一使用者的事件會依收到的順序處理。
+    """
+
+    def __init__(self, handler, workers=4, queue_size=1000):
+        self.handler = handler
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads = [
+            threading.Thread(target=self._run, args=(q,), name=f"webhook-worker-{i}", daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        self._closed = False
+        for t in self._threads:
+            t.start()
+
+    def submit(self, event):
+        if self._closed:
+            raise RuntimeError("dispatcher 已關閉")
+        key = source_key(event)
+        # 佇列滿時阻塞等待（背壓），避免無限制堆積事件
+        self._queues[zlib.crc32(key.encode("utf-8")) % len(self._queues)].put(event)
+
+    def _run(self, q):
+        while True:
+            event = q.get()
+            try:
+                if event is _STOP:
+                    return
+                dispatch_event(self.handler, event)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                q.task_done()
+
+    def shutdown(self, timeout=30):
+        """停止接收新事件，等已排入的事件處理完（最多 timeout 秒）"""
+        if self._closed:
+            return
+        self._closed = True
+        for q in self._queues:
+            q.put(_STOP)
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0, deadline - time.monotonic()))